@@ -1,83 +1,329 @@
-from flask import Flask, render_template, request, jsonify
-from lexer import Lexer
-from lr_parser import LRParser
+import json
+import os
+import threading
+import time
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from token_buffer import TokenBuffer
+from lexer import KEYWORDS, OPERATORS, scan_from, word_types
+from compiled_grammar import get_compiled_grammar, registry, TOKEN_TO_TERMINAL
+from lr_parser import DEFAULT_MODE, TABLE_MODES
+from worker_pool import create_executor
+from reparse import SessionStore
+from grammar_text import parse_grammar, GrammarTextError
+from grammar_jobs import GrammarCompiler, CompileQueueFull, READY, FAILED
+from metrics import stats
 
 app = Flask(__name__)
 
+# 批量分析的执行器：LR_BATCH_EXECUTOR 为 thread 或 process，LR_BATCH_WORKERS 为工作者数量
+app.config['BATCH_EXECUTOR'] = os.environ.get('LR_BATCH_EXECUTOR', 'process')
+app.config['BATCH_WORKERS'] = int(os.environ.get('LR_BATCH_WORKERS', 0)) or None
+app.config['BATCH_CHUNK_SIZE'] = 256
+# 编辑器增量分析会话数上限，超出时淘汰最久未使用的会话
+app.config['MAX_SESSIONS'] = int(os.environ.get('LR_MAX_SESSIONS', 256))
+
+# 流式分析每秒最多发送的步骤数（0 为不限），请求中的 rate 只能更低
+app.config['STREAM_STEPS_PER_SECOND'] = int(os.environ.get('LR_STREAM_STEPS_PER_SECOND', 2000))
+# 流式分析每个 tokens 事件包含的词法单元数
+app.config['STREAM_TOKEN_BATCH'] = 256
+
+# 用户文法的后台编译：工作线程数、等待编译的任务数上限、单个文法的构建时间上限（秒）
+app.config['COMPILE_WORKERS'] = int(os.environ.get('LR_COMPILE_WORKERS', 1))
+app.config['COMPILE_QUEUE'] = int(os.environ.get('LR_COMPILE_QUEUE', 16))
+app.config['COMPILE_TIME_LIMIT'] = float(os.environ.get('LR_COMPILE_TIME_LIMIT', 30))
+# 文法文本的长度上限（字符）
+app.config['MAX_GRAMMAR_LENGTH'] = 100000
+
+sessions = SessionStore(app.config['MAX_SESSIONS'])
+compiler = GrammarCompiler(registry, workers=app.config['COMPILE_WORKERS'],
+                           max_pending=app.config['COMPILE_QUEUE'],
+                           time_limit=app.config['COMPILE_TIME_LIMIT'])
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def get_batch_pool():
+    """按配置惰性创建批量分析共用的执行器"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = create_executor(app.config['BATCH_EXECUTOR'], app.config['BATCH_WORKERS'])
+        return _batch_pool
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def requested_grammar(handle):
+    """请求中 grammar 字段对应的 (编译文法, 词法单元映射, 错误响应)，未指定时为默认文法"""
+    if handle is None:
+        return get_compiled_grammar(), TOKEN_TO_TERMINAL, None
+    job = compiler.get(str(handle))
+    if job is None:
+        return None, None, (jsonify({'success': False, 'error': '文法不存在或已过期'}), 404)
+    if job.status == FAILED:
+        return None, None, (jsonify({'success': False, 'error': f'文法编译失败: {job.error}'}), 400)
+    if job.status != READY:
+        return None, None, (jsonify({'success': False, 'error': '文法尚在编译', **job.to_dict()}), 409)
+    return job.grammar, job.spec.token_terminals, None
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     data = request.get_json()
+    session_id = data.get('session')
+    if isinstance(session_id, str):
+        return analyze_edit(session_id, data.get('edit'))
     expression = data.get('expression', '')
+    # 分析步骤分页，默认返回全部
+    try:
+        offset = int(data.get('offset', 0))
+        limit = data.get('limit')
+        limit = int(limit) if limit is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'offset 和 limit 必须是整数'}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'success': False, 'error': 'offset 和 limit 不能为负数'}), 400
+    # "tables": false 时不附带分析表、First集和Follow集，客户端按 tables_url 单独获取并缓存
+    include_tables = data.get('tables', True) is not False
     
+    if stats.enabled:
+        stats.count('requests')
     try:
-        # 词法分析
-        lexer = Lexer(expression)
-        tokens = []
-        while True:
-            token = lexer.get_next_token()
-            if token.type == 'EOF':
-                break
-            tokens.append({
-                'type': token.type,
-                'value': token.value
-            })
-        
-        # 语法分析
-        parser = LRParser()
-        # 添加产生式
-        parser.add_production('S', ['E'])
-        parser.add_production('E', ['E', '+', 'T'])
-        parser.add_production('E', ['T'])
-        parser.add_production('T', ['T', '*', 'F'])
-        parser.add_production('T', ['F'])
-        parser.add_production('F', ['(', 'E', ')'])
-        parser.add_production('F', ['id'])
-        # 计算First集和Follow集
-        parser.compute_first_sets()
-        parser.compute_follow_sets()
-        # 构建LR(0)项集族和分析表
-        parser.build_lr0_items()
-        parser.build_parsing_table()
-
-        # Token类型到终结符的映射
-        token_to_terminal = {
-            'IDENTIFIER': 'id',
-            'INTEGER': 'id',
-            'FLOAT': 'id',
-            'PLUS': '+',
-            'MULTIPLY': '*',
-            'LPAREN': '(',
-            'RPAREN': ')',
-            'EOF': '$'
-        }
-        mapped_tokens = [token_to_terminal.get(token['type'], token['value']) for token in tokens] + ['$']
-        
-        # 获取分析表和First/Follow集
-        parsing_table = parser.get_parsing_table()
-        first_sets = parser.get_first_sets()
-        follow_sets = parser.get_follow_sets()
-        
-        # 执行语法分析并获取分析过程
-        result, analysis_steps = parser.parse_with_steps(mapped_tokens)
-        
-        return jsonify({
-            'success': True,
-            'tokens': tokens,
-            'ast': '分析' + ('成功' if result else '失败'),
-            'parsing_table': parsing_table,
-            'first_sets': first_sets,
-            'follow_sets': follow_sets,
-            'analysis_steps': analysis_steps
-        })
+        with stats.phase('analyze.total'):
+            # 词法分析
+            with stats.phase('analyze.lex'):
+                buffer = TokenBuffer.from_source(expression)
+                tokens = [{'type': token_type, 'value': value}
+                          for token_type, value in buffer.items() if token_type != 'EOF']
+            
+            # 语法分析（分析表只在首次请求时构建），grammar 为 /grammars 返回的句柄时使用用户文法
+            with stats.phase('analyze.grammar'):
+                grammar, token_terminals, error = requested_grammar(data.get('grammar'))
+            if error is not None:
+                return error
+            parser = grammar.parser
+
+            # Token类型到终结符的映射（EOF 映射为 $）
+            mapped_tokens = buffer.terminals(token_terminals)
+            
+            # 分析表和First/Follow集在编译文法上预先编码为JSON，每个文法只格式化一次
+            with stats.phase('analyze.tables'):
+                payload = grammar.tables_payload()
+            
+            # 执行语法分析，分析过程按增量记录，只展开请求的那一页
+            with stats.phase('analyze.parse'):
+                trace = parser.trace(mapped_tokens)
+            result = trace.accepted
+            with stats.phase('analyze.steps'):
+                analysis_steps = trace.page(offset, limit)
+            
+            response = {
+                'success': True,
+                'tokens': tokens,
+                'ast': '分析' + ('成功' if result else '失败'),
+                'analysis_steps': analysis_steps,
+                'total_steps': len(trace),
+                'grammar': grammar.key,
+                'tables_url': tables_url(grammar),
+                'tables_etag': payload.etag
+            }
+            if session_id:
+                # 请求 "session": true 时建立增量分析会话，之后的编辑只发送改动
+                response['session'] = sessions.create(grammar, expression, token_terminals).id
+            with stats.phase('analyze.serialize'):
+                body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                if include_tables:
+                    body = body[:-1] + b',' + payload.fields + b'}'
+                return Response(body, mimetype='application/json')
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+def analyze_edit(session_id: str, edit):
+    """对已有会话应用一次编辑 {"offset", "deleted", "inserted"}，只重新分析受影响的部分"""
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'success': False, 'error': '会话不存在或已过期'}), 404
+    try:
+        offset = int(edit['offset'])
+        deleted = int(edit.get('deleted', 0))
+        inserted = str(edit.get('inserted', ''))
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return jsonify({'success': False, 'error': 'edit 必须包含 offset、deleted 和 inserted'}), 400
+    with session.lock:
+        try:
+            return jsonify(session.edit(offset, deleted, inserted))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+def tables_url(grammar) -> str:
+    """编译文法的分析表地址，默认模式时省略 mode 参数"""
+    url = f'/grammar/{grammar.key}/tables'
+    return url if grammar.mode == DEFAULT_MODE else f'{url}?mode={grammar.mode}'
+
+@app.route('/grammar/<key>/tables')
+def grammar_tables(key: str):
+    """已编译文法的分析表、First集和Follow集，内容由文法哈希和模式唯一确定，可长期缓存"""
+    mode = request.args.get('mode', DEFAULT_MODE)
+    # 用户文法被注册表淘汰后，只要句柄的编译任务还在，分析表地址就仍然有效
+    grammar = registry.lookup(key, mode) or compiler.lookup(key, mode)
+    if grammar is None:
+        return jsonify({'success': False, 'error': '文法不存在或已被淘汰'}), 404
+    payload = grammar.tables_payload()
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def sse(event: str, data) -> str:
+    """一条 Server-Sent Events 消息"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+@app.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream():
+    """流式分析，以 Server-Sent Events 依次发送 start、tokens、step 和 done（或 error）事件
+
+    GET 时参数在查询串中（供 EventSource 使用），POST 时在JSON请求体中。词法单元边扫描边
+    分批发送，分析步骤由 LRParser.iter_steps 边分析边生成，已发送的步骤不保留；
+    步骤中的 position 是剩余输入在 tokens 中的起始下标。
+    """
+    data = request.get_json(silent=True) or request.args
+    expression = data.get('expression', '')
+    max_rate = app.config['STREAM_STEPS_PER_SECOND']
+    try:
+        rate = float(data.get('rate') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'rate 必须是数字'}), 400
+    if max_rate:
+        rate = min(rate, max_rate) if rate > 0 else max_rate
+    batch_size = app.config['STREAM_TOKEN_BATCH']
+    grammar, token_terminals, error = requested_grammar(data.get('grammar'))
+    if error is not None:
+        return error
+
+    def generate():
+        payload = grammar.tables_payload()
+        yield sse('start', {'grammar': grammar.key, 'tables_url': tables_url(grammar),
+                            'tables_etag': payload.etag, 'rate': rate,
+                            'token_terminals': token_terminals})
+        # 第一遍扫描只发送词法单元，出错时在分析之前结束
+        types = word_types(KEYWORDS, dict(OPERATORS))
+        count = 0
+        batch = []
+        try:
+            for token_type, offset, length in scan_from(expression, 0, types):
+                batch.append({'type': token_type, 'value': expression[offset:offset + length]})
+                if len(batch) == batch_size:
+                    yield sse('tokens', batch)
+                    count += len(batch)
+                    batch = []
+        except Exception as e:
+            yield sse('error', {'success': False, 'error': str(e)})
+            return
+        if batch:
+            yield sse('tokens', batch)
+            count += len(batch)
+
+        # 第二遍扫描惰性地把终结符送入分析器，不保存词法单元和步骤
+        terminals = (token_terminals.get(token_type) or expression[offset:offset + length]
+                     for token_type, offset, length in scan_from(expression, 0, types))
+        start = time.perf_counter()
+        index = 0
+        action = None
+        for step in grammar.parser.iter_steps(terminals, with_input=False):
+            step['index'] = index
+            action = step['action']
+            yield sse('step', step)
+            index += 1
+            if rate > 0:
+                # 超前速率上限10毫秒以上时才休眠，避免每一步都休眠
+                ahead = index / rate - (time.perf_counter() - start)
+                if ahead > 0.01:
+                    time.sleep(ahead)
+        accepted = action == '接受'
+        yield sse('done', {'success': True, 'accepted': accepted,
+                           'ast': '分析' + ('成功' if accepted else '失败'),
+                           'token_count': count, 'total_steps': index})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def grammar_status(job):
+    """编译任务的状态响应：完成前为 202"""
+    result = {'success': job.status != FAILED, 'url': f'/grammars/{job.handle}', **job.to_dict()}
+    if job.status == READY:
+        result['tables_url'] = tables_url(job.grammar)
+    return jsonify(result), 200 if job.done.is_set() else 202
+
+@app.route('/grammars', methods=['POST'])
+def create_grammar():
+    """提交文法文本 {"grammar": "...", "mode": "lalr", "wait": 秒}，返回句柄和编译状态
+
+    文法在后台编译，同一文法只编译一次；wait 大于0时最多等待这么久再返回。
+    """
+    data = request.get_json(silent=True) or {}
+    text = data.get('grammar')
+    mode = data.get('mode', DEFAULT_MODE)
+    if not isinstance(text, str):
+        return jsonify({'success': False, 'error': 'grammar 必须是文法文本'}), 400
+    if len(text) > app.config['MAX_GRAMMAR_LENGTH']:
+        return jsonify({'success': False, 'error': '文法文本过长'}), 413
+    if mode not in TABLE_MODES:
+        return jsonify({'success': False, 'error': f'未知的分析表构建模式: {mode}'}), 400
+    try:
+        wait = min(float(data.get('wait') or 0), app.config['COMPILE_TIME_LIMIT'])
+        spec = parse_grammar(text)
+    except GrammarTextError as e:
+        return jsonify({'success': False, 'error': str(e), 'line': e.line}), 400
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'wait 必须是数字'}), 400
+    try:
+        job = compiler.submit(spec, mode)
+    except CompileQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    if wait > 0:
+        job.done.wait(wait)
+    return grammar_status(job)
+
+@app.route('/grammars/<handle>')
+def get_grammar(handle: str):
+    """文法编译任务的状态"""
+    job = compiler.get(handle)
+    if job is None:
+        return jsonify({'success': False, 'error': '文法不存在或已过期'}), 404
+    return grammar_status(job)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 文本格式的分阶段耗时和计数（LR_METRICS=1 时才收集）"""
+    return Response(stats.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """批量分析，请求体为 {"expressions": [...]}，按输入顺序返回 JSON lines"""
+    data = request.get_json()
+    expressions = data.get('expressions') if data else None
+    if not isinstance(expressions, list):
+        return jsonify({'success': False, 'error': 'expressions 必须是表达式列表'}), 400
+
+    grammar = get_compiled_grammar()
+    results = grammar.analyze_batch(expressions, workers=app.config['BATCH_WORKERS'],
+                                    chunk_size=app.config['BATCH_CHUNK_SIZE'],
+                                    pool=get_batch_pool())
+
+    def generate():
+        for index, result in enumerate(results):
+            result['index'] = index
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,1094 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Tuple, Callable, Optional, Any
+from lexer import Lexer, RegexLexer
+from lr_parser import LRParser, TABLE_MODES, DEFAULT_MODE
+from compiled_grammar import DEFAULT_PRODUCTIONS, TOKEN_TO_TERMINAL, CompiledGrammar
+from token_buffer import TokenBuffer
+from reparse import ReparseSession
+from codegen import write_parser_module, load_parser_module
+from evaluator import NodeTable, CompiledExpression, parse_expression, NAME, CONST, UNARY
+
+
+def generate_chain_grammar(levels: int) -> List[Tuple[str, List[str]]]:
+    """生成分层的左递归表达式文法，每层一个二元运算符
+
+    S -> E0
+    Ei -> Ei oi Ei+1 | Ei+1
+    P -> ( E0 ) | id
+    """
+    productions = [('S', ['E0'])]
+    for i in range(levels):
+        next_symbol = f'E{i + 1}' if i + 1 < levels else 'P'
+        productions.append((f'E{i}', [f'E{i}', f'o{i}', next_symbol]))
+        productions.append((f'E{i}', [next_symbol]))
+    productions.append(('P', ['(', 'E0', ')']))
+    productions.append(('P', ['id']))
+    return productions
+
+
+def generate_precedence_grammar(levels: int) -> Tuple[List[Tuple[str, List[str]]],
+                                                      List[Tuple[str, List[str]]]]:
+    """与 generate_chain_grammar 语言相同的紧凑二义文法及其优先级声明
+
+    S -> E
+    E -> E oi E | ( E ) | id
+    oi 均为左结合，i 越大优先级越高
+    """
+    productions = [('S', ['E'])]
+    productions += [('E', ['E', f'o{i}', 'E']) for i in range(levels)]
+    productions += [('E', ['(', 'E', ')']), ('E', ['id'])]
+    precedence = [('left', [f'o{i}']) for i in range(levels)]
+    return productions, precedence
+
+
+def generate_chain_expression(levels: int, n_tokens: int, seed: int = 0) -> List[str]:
+    """为 levels 层运算符的文法生成约n_tokens个终结符的表达式（末尾带$）"""
+    rng = random.Random(seed)
+    operators = [f'o{i}' for i in range(levels)]
+    return [rng.choice(operators) if t in '+*' else t
+            for t in generate_expression(n_tokens, seed)[:-1]] + ['$']
+
+
+def generate_deep_grammar(n_non_terminals: int, n_terminals: int = 50,
+                          seed: int = 0) -> List[Tuple[str, List[str]]]:
+    """生成有深层非终结符链、可空产生式和回边的随机文法
+
+    Ni 的产生式主要以 Ni+1..Ni+3 开头，集合要沿整条链传播；约10%的非终结符可空，
+    少量产生式引用编号更小的非终结符形成环。
+    """
+    rng = random.Random(seed)
+    names = [f'N{i}' for i in range(n_non_terminals)]
+    terminals = [f't{i}' for i in range(n_terminals)]
+    productions = [('S', ['N0'])]
+    for i, name in enumerate(names):
+        ahead = names[i + 1:i + 4] or terminals[:1]
+        for _ in range(rng.randint(1, 3)):
+            right = [rng.choice(ahead)]
+            for _ in range(rng.randint(0, 3)):
+                r = rng.random()
+                if r < 0.5:
+                    right.append(rng.choice(terminals))
+                elif r < 0.9:
+                    right.append(rng.choice(ahead))
+                else:
+                    right.append(rng.choice(names[:i + 1]))
+            productions.append((name, right))
+        if rng.random() < 0.1:
+            productions.append((name, []))
+    return productions
+
+
+def naive_first_follow(productions) -> Tuple[Dict[str, set], Dict[str, set]]:
+    """参照实现：每轮扫描全部产生式直到不再变化的 First/Follow 不动点"""
+    non_terminals = {left for left, _ in productions}
+    nullable = set()
+    first = {symbol: set() for symbol in non_terminals}
+    follow = {symbol: set() for symbol in non_terminals}
+    follow[productions[0][0]].add('$')
+    changed = True
+    while changed:
+        changed = False
+        for left, right in productions:
+            if left not in nullable and all(symbol in nullable for symbol in right):
+                nullable.add(left)
+                changed = True
+            for symbol in right:
+                add = first[symbol] if symbol in non_terminals else {symbol}
+                if not add <= first[left]:
+                    first[left] |= add
+                    changed = True
+                if symbol not in nullable:
+                    break
+            for i, symbol in enumerate(right):
+                if symbol not in non_terminals:
+                    continue
+                add = set()
+                for next_symbol in right[i + 1:]:
+                    add |= first[next_symbol] if next_symbol in non_terminals else {next_symbol}
+                    if next_symbol not in nullable:
+                        break
+                else:
+                    add |= follow[left]
+                if not add <= follow[symbol]:
+                    follow[symbol] |= add
+                    changed = True
+    for symbol in nullable:
+        first[symbol].add('ε')
+    return first, follow
+
+
+def generate_language_grammar(n_statements: int) -> List[Tuple[str, List[str]]]:
+    """生成有 n_statements 种语句的文法，每种语句有自己的参数列表非终结符
+
+    PROGRAM -> PROGRAM STMT | STMT
+    STMT -> ki ( ARGSi ) ;
+    ARGSi -> ARGSi , ITEMi | ITEMi
+    ITEMi -> id | num | ITEMi . id
+    """
+    productions = [('PROGRAM', ['PROGRAM', 'STMT']), ('PROGRAM', ['STMT'])]
+    for i in range(n_statements):
+        productions.append(('STMT', [f'k{i}', '(', f'ARGS{i}', ')', ';']))
+    for i in range(n_statements):
+        productions += [
+            (f'ARGS{i}', [f'ARGS{i}', ',', f'ITEM{i}']),
+            (f'ARGS{i}', [f'ITEM{i}']),
+            (f'ITEM{i}', ['id']),
+            (f'ITEM{i}', ['num']),
+            (f'ITEM{i}', [f'ITEM{i}', '.', 'id']),
+        ]
+    return productions
+
+
+def generate_statement_grammar() -> List[Tuple[str, List[str]]]:
+    """一个类C语句文法：赋值、if/else（悬挂else）、while、语句块和带比较的表达式"""
+    return [
+        ('PROGRAM', ['STMTS']),
+        ('STMTS', ['STMTS', 'STMT']),
+        ('STMTS', ['STMT']),
+        ('STMT', ['id', '=', 'EXPR', ';']),
+        ('STMT', ['if', '(', 'COND', ')', 'STMT']),
+        ('STMT', ['if', '(', 'COND', ')', 'STMT', 'else', 'STMT']),
+        ('STMT', ['while', '(', 'COND', ')', 'STMT']),
+        ('STMT', ['{', 'STMTS', '}']),
+        ('STMT', ['return', 'EXPR', ';']),
+        ('COND', ['EXPR', '==', 'EXPR']),
+        ('COND', ['EXPR']),
+        ('EXPR', ['EXPR', '+', 'TERM']),
+        ('EXPR', ['EXPR', '-', 'TERM']),
+        ('EXPR', ['TERM']),
+        ('TERM', ['TERM', '*', 'FACTOR']),
+        ('TERM', ['TERM', '/', 'FACTOR']),
+        ('TERM', ['FACTOR']),
+        ('FACTOR', ['(', 'EXPR', ')']),
+        ('FACTOR', ['id']),
+        ('FACTOR', ['num']),
+        ('FACTOR', ['id', '(', 'ARGS', ')']),
+        ('ARGS', ['ARGS', ',', 'EXPR']),
+        ('ARGS', ['EXPR']),
+    ]
+
+
+def generate_expression(n_tokens: int, seed: int = 0, paren_rate: float = 0.2) -> List[str]:
+    """为默认文法生成约n_tokens个终结符的合法表达式（末尾带$）"""
+    rng = random.Random(seed)
+    tokens = []
+    depth = 0
+    while True:
+        while rng.random() < paren_rate and len(tokens) < n_tokens:
+            tokens.append('(')
+            depth += 1
+        tokens.append('id')
+        while depth and rng.random() < paren_rate:
+            tokens.append(')')
+            depth -= 1
+        if len(tokens) + depth >= n_tokens:
+            break
+        tokens.append(rng.choice('+*'))
+    tokens.extend(')' * depth)
+    tokens.append('$')
+    return tokens
+
+
+def build_parser(productions, compress: bool = False, mode: str = DEFAULT_MODE) -> LRParser:
+    """构建分析器"""
+    parser = LRParser()
+    parser.compress_tables = compress
+    parser.mode = mode
+    for left, right in productions:
+        parser.add_production(left, list(right))
+    parser.build()
+    return parser
+
+
+def deep_sizeof(obj) -> int:
+    """粗略计算容器及其内容占用的字节数"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (tuple, list)):
+        size += sum(deep_sizeof(x) for x in obj)
+    return size
+
+
+def timed(func: Callable, *args) -> float:
+    """执行一次并返回耗时（秒）"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_table_build(levels: int) -> Dict[str, float]:
+    """对一个生成文法分阶段计时"""
+    parser = LRParser()
+    for left, right in generate_chain_grammar(levels):
+        parser.add_production(left, right)
+    result = {'levels': levels, 'productions': len(parser.productions)}
+    result['first_follow'] = timed(parser.compute_first_sets) + timed(parser.compute_follow_sets)
+    result['lr0_items'] = timed(parser.build_lr0_items)
+    result['parsing_table'] = timed(parser.build_parsing_table)
+    result['states'] = len(parser.lr0_items)
+    result['transitions'] = len(parser.transitions)
+    return result
+
+
+def bench_tables(levels: int, n_tokens: int = 2000) -> Dict[str, float]:
+    """比较字典表、稠密数组表和行位移压缩表的大小与分析吞吐量"""
+    result = {'levels': levels}
+    productions = generate_chain_grammar(levels) if levels else DEFAULT_PRODUCTIONS
+    for compress in (False, True):
+        parser = build_parser(productions, compress)
+        name = 'compressed' if compress else 'dense'
+        states = parser.tables.n_states
+        result[f'{name}_bytes_per_state'] = parser.tables.nbytes() / states
+        if not compress:
+            dict_tables = (dict(parser.action_table), dict(parser.goto_table))
+            result['dict_bytes_per_state'] = deep_sizeof(dict_tables) / states
+        if not levels:
+            tokens = generate_expression(n_tokens)
+            start = time.perf_counter()
+            accepted, _ = parser.parse_with_steps(tokens)
+            result[f'{name}_tokens_per_sec'] = len(tokens) / (time.perf_counter() - start)
+            result['accepted'] = accepted
+    result['states'] = states
+    return result
+
+
+def bench_parse(n_tokens: int) -> Dict[str, float]:
+    """快速分析路径的吞吐量，用于检验是否线性扩展"""
+    parser = build_parser(DEFAULT_PRODUCTIONS)
+    tokens = generate_expression(n_tokens)
+    start = time.perf_counter()
+    accepted = parser.parse(tokens)
+    elapsed = time.perf_counter() - start
+    return {'tokens': len(tokens), 'seconds': elapsed,
+            'tokens_per_sec': len(tokens) / elapsed, 'accepted': accepted}
+
+
+def bench_trace(n_tokens: int) -> Dict[str, float]:
+    """增量步骤记录与完整快照列表的峰值内存对比"""
+    parser = build_parser(DEFAULT_PRODUCTIONS)
+    tokens = generate_expression(n_tokens)
+    result = {'tokens': len(tokens)}
+    for name, func in (('trace', parser.trace), ('full_steps', parser.parse_with_steps)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(tokens)
+        result[f'{name}_seconds'] = time.perf_counter() - start
+        result[f'{name}_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def generate_source(n_bytes: int, seed: int = 0) -> str:
+    """生成约n_bytes字节的多行源代码，覆盖标识符、关键字、数字和运算符"""
+    rng = random.Random(seed)
+    words = ['alpha', 'x1', '_tmp', 'if', 'while', 'return', '42', '3.14', '1000',
+             '+', '-', '*', '/', '(', ')', '{', '}', '=', '==', ';']
+    parts = []
+    size = 0
+    while size < n_bytes:
+        word = rng.choice(words)
+        separator = '\n' if rng.random() < 0.05 else ' '
+        parts.append(word + separator)
+        size += len(word) + 1
+    return ''.join(parts)
+
+
+def best_of(func: Callable, *args, repeat: int = 3) -> float:
+    """重复执行取最短耗时（秒）"""
+    return min(timed(func, *args) for _ in range(repeat))
+
+
+def bench_lexer(n_bytes: int) -> Dict[str, float]:
+    """逐字符 Lexer 与主正则 RegexLexer 的吞吐量（MB/s）对比"""
+    source = generate_source(n_bytes)
+    result = {'bytes': len(source), 'tokens': len(RegexLexer(source).tokenize())}
+    cases = (('lexer', lambda: Lexer(source).tokenize()),
+             ('regex_lexer', lambda: RegexLexer(source).tokenize()),
+             # 只扫描不创建 Token 对象
+             ('regex_scan', lambda: list(RegexLexer(source).scan())))
+    for name, func in cases:
+        result[f'{name}_mb_per_sec'] = len(source) / best_of(func) / 1e6
+    return result
+
+
+def bench_stream(n_bytes: int, chunk_size: int = 1 << 16) -> Dict[str, float]:
+    """流式分析文件与整体读入后分析的峰值内存对比"""
+    grammar = CompiledGrammar(DEFAULT_PRODUCTIONS)
+    rng = random.Random(0)
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        path = f.name
+        f.write('x0')
+        size = 2
+        while size < n_bytes:
+            term = f' {rng.choice("+*")} x{rng.randrange(1000)}'
+            f.write(term + ('\n' if rng.random() < 0.05 else ''))
+            size += len(term)
+    result = {'bytes': os.path.getsize(path), 'chunk_size': chunk_size}
+
+    def whole():
+        with open(path) as source:
+            tokens = RegexLexer(source.read()).tokenize()
+        return grammar.parser.parse(grammar.map_tokens(tokens))
+
+    def streamed():
+        with open(path) as source:
+            return grammar.parse_stream(source, chunk_size).accepted
+
+    try:
+        for name, func in (('whole', whole), ('stream', streamed)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            result[f'{name}_accepted'] = func()
+            result[f'{name}_seconds'] = time.perf_counter() - start
+            result[f'{name}_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        os.remove(path)
+    return result
+
+
+def retained_bytes(func: Callable):
+    """执行func并返回 (结果, 结果仍占用的字节数)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def bench_token_buffer(n_bytes: int) -> Dict[str, float]:
+    """Token 对象列表与 TokenBuffer 的内存占用及转换为终结符的耗时"""
+    source = generate_source(n_bytes)
+    grammar = CompiledGrammar(DEFAULT_PRODUCTIONS)
+    tokens, token_bytes = retained_bytes(lambda: RegexLexer(source).tokenize())
+    buffer, buffer_bytes = retained_bytes(lambda: TokenBuffer.from_source(source))
+    return {
+        'bytes': len(source),
+        'tokens': len(buffer),
+        'token_list_bytes': token_bytes,
+        'token_buffer_bytes': buffer_bytes,
+        'memory_ratio': token_bytes / buffer_bytes,
+        'token_list_lex_seconds': best_of(lambda: RegexLexer(source).tokenize()),
+        'token_buffer_lex_seconds': best_of(lambda: TokenBuffer.from_source(source)),
+        'token_list_handoff_seconds': best_of(grammar.map_tokens, tokens),
+        'token_buffer_handoff_seconds': best_of(buffer.terminals, TOKEN_TO_TERMINAL),
+    }
+
+
+def generate_expressions(count: int, n_tokens: int = 20, seed: int = 0) -> List[str]:
+    """生成count个默认文法的表达式源代码"""
+    rng = random.Random(seed)
+    return [expression_source(n_tokens, rng.randrange(1 << 30)) for _ in range(count)]
+
+
+def bench_batch(count: int, workers_list=(1, 2, 4)) -> Dict[str, float]:
+    """逐个请求 /analyze 与 /analyze/batch 接口（线程池/进程池）的吞吐量（表达式/秒）"""
+    from app import app
+    client = app.test_client()
+    expressions = generate_expressions(count)
+    grammar = CompiledGrammar(DEFAULT_PRODUCTIONS)
+    result = {'expressions': count, 'cpus': os.cpu_count()}
+
+    sample = expressions[:min(count, 500)]
+    elapsed = timed(lambda: [client.post('/analyze', json={'expression': e}) for e in sample])
+    result['single_requests_per_sec'] = len(sample) / elapsed
+    result['serial_api_per_sec'] = count / timed(lambda: [grammar.analyze(e) for e in expressions])
+
+    for executor in ('thread', 'process'):
+        for workers in workers_list:
+            def run():
+                assert sum(1 for _ in grammar.analyze_batch(expressions, executor, workers,
+                                                            chunk_size=256)) == count
+            result[f'{executor}_{workers}_per_sec'] = count / timed(run)
+    # HTTP 批量接口（使用应用配置的执行器）
+    elapsed = timed(lambda: client.post('/analyze/batch',
+                                        json={'expressions': expressions}).get_data())
+    result['batch_endpoint_per_sec'] = count / elapsed
+    return result
+
+
+def bench_modes(name: str, productions) -> List[Dict[str, float]]:
+    """各分析表构建模式的构建耗时、状态数、动作数、表大小和冲突数"""
+    results = []
+    for mode in TABLE_MODES:
+        start = time.perf_counter()
+        parser = build_parser(productions, mode=mode)
+        elapsed = time.perf_counter() - start
+        tables = parser.tables
+        stats = parser.conflict_stats()
+        result = {
+            'grammar': name,
+            'mode': mode,
+            'build_seconds': elapsed,
+            'states': tables.n_states,
+            'actions': sum(1 for code in tables.action if code),
+            'dense_bytes': tables.nbytes(),
+            'shift_reduce': stats['shift_reduce'],
+            'reduce_reduce': stats['reduce_reduce'],
+        }
+        tables.compress()
+        result['compressed_bytes'] = tables.nbytes()
+        results.append(result)
+    return results
+
+
+def bench_precedence(levels: int, n_tokens: int = 20000) -> Dict[str, float]:
+    """分层文法与带优先级声明的紧凑文法：构建耗时、状态数和分析吞吐量"""
+    productions, precedence = generate_precedence_grammar(levels)
+    tokens = generate_chain_expression(levels, n_tokens)
+    result = {'levels': levels, 'tokens': len(tokens)}
+    for name in ('stratified', 'precedence'):
+        parser = LRParser()
+        if name == 'stratified':
+            for left, right in generate_chain_grammar(levels):
+                parser.add_production(left, right)
+        else:
+            for left, right in productions:
+                parser.add_production(left, right)
+            for associativity, terminals in precedence:
+                parser.add_precedence(associativity, terminals)
+        result[f'{name}_build_seconds'] = timed(parser.build)
+        result[f'{name}_states'] = parser.tables.n_states
+        result[f'{name}_conflicts'] = len(parser.conflicts)
+        result[f'{name}_tokens_per_sec'] = len(tokens) / best_of(parser.parse, tokens)
+        result[f'{name}_accepted'] = parser.parse(tokens)
+    return result
+
+
+def bench_first_follow(n_non_terminals: int, seed: int = 0) -> Dict[str, float]:
+    """digraph 位集 First/Follow 与逐轮不动点的耗时对比，并检查结果一致"""
+    productions = generate_deep_grammar(n_non_terminals, seed=seed)
+    parser = LRParser()
+    for left, right in productions:
+        parser.add_production(left, right)
+    result = {'non_terminals': len(parser.non_terminals), 'productions': len(productions)}
+    result['digraph_seconds'] = best_of(
+        lambda: (parser.compute_first_sets(), parser.compute_follow_sets()))
+    start = time.perf_counter()
+    first, follow = naive_first_follow(productions)
+    result['naive_seconds'] = time.perf_counter() - start
+    result['nullable'] = len(parser.nullable)
+    result['match'] = (all(parser.first_sets[symbol] == first[symbol] for symbol in first) and
+                       parser.follow_sets == follow)
+    return result
+
+
+def bench_incremental(name: str, productions, edit: Tuple[str, List[str]]) -> Dict[str, float]:
+    """增量模式下增删一个产生式后重新构建的耗时，与从头构建对比并检查分析表一致"""
+    parser = LRParser()
+    parser.incremental = True
+    for left, right in productions:
+        parser.add_production(left, right)
+    result = {'grammar': name, 'productions': len(productions)}
+    result['initial_build_seconds'] = timed(parser.build)
+    result['states'] = parser.tables.n_states
+
+    def same_tables(expected: List[Tuple[str, List[str]]]) -> bool:
+        fresh = build_parser(expected)
+        return (list(parser.tables.action) == list(fresh.tables.action) and
+                list(parser.tables.goto) == list(fresh.tables.goto))
+
+    parser.add_production(*edit)
+    result['add_rebuild_seconds'] = timed(parser.build)
+    result['fresh_build_seconds'] = best_of(build_parser, productions + [edit], repeat=1)
+    identical = same_tables(productions + [edit])
+    parser.remove_production(*edit)
+    result['remove_rebuild_seconds'] = timed(parser.build)
+    result['identical'] = identical and same_tables(productions)
+    return result
+
+
+def bench_reparse(n_bytes: int, keystrokes: int = 400, seed: int = 0) -> Dict[str, float]:
+    """编辑器逐键输入时增量重新分析与整体重新分析的单次延迟
+
+    在文档中随机位置逐字符键入 "+ y" 再逐个删除，中间状态包含语法错误。
+    """
+    source = generate_expressions(1, n_bytes // 3, seed)[0]
+    grammar = CompiledGrammar(DEFAULT_PRODUCTIONS)
+    result = {'bytes': len(source)}
+    result['session_build_seconds'] = timed(ReparseSession, grammar, source)
+    session = ReparseSession(grammar, source)
+    rng = random.Random(seed)
+    latencies = []
+    relexed = reparsed = 0
+    while len(latencies) < keystrokes:
+        offset = source.find(' ', rng.randrange(len(source)))
+        if offset == -1:
+            continue
+        edits = [(offset + i, 0, c) for i, c in enumerate(' + y')]
+        edits += [(offset + i, 1, '') for i in reversed(range(4))]
+        for edit in edits:
+            start = time.perf_counter()
+            session.edit(*edit)
+            latencies.append(time.perf_counter() - start)
+            relexed += session.relexed
+            reparsed += session.reparsed
+    latencies.sort()
+    result['keystroke_mean_seconds'] = sum(latencies) / len(latencies)
+    result['keystroke_p99_seconds'] = latencies[int(len(latencies) * 0.99)]
+    result['mean_relexed_tokens'] = relexed / len(latencies)
+    result['mean_reparsed_tokens'] = reparsed / len(latencies)
+    result['full_reparse_seconds'] = best_of(grammar.analyze, session.source)
+    expected = grammar.analyze(session.source)
+    result['agrees'] = (session.source == source and
+                        (expected['accepted'], expected['error_position']) ==
+                        (session.accepted, session.error_position))
+    return result
+
+
+def dict_table_parse(parser: LRParser, tokens: List[str]) -> bool:
+    """按 (状态, 符号) 查 action_table/goto_table、比较动作名字符串的解释执行分析"""
+    action_table = parser.action_table
+    goto_table = parser.goto_table
+    productions = parser.productions
+    stack = [0]
+    position = 0
+    while True:
+        token = tokens[position] if position < len(tokens) else '$'
+        action = action_table.get((stack[-1], token))
+        if action is None:
+            return False
+        if action[0] == 'shift':
+            stack.append(action[1])
+            position += 1
+        elif action[0] == 'reduce':
+            production = productions[action[1]]
+            if production.right:
+                del stack[-len(production.right):]
+            target = goto_table.get((stack[-1], production.left))
+            if target is None:
+                return False
+            stack.append(target)
+        else:
+            return True
+
+
+def mutated_inputs(parser: LRParser, generate: Callable[[int, int], List[str]], count: int,
+                   seed: int = 0) -> List[List[str]]:
+    """生成的合法输入、对其删除/插入/替换一个终结符得到的输入和随机终结符串（含未知终结符）"""
+    rng = random.Random(seed)
+    alphabet = sorted(parser.terminals) + ['?']
+    inputs = []
+    for i in range(count):
+        if i % 3 == 2:
+            inputs.append([rng.choice(alphabet) for _ in range(rng.randint(0, 30))] + ['$'])
+            continue
+        tokens = generate(rng.randint(1, 30), rng.randrange(1 << 30))[:-1]
+        if i % 3 == 1:
+            k = rng.randrange(len(tokens) + 1)
+            operation = rng.randrange(3)
+            if operation == 0 and tokens:
+                del tokens[min(k, len(tokens) - 1)]
+            elif operation == 1:
+                tokens.insert(k, rng.choice(alphabet))
+            elif tokens:
+                tokens[min(k, len(tokens) - 1)] = rng.choice(alphabet)
+        inputs.append(tokens + ['$'])
+    return inputs
+
+
+def bench_codegen(name: str, productions, generate: Callable[[int, int], List[str]],
+                  n_tokens: int = 10 ** 5, checks: int = 3000) -> Dict[str, float]:
+    """生成的分析器模块与解释执行分析表的吞吐量（终结符/秒），并检查接受/拒绝结论一致
+
+    generate(n_tokens, seed) 生成该文法约 n_tokens 个终结符的合法输入（末尾带$）。
+    """
+    parser = build_parser(productions)
+    tokens = generate(n_tokens, 0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'generated_{name}.py')
+        write_parser_module(parser, path)
+        module_bytes = os.path.getsize(path)
+        import_seconds = timed(load_parser_module, path)
+        module = load_parser_module(path)
+    result = {'grammar': name, 'states': parser.tables.n_states, 'tokens': len(tokens),
+              'module_bytes': module_bytes, 'import_seconds': import_seconds}
+    for label, func in (('dict_tables', lambda: dict_table_parse(parser, tokens)),
+                        ('trace', lambda: parser.trace(tokens)),
+                        ('recognize', lambda: parser.recognize(tokens)),
+                        ('generated', lambda: module.recognize(tokens))):
+        result[f'{label}_tokens_per_sec'] = len(tokens) / best_of(func)
+    result['speedup_vs_recognize'] = (result['generated_tokens_per_sec'] /
+                                      result['recognize_tokens_per_sec'])
+
+    mismatches = 0
+    accepted = 0
+    inputs = mutated_inputs(parser, generate, checks)
+    for sample in inputs:
+        expected = parser.recognize(sample)
+        actual = module.recognize(sample)
+        accepted += actual[0]
+        if (expected.accepted, expected.error_position) != actual or \
+                parser.parse_with_steps(sample)[0] != actual[0]:
+            mismatches += 1
+    result['checked_inputs'] = len(inputs)
+    result['accepted_inputs'] = accepted
+    result['mismatches'] = mismatches
+    return result
+
+
+def walk_tree(nodes: NodeTable, root: int, row: Dict[str, Any]) -> Any:
+    """逐行解释执行：每次求值都遍历一遍语法树"""
+    values: Dict[int, Any] = {}
+    for node in nodes.postorder(root):
+        kind = nodes.kinds[node]
+        if kind == NAME:
+            values[node] = row[nodes.names[nodes.args[node]]]
+        elif kind == CONST:
+            values[node] = nodes.constants[nodes.args[node]]
+        elif kind == UNARY:
+            operand = values[nodes.left[node]]
+            values[node] = -operand if nodes.operators[nodes.args[node]] == '-' else operand
+        else:
+            left, right = values[nodes.left[node]], values[nodes.right[node]]
+            operator = nodes.operators[nodes.args[node]]
+            values[node] = left + right if operator == '+' else left * right
+    return values[root]
+
+
+def bench_evaluate(n_tokens: int, n_rows: int = 10 ** 6, sample_rows: int = 2000,
+                   seed: int = 0) -> Dict[str, Any]:
+    """表达式编译一次后在 n_rows 行的列数据上向量化求值，与逐行遍历语法树比较
+
+    逐行遍历只在前 sample_rows 行上计时，再按行数折算；两者在样本上的结果必须一致。
+    """
+    try:
+        import numpy
+    except ImportError:
+        return {'tokens': n_tokens, 'skipped': '未安装 NumPy'}
+    source = expression_source(n_tokens, seed)
+    result = {'tokens': n_tokens, 'rows': n_rows}
+    result['parse_seconds'] = best_of(parse_expression, source)
+    nodes, root = parse_expression(source)
+    result['nodes'] = len(nodes)
+    result['compile_seconds'] = best_of(CompiledExpression, nodes, root)
+    expression = CompiledExpression(nodes, root)
+    rng = numpy.random.default_rng(seed)
+    columns = {name: rng.random(n_rows) for name in nodes.names}
+    result['vectorized_seconds'] = best_of(expression, columns)
+    rows = [{name: float(column[i]) for name, column in columns.items()}
+            for i in range(sample_rows)]
+    per_row = timed(lambda: [walk_tree(nodes, root, row) for row in rows]) / sample_rows
+    result['tree_walk_seconds'] = per_row * n_rows
+    result['speedup'] = result['tree_walk_seconds'] / result['vectorized_seconds']
+    vectorized = expression(columns)[:sample_rows]
+    result['agrees'] = bool(numpy.allclose(vectorized, [walk_tree(nodes, root, row) for row in rows]))
+    return result
+
+
+# 基准套件的规模：表达式终结符数和生成文法的参数
+SUITE_TOKEN_SIZES = (10, 100, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+SUITE_CHAIN_LEVELS = (10, 20, 40, 80)
+SUITE_LANGUAGE_STATEMENTS = (25, 50, 100, 200)
+# parse_with_steps 展开每一步的完整快照，耗时和内存随输入长度平方增长，只测到这个规模
+SUITE_STEPS_MAX_TOKENS = 3000
+SUITE_PHASES = ('compute_first_sets', 'compute_follow_sets', 'build_lr0_items',
+                'build_parsing_table')
+
+
+def expression_source(n_tokens: int, seed: int = 0) -> str:
+    """默认文法约n_tokens个终结符的表达式源代码"""
+    rng = random.Random(seed)
+    return ' '.join(f'x{rng.randrange(100)}' if t == 'id' else t
+                    for t in generate_expression(n_tokens, seed)[:-1])
+
+
+def quiet_timed(func: Callable) -> float:
+    """关闭垃圾回收后计时一次（与 timeit 相同），避免回收时机带来的抖动"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return timed(func)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def best_time(func: Callable, repeat: int = 3, min_total: float = 0.2) -> float:
+    """至少重复 repeat 次、且总耗时达到 min_total 秒时取最短耗时；单次超过1秒时只测一次"""
+    seconds = quiet_timed(func)
+    total = seconds
+    count = 1
+    while seconds <= 1 and (count < repeat or total < min_total) and count < 1000:
+        elapsed = quiet_timed(func)
+        seconds = min(seconds, elapsed)
+        total += elapsed
+        count += 1
+    return seconds
+
+
+def measure(func: Callable, repeat: int = 3) -> Dict[str, float]:
+    """计时（取最短）并在单独的一次运行中用 tracemalloc 测峰值内存"""
+    seconds = best_time(func, repeat)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': seconds, 'peak_bytes': peak}
+
+
+def scaling_exponent(points: List[Dict[str, Any]]) -> Optional[float]:
+    """耗时对规模的双对数最小二乘斜率（1 为线性），忽略过短的测量"""
+    samples = [(math.log(p['size']), math.log(p['seconds']))
+               for p in points if p['seconds'] > 1e-4 and p['size'] > 0]
+    if len(samples) < 2:
+        return None
+    mean_x = sum(x for x, _ in samples) / len(samples)
+    mean_y = sum(y for _, y in samples) / len(samples)
+    variance = sum((x - mean_x) ** 2 for x, _ in samples)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in samples) / variance
+
+
+def calibrate(repeat: int = 5) -> float:
+    """与本仓库代码无关的固定纯Python负载的耗时，用于抵消不同机器/时段的速度差异"""
+    def workload():
+        table = {}
+        stack = []
+        for i in range(200000):
+            stack.append(i & 255)
+            if len(stack) > 8:
+                del stack[-3:]
+            table[i & 1023] = table.get(i & 1023, 0) + stack[-1]
+    return min(quiet_timed(workload) for _ in range(repeat))
+
+
+def suite_meta(repeat: int) -> Dict[str, Any]:
+    """运行环境，便于跨提交比较"""
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'repeat': repeat,
+        'calibration_seconds': calibrate(),
+    }
+
+
+def suite_lexer(sizes: List[int], repeat: int) -> Dict[str, Dict]:
+    """Lexer.tokenize 与 RegexLexer.tokenize 的扩展曲线（规模为终结符数）"""
+    series = {'lexer.Lexer.tokenize': [], 'lexer.RegexLexer.tokenize': []}
+    for size in sizes:
+        source = expression_source(size)
+        for name, lexer_class in (('lexer.Lexer.tokenize', Lexer),
+                                  ('lexer.RegexLexer.tokenize', RegexLexer)):
+            point = {'size': size, 'bytes': len(source)}
+            point.update(measure(lambda: lexer_class(source).tokenize(), repeat))
+            series[name].append(point)
+    return series
+
+
+def suite_parse(sizes: List[int], repeat: int) -> Dict[str, Dict]:
+    """parse 与 parse_with_steps 的扩展曲线（默认文法，规模为终结符数）"""
+    parser = build_parser(DEFAULT_PRODUCTIONS)
+    series = {'parse.parse': [], 'parse.parse_with_steps': []}
+    for size in sizes:
+        tokens = generate_expression(size)
+        point = {'size': size}
+        point.update(measure(lambda: parser.parse(tokens), repeat))
+        series['parse.parse'].append(point)
+        if size <= SUITE_STEPS_MAX_TOKENS:
+            point = {'size': size}
+            point.update(measure(lambda: parser.parse_with_steps(tokens), repeat))
+            series['parse.parse_with_steps'].append(point)
+    return series
+
+
+def suite_grammar(family: str, grammars: List[List[Tuple[str, List[str]]]],
+                  repeat: int) -> Dict[str, Dict]:
+    """分阶段构建的扩展曲线（规模为产生式数）
+
+    各阶段依赖前一阶段的结果，每次重复都从新的分析器开始依次执行。
+    """
+    series = {f'grammar.{family}.{phase}': [] for phase in SUITE_PHASES}
+    for productions in grammars:
+        best = dict.fromkeys(SUITE_PHASES, math.inf)
+        total = 0.0
+        count = 0
+        while count < repeat or (total < 0.2 and count < 1000):
+            parser = build_grammar(productions)
+            for phase in SUITE_PHASES:
+                elapsed = quiet_timed(getattr(parser, phase))
+                best[phase] = min(best[phase], elapsed)
+                total += elapsed
+            count += 1
+        parser = build_grammar(productions)
+        tracemalloc.start()
+        for phase in SUITE_PHASES:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            getattr(parser, phase)()
+            peak = tracemalloc.get_traced_memory()[1] - before
+            series[f'grammar.{family}.{phase}'].append({
+                'size': len(productions), 'seconds': best[phase], 'peak_bytes': peak,
+                'states': len(parser.lr0_items)})
+        tracemalloc.stop()
+    return series
+
+
+def build_grammar(productions) -> LRParser:
+    """只添加产生式、不构建的分析器"""
+    parser = LRParser()
+    for left, right in productions:
+        parser.add_production(left, right)
+    return parser
+
+
+def run_suite(max_tokens: int = 10 ** 6, repeat: int = 3, progress=None) -> Dict[str, Any]:
+    """运行完整的基准套件，返回可以保存为JSON并跨提交比较的结果
+
+    每条曲线的点含规模、最短耗时、吞吐量（每秒规模单位）和峰值内存，
+    并给出双对数斜率 exponent 以便发现超线性增长。输入都由固定种子生成。
+    """
+    sizes = [size for size in SUITE_TOKEN_SIZES if size <= max_tokens]
+    groups = [
+        ('lexer', 'tokens', lambda: suite_lexer(sizes, repeat)),
+        ('parse', 'tokens', lambda: suite_parse(sizes, repeat)),
+        ('chain', 'productions', lambda: suite_grammar(
+            'chain', [generate_chain_grammar(levels) for levels in SUITE_CHAIN_LEVELS], repeat)),
+        ('language', 'productions', lambda: suite_grammar(
+            'language', [generate_language_grammar(n) for n in SUITE_LANGUAGE_STATEMENTS], repeat)),
+    ]
+    results = {'meta': suite_meta(repeat), 'series': {}}
+    for group, unit, run in groups:
+        if progress:
+            progress(group)
+        for name, points in run().items():
+            for point in points:
+                point['per_sec'] = point['size'] / point['seconds'] if point['seconds'] else None
+            results['series'][name] = {'unit': unit, 'points': points,
+                                       'exponent': scaling_exponent(points)}
+    return results
+
+
+def compare_suites(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.25,
+                   min_seconds: float = 1e-3) -> List[Dict[str, Any]]:
+    """逐条曲线比较两次套件结果，返回耗时或峰值内存增长超过 threshold 的曲线
+
+    耗时先按两次运行的校准负载耗时归一化；以曲线上各点比值的（下）中位数判定，
+    避免单点抖动造成误报。短于 min_seconds 的耗时噪声太大，不参与比较。
+    """
+    speed = 1.0
+    old_calibration = baseline['meta'].get('calibration_seconds')
+    new_calibration = current['meta'].get('calibration_seconds')
+    if old_calibration and new_calibration:
+        speed = new_calibration / old_calibration
+    regressions = []
+    for name, series in current['series'].items():
+        old_series = baseline['series'].get(name)
+        if old_series is None:
+            continue
+        old_points = {point['size']: point for point in old_series['points']}
+        for metric, floor, scale in (('seconds', min_seconds, speed), ('peak_bytes', 1024, 1.0)):
+            ratios = []
+            for point in series['points']:
+                old = old_points.get(point['size'])
+                if old is None or (old[metric] < floor and point[metric] < floor):
+                    continue
+                ratios.append((point['size'],
+                               point[metric] / (old[metric] * scale) if old[metric] else math.inf))
+            if not ratios:
+                continue
+            median = sorted(ratio for _, ratio in ratios)[(len(ratios) - 1) // 2]
+            if median > 1 + threshold:
+                regressions.append({'series': name, 'metric': metric, 'ratio': median,
+                                    'points': ratios})
+    return regressions
+
+
+def print_suite(results: Dict[str, Any], file=sys.stderr):
+    """以表格形式输出套件结果摘要"""
+    for name, series in results['series'].items():
+        exponent = series['exponent']
+        print(f"{name}  (exponent {'-' if exponent is None else f'{exponent:.2f}'})", file=file)
+        for point in series['points']:
+            print(f"  {point['size']:>9} {series['unit']:<12} {point['seconds']:>11.6f}s "
+                  f"{point['per_sec']:>14.0f}/s {point['peak_bytes']:>12} B", file=file)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='LR分析器性能基准')
+    arg_parser.add_argument('--levels', type=int, nargs='+', default=[10, 20, 40, 80],
+                            help='生成文法的运算符层数')
+    arg_parser.add_argument('--tables', action='store_true',
+                            help='比较分析表格式的大小和分析吞吐量')
+    arg_parser.add_argument('--parse', action='store_true',
+                            help='快速分析路径在1千到1百万个终结符上的扩展性')
+    arg_parser.add_argument('--trace', action='store_true',
+                            help='增量步骤记录与完整快照的内存对比')
+    arg_parser.add_argument('--lexer', action='store_true',
+                            help='词法分析器吞吐量对比')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='流式词法/语法分析的峰值内存')
+    arg_parser.add_argument('--token-buffer', action='store_true',
+                            help='Token 列表与 TokenBuffer 的内存和转换耗时')
+    arg_parser.add_argument('--batch', action='store_true',
+                            help='逐个请求与批量分析接口的吞吐量')
+    arg_parser.add_argument('--modes', action='store_true',
+                            help='比较 LR(0)/SLR(1)/LALR(1)/LR(1) 的构建耗时和表大小')
+    arg_parser.add_argument('--precedence', action='store_true',
+                            help='分层文法与优先级声明文法的对比')
+    arg_parser.add_argument('--first-follow', action='store_true',
+                            help='First/Follow 计算在1000个非终结符的生成文法上的耗时')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='增量修改文法后重新构建的延迟')
+    arg_parser.add_argument('--reparse', action='store_true',
+                            help='编辑器逐键增量重新分析与整体重新分析的延迟')
+    arg_parser.add_argument('--codegen', action='store_true',
+                            help='生成的分析器模块与解释执行的吞吐量及结论一致性')
+    arg_parser.add_argument('--evaluate', action='store_true',
+                            help='编译后的表达式在百万行列数据上的向量化求值与逐行遍历语法树')
+    arg_parser.add_argument('--suite', action='store_true',
+                            help='运行完整基准套件（词法、分阶段构建、分析），输出JSON')
+    arg_parser.add_argument('--max-tokens', type=int, default=10 ** 6,
+                            help='基准套件中表达式的最大终结符数')
+    arg_parser.add_argument('--repeat', type=int, default=3,
+                            help='基准套件每项计时的重复次数（取最短）')
+    arg_parser.add_argument('--output', help='基准套件结果JSON的保存路径（默认输出到标准输出）')
+    arg_parser.add_argument('--compare', metavar='BASELINE',
+                            help='与之前保存的套件结果比较，有退化时以状态码1退出')
+    arg_parser.add_argument('--threshold', type=float, default=0.25,
+                            help='判定退化的相对增长阈值')
+    args = arg_parser.parse_args()
+
+    if args.suite:
+        results = run_suite(args.max_tokens, args.repeat,
+                            progress=lambda group: print(f'运行 {group} ...', file=sys.stderr))
+        print_suite(results)
+        text = json.dumps(results, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare_suites(baseline, results, args.threshold)
+            print(f"与 {args.compare}（提交 {baseline['meta'].get('commit')}）比较："
+                  f"{len(regressions)} 处退化", file=sys.stderr)
+            for r in regressions:
+                points = ', '.join(f'{size}: x{ratio:.2f}' for size, ratio in r['points'])
+                print(f"  {r['series']} {r['metric']} x{r['ratio']:.2f} ({points})", file=sys.stderr)
+            if regressions:
+                sys.exit(1)
+        return
+
+    if args.evaluate:
+        for n_tokens in (10, 100, 1000):
+            print(bench_evaluate(n_tokens))
+        return
+
+    if args.codegen:
+        print(bench_codegen('default', DEFAULT_PRODUCTIONS, generate_expression))
+        for levels in args.levels:
+            print(bench_codegen(f'chain{levels}', generate_chain_grammar(levels),
+                                lambda n, seed: generate_chain_expression(levels, n, seed)))
+        return
+
+    if args.reparse:
+        for n_bytes in (10 ** 4, 10 ** 5, 10 ** 6):
+            print(bench_reparse(n_bytes))
+        return
+
+    if args.incremental:
+        for levels in args.levels + [200]:
+            middle = f'E{levels // 2}'
+            print(bench_incremental(f'chain{levels}', generate_chain_grammar(levels),
+                                    (middle, [middle, 'x', 'P'])))
+        for n_statements in (100, 400):
+            print(bench_incremental(f'language{n_statements}', generate_language_grammar(n_statements),
+                                    ('ITEM7', ['ITEM7', '[', 'num', ']'])))
+        return
+
+    if args.first_follow:
+        for n_non_terminals in (100, 1000, 3000):
+            print(bench_first_follow(n_non_terminals))
+        return
+
+    if args.precedence:
+        for levels in args.levels:
+            print(bench_precedence(levels))
+        return
+
+    if args.modes:
+        grammars = [('default', DEFAULT_PRODUCTIONS), ('statements', generate_statement_grammar())]
+        grammars += [(f'chain{levels}', generate_chain_grammar(levels)) for levels in args.levels]
+        print(f"{'文法':>10} {'模式':>5} {'耗时(s)':>9} {'状态':>6} {'动作':>7} "
+              f"{'稠密(B)':>9} {'压缩(B)':>9} {'移进/归约':>6} {'归约/归约':>6}")
+        for name, productions in grammars:
+            for r in bench_modes(name, productions):
+                print(f"{r['grammar']:>12} {r['mode']:>7} {r['build_seconds']:>10.4f} "
+                      f"{r['states']:>8} {r['actions']:>9} {r['dense_bytes']:>10} "
+                      f"{r['compressed_bytes']:>10} {r['shift_reduce']:>10} {r['reduce_reduce']:>10}")
+        return
+
+    if args.batch:
+        for count in (10 ** 3, 10 ** 4, 5 * 10 ** 4):
+            print(bench_batch(count))
+        return
+
+    if args.token_buffer:
+        for n_bytes in (10 ** 4, 10 ** 5, 10 ** 6):
+            print(bench_token_buffer(n_bytes))
+        return
+
+    if args.stream:
+        for n_bytes in (10 ** 5, 10 ** 6, 4 * 10 ** 6):
+            print(bench_stream(n_bytes))
+        return
+
+    if args.lexer:
+        for n_bytes in (10 ** 4, 10 ** 5, 10 ** 6):
+            print(bench_lexer(n_bytes))
+        return
+
+    if args.trace:
+        for n_tokens in (100, 1000, 3000):
+            print(bench_trace(n_tokens))
+        return
+
+    if args.parse:
+        for n_tokens in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+            print(bench_parse(n_tokens))
+        return
+
+    if args.tables:
+        for levels in [0] + args.levels:
+            print(bench_tables(levels))
+        return
+
+    print(f"{'层数':>6} {'产生式':>6} {'状态':>6} {'转移':>7} "
+          f"{'First/Follow':>13} {'项集族':>9} {'分析表':>9}")
+    for levels in args.levels:
+        r = bench_table_build(levels)
+        print(f"{r['levels']:>8} {r['productions']:>9} {r['states']:>8} {r['transitions']:>9} "
+              f"{r['first_follow']:>13.4f} {r['lr0_items']:>12.4f} {r['parsing_table']:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
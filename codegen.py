@@ -0,0 +1,165 @@
+import importlib.util
+import os
+import textwrap
+from types import ModuleType
+from typing import List, Sequence, Optional
+from lr_parser import LRParser
+from parse_tables import ERROR, SHIFT, REDUCE, ACCEPT
+
+# 生成模块中的分析循环。动作编码与 parse_tables 不同，按出现频率安排分支：
+# 正数 n 为移进到状态 n-1，负数 -(p+1) 为按产生式 p 归约，ACCEPT 为接受，0 为出错
+_PARSER_TEMPLATE = '''\
+"""{doc}"""
+
+GRAMMAR_HASH = {grammar_hash!r}
+MODE = {mode!r}
+
+# 产生式 (左部, 右部)
+PRODUCTIONS = {productions}
+
+TERMINALS = {terminals}
+NON_TERMINALS = {non_terminals}
+TERMINAL_IDS = {{symbol: i for i, symbol in enumerate(TERMINALS)}}
+# 分析表中没有的终结符对应每行最后一列（全为出错）
+UNKNOWN = len(TERMINALS)
+ACCEPT = -(len(PRODUCTIONS) + 1)
+
+# 动作表：每个状态一行，按终结符列号索引
+ACTION = (
+{action}
+)
+
+# 转移表：每个状态一行，按非终结符列号索引，-1 表示无转移
+GOTO = (
+{goto}
+)
+
+# 各产生式左部的非终结符列号和右部长度
+PRODUCTION_LHS = {production_lhs}
+PRODUCTION_LEN = {production_len}
+
+
+def recognize(tokens):
+    """分析终结符序列（以 '$' 结束，迭代器耗尽也视为 '$'）
+
+    返回 (是否接受, 出错的输入位置)，接受时出错位置为-1。
+    """
+    action = ACTION
+    goto = GOTO
+    production_lhs = PRODUCTION_LHS
+    production_len = PRODUCTION_LEN
+    get_column = TERMINAL_IDS.get
+    unknown = UNKNOWN
+    accept = ACCEPT
+
+    tokens = iter(tokens)
+    stack = [0]
+    push = stack.append
+    state = 0
+    position = 0
+    column = get_column(next(tokens, '$'), unknown)
+    while True:
+        code = action[state][column]
+        if code > 0:
+            state = code - 1
+            push(state)
+            position += 1
+            column = get_column(next(tokens, '$'), unknown)
+        elif code < 0:
+            if code == accept:
+                return True, -1
+            production = -code - 1
+            length = production_len[production]
+            if length:
+                del stack[-length:]
+            state = goto[stack[-1]][production_lhs[production]]
+            if state < 0:
+                return False, position
+            push(state)
+        else:
+            return False, position
+
+
+def parse(tokens):
+    """只返回是否接受"""
+    return recognize(tokens)[0]
+'''
+
+
+def _literal(values: Sequence) -> str:
+    """单行元组字面量"""
+    return repr(tuple(values))
+
+
+def _rows(rows: List[Sequence[int]], width: int = 96) -> str:
+    """每行一个元组的多行字面量，过长时折行"""
+    lines = []
+    for row in rows:
+        # 单元素的行需要尾随逗号才是元组
+        text = ', '.join(map(str, row)) + (',' if len(row) == 1 else '')
+        lines.append(textwrap.fill(f'({text}),', width, initial_indent='    ',
+                                   subsequent_indent='     '))
+    return '\n'.join(lines)
+
+
+def generate_parser_source(parser: LRParser) -> str:
+    """由构建好的分析器生成独立的Python模块源代码
+
+    生成的模块只包含常量形式的分析表和分析循环，不依赖 lr_parser，导入时无需构建。
+    """
+    tables = parser.tables
+    if tables is None:
+        raise RuntimeError('分析器尚未构建分析表')
+    n_terminals = len(tables.terminals)
+    n_productions = len(parser.productions)
+
+    action_rows = []
+    for state in range(tables.n_states):
+        row = []
+        for column in range(n_terminals):
+            code = tables.action_at(state, column)
+            kind = code & 3
+            if kind == SHIFT:
+                row.append((code >> 2) + 1)
+            elif kind == REDUCE:
+                row.append(-(code >> 2) - 1)
+            elif kind == ACCEPT:
+                row.append(-(n_productions + 1))
+            else:
+                row.append(ERROR)
+        row.append(ERROR)
+        action_rows.append(row)
+    goto_rows = [[tables.goto_at(state, column) for column in range(len(tables.non_terminals))]
+                 for state in range(tables.n_states)]
+
+    productions = '(\n' + ''.join(f'    {(p.left, tuple(p.right))!r},\n'
+                                  for p in parser.productions) + ')'
+    grammar_hash = parser.grammar_hash()
+    doc = (f'由 codegen.py 生成的LR分析器（文法 {grammar_hash[:12]}，模式 {parser.mode}），'
+           f'请勿手工修改\n\n'
+           f'{tables.n_states} 个状态，{n_terminals} 个终结符，{n_productions} 个产生式。\n')
+    return _PARSER_TEMPLATE.format(
+        doc=doc, grammar_hash=grammar_hash, mode=parser.mode, productions=productions,
+        terminals=_literal(tables.terminals), non_terminals=_literal(tables.non_terminals),
+        action=_rows(action_rows), goto=_rows(goto_rows),
+        production_lhs=_literal(tables.production_lhs),
+        production_len=_literal(tables.production_len))
+
+
+def write_parser_module(parser: LRParser, path: str):
+    """生成分析器模块并写入 path"""
+    source = generate_parser_source(parser)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(source)
+
+
+def load_parser_module(path: str, name: Optional[str] = None) -> ModuleType:
+    """按文件路径导入生成的分析器模块"""
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Sequence, Iterable, Iterator, Optional, Any
+from lexer import Token, StreamLexer
+from lr_parser import LRParser, ParseResult, grammar_hash, DEFAULT_MODE
+from parse_tables import TableFileError
+from token_buffer import TokenBuffer
+from worker_pool import map_ordered
+
+# 默认文法
+# S -> E
+# E -> E + T | T
+# T -> T * F | F
+# F -> ( E ) | id
+DEFAULT_PRODUCTIONS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('S', ('E',)),
+    ('E', ('E', '+', 'T')),
+    ('E', ('T',)),
+    ('T', ('T', '*', 'F')),
+    ('T', ('F',)),
+    ('F', ('(', 'E', ')')),
+    ('F', ('id',)),
+)
+
+# Token类型到终结符的映射
+TOKEN_TO_TERMINAL = {
+    'IDENTIFIER': 'id',
+    'INTEGER': 'id',
+    'FLOAT': 'id',
+    'PLUS': '+',
+    'MULTIPLY': '*',
+    'LPAREN': '(',
+    'RPAREN': ')',
+    'EOF': '$'
+}
+
+
+def normalize_grammar(productions: Iterable[Sequence], precedence: Iterable[Sequence] = ()
+                      ) -> Tuple[Tuple[Tuple, ...], Tuple[Tuple[str, Tuple[str, ...]], ...]]:
+    """将产生式和优先级声明规范为不可变的元组形式
+
+    产生式为 (左部, 右部) 或带 %prec 终结符的 (左部, 右部, 终结符)，
+    优先级声明为 (结合性, 终结符列表)，按优先级从低到高排列。
+    """
+    productions = tuple((left, tuple(right), *rest) for left, right, *rest in productions)
+    precedence = tuple((assoc, tuple(terminals)) for assoc, terminals in precedence)
+    return productions, precedence
+
+
+@dataclass(frozen=True)
+class TablesPayload:
+    """预先编码为JSON的分析表、First集和Follow集"""
+    # 完整的JSON文档 {"grammar", "mode", "parsing_table", "first_sets", "follow_sets"}
+    body: bytes
+    # 只含三个表的成员（不带花括号），用于拼接进 /analyze 的响应
+    fields: bytes
+    # 按 body 内容计算的强 ETag（不带引号）
+    etag: str
+
+
+class CompiledGrammar:
+    """编译好的文法：分析表只构建一次，分析器冻结后只读共享"""
+
+    def __init__(self, productions: Iterable[Sequence], cache_dir: Optional[str] = None,
+                 mode: str = DEFAULT_MODE, precedence: Iterable[Sequence] = (), build: bool = True):
+        """build 为False时只从 cache_dir 中的分析表文件加载，文件不可用时抛出 TableFileError"""
+        self.productions, self.precedence = normalize_grammar(productions, precedence)
+        self.key = grammar_hash(self.productions, self.precedence)
+        self.mode = mode
+
+        parser = LRParser()
+        parser.mode = mode
+        for left, right, *rest in self.productions:
+            parser.add_production(left, list(right), *rest)
+        for associativity, terminals in self.precedence:
+            parser.add_precedence(associativity, terminals)
+        if cache_dir:
+            # 多个工作进程 mmap 同一个分析表文件，共享物理页面
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, f'{self.key}.{mode}.lrtb')
+            if build:
+                parser.load_or_build(path)
+            elif not parser.try_load_tables(path):
+                raise TableFileError('分析表文件不存在或不可用')
+        elif not build:
+            raise ValueError('只加载分析表文件时必须指定 cache_dir')
+        else:
+            parser.build()
+        parser.freeze()
+        self.parser = parser
+        self._tables_payload: Optional[TablesPayload] = None
+        self._payload_lock = threading.Lock()
+
+    def tables_payload(self) -> TablesPayload:
+        """展示用的分析表、First集和Follow集，首次调用时格式化并编码，之后直接复用"""
+        payload = self._tables_payload
+        if payload is not None:
+            return payload
+        with self._payload_lock:
+            if self._tables_payload is None:
+                # 符号集合的遍历顺序随进程的哈希种子变化，按符号排序使各进程的内容和ETag一致
+                table = self.parser.get_parsing_table()
+                fields = json.dumps({
+                    'parsing_table': {state: dict(sorted(row.items())) for state, row in table.items()},
+                    'first_sets': dict(sorted(self.parser.get_first_sets().items())),
+                    'follow_sets': dict(sorted(self.parser.get_follow_sets().items()))
+                }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')[1:-1]
+                header = json.dumps({'grammar': self.key, 'mode': self.mode},
+                                    ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                body = header[:-1] + b',' + fields + b'}'
+                self._tables_payload = TablesPayload(body, fields,
+                                                     hashlib.sha256(body).hexdigest()[:32])
+            return self._tables_payload
+
+    def map_tokens(self, tokens: Iterable[Token]) -> List[str]:
+        """将词法单元转换为终结符序列（末尾补$）"""
+        mapped = [TOKEN_TO_TERMINAL.get(token.type, token.value)
+                  for token in tokens if token.type != 'EOF']
+        mapped.append('$')
+        return mapped
+
+    def iter_terminals(self, tokens: Iterable[Token]) -> Iterator[str]:
+        """惰性地将词法单元转换为终结符（EOF 对应 $）"""
+        for token in tokens:
+            yield TOKEN_TO_TERMINAL.get(token.type, token.value)
+
+    def parse_stream(self, source, chunk_size: int = 1 << 16) -> ParseResult:
+        """流式分析文本文件对象或字符串块迭代器，词法单元直接送入分析器，不生成中间列表"""
+        lexer = StreamLexer(source, chunk_size)
+        return self.parser.recognize(self.iter_terminals(lexer.iter_tokens()))
+
+    def analyze(self, expression: str) -> Dict[str, Any]:
+        """词法和语法分析一个表达式，只返回结论（不记录步骤）"""
+        try:
+            buffer = TokenBuffer.from_source(expression)
+            result = self.parser.recognize(buffer.terminals(TOKEN_TO_TERMINAL))
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        return {
+            'success': True,
+            'accepted': result.accepted,
+            'error_position': result.error_position,
+            'token_count': len(buffer) - 1
+        }
+
+    def analyze_batch(self, expressions: Iterable[str], executor: str = 'thread',
+                      workers: Optional[int] = None, chunk_size: int = 64,
+                      pool=None) -> Iterator[Dict[str, Any]]:
+        """批量分析表达式，按输入顺序产出结果，单个表达式出错不影响其他表达式
+
+        进程池中的工作进程通过各自的注册表按产生式获取编译文法（每个进程只构建一次）。
+        """
+        return map_ordered(_analyze_chunk, expressions, self.productions, self.mode,
+                           self.precedence, executor=executor, workers=workers,
+                           chunk_size=chunk_size, pool=pool)
+
+
+class GrammarRegistry:
+    """进程级的编译文法注册表，按文法哈希缓存，LRU淘汰
+
+    指定 cache_dir 时分析表会持久化到该目录，进程重启后直接 mmap 加载。
+    """
+
+    def __init__(self, maxsize: int = 32, cache_dir: Optional[str] = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._grammars: 'OrderedDict[Tuple[str, str], CompiledGrammar]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, productions: Iterable[Sequence], mode: str = DEFAULT_MODE,
+            precedence: Iterable[Sequence] = ()) -> CompiledGrammar:
+        """获取编译好的文法，不存在时构建并缓存（按文法哈希和构建模式区分）"""
+        productions, precedence = normalize_grammar(productions, precedence)
+        key = (grammar_hash(productions, precedence), mode)
+        with self._lock:
+            grammar = self._grammars.get(key)
+            if grammar is not None:
+                self._grammars.move_to_end(key)
+                self.hits += 1
+                return grammar
+            self.misses += 1
+
+        # 构建过程不持有锁，避免阻塞其他文法的查询
+        return self.add(CompiledGrammar(productions, self.cache_dir, mode, precedence))
+
+    def add(self, grammar: CompiledGrammar) -> CompiledGrammar:
+        """登记在别处编译好的文法，已有相同文法时返回已有的"""
+        key = (grammar.key, grammar.mode)
+        with self._lock:
+            existing = self._grammars.get(key)
+            if existing is not None:
+                self._grammars.move_to_end(key)
+                return existing
+            self._grammars[key] = grammar
+            while len(self._grammars) > self.maxsize:
+                self._grammars.popitem(last=False)
+        return grammar
+
+    def lookup(self, key: str, mode: str = DEFAULT_MODE) -> Optional[CompiledGrammar]:
+        """按文法哈希查找已编译的文法"""
+        with self._lock:
+            grammar = self._grammars.get((key, mode))
+            if grammar is not None:
+                self._grammars.move_to_end((key, mode))
+            return grammar
+
+    def clear(self):
+        """清空缓存和计数"""
+        with self._lock:
+            self._grammars.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中计数"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._grammars),
+                'maxsize': self.maxsize
+            }
+
+
+# 进程级注册表，环境变量 LR_TABLE_CACHE 指定分析表文件目录
+registry = GrammarRegistry(cache_dir=os.environ.get('LR_TABLE_CACHE'))
+
+
+def get_compiled_grammar(productions: Iterable[Sequence] = DEFAULT_PRODUCTIONS,
+                         mode: str = DEFAULT_MODE,
+                         precedence: Iterable[Sequence] = ()) -> CompiledGrammar:
+    """从进程级注册表获取编译好的文法"""
+    return registry.get(productions, mode, precedence)
+
+
+def _analyze_chunk(productions: Tuple[Tuple, ...], mode: str, precedence: Tuple[Tuple, ...],
+                   expressions: List[str]) -> List[Dict[str, Any]]:
+    """分析一批表达式（可在工作进程中执行）"""
+    grammar = get_compiled_grammar(productions, mode, precedence)
+    return [grammar.analyze(expression) for expression in expressions]
@@ -0,0 +1,251 @@
+from array import array
+from typing import List, Dict, Tuple, Optional, Mapping, Callable, Any
+from compiled_grammar import CompiledGrammar, get_compiled_grammar, TOKEN_TO_TERMINAL
+from lr_parser import LRParser
+from token_buffer import TokenBuffer
+
+# 语法树结点类型
+NAME = 0  # 变量，arg 为 names 下标
+CONST = 1  # 常量，arg 为 constants 下标
+UNARY = 2  # 一元运算，arg 为运算符下标，left 为操作数
+BINARY = 3  # 二元运算，arg 为运算符下标，left/right 为操作数
+
+# 支持的运算符：词法单元的值 -> Python 运算符（对 NumPy 数组即为逐元素的 ufunc）
+BINARY_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', '==': '=='}
+UNARY_OPERATORS = {'-': '-', '+': '+'}
+
+
+class NodeTable:
+    """数组形式的表达式语法树
+
+    每个结点占平行数组中的一行，子结点以行号引用；变量名、常量和运算符存放在各自的表中，
+    同名变量和相同常量只有一个结点。
+    """
+
+    def __init__(self):
+        self.kinds = array('b')
+        self.args = array('i')
+        self.left = array('i')
+        self.right = array('i')
+        self.names: List[str] = []
+        self.constants: List[Any] = []
+        self.operators: List[str] = []
+        self._leaves: Dict[Tuple[int, Any], int] = {}
+        self._operator_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def _add(self, kind: int, arg: int, left: int = -1, right: int = -1) -> int:
+        self.kinds.append(kind)
+        self.args.append(arg)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.kinds) - 1
+
+    def _operator(self, operator: str) -> int:
+        operator_id = self._operator_ids.get(operator)
+        if operator_id is None:
+            operator_id = self._operator_ids[operator] = len(self.operators)
+            self.operators.append(operator)
+        return operator_id
+
+    def name(self, name: str) -> int:
+        """变量结点"""
+        node = self._leaves.get((NAME, name))
+        if node is None:
+            self.names.append(name)
+            node = self._leaves[(NAME, name)] = self._add(NAME, len(self.names) - 1)
+        return node
+
+    def constant(self, value: Any) -> int:
+        """常量结点"""
+        key = (CONST, type(value), value)
+        node = self._leaves.get(key)
+        if node is None:
+            self.constants.append(value)
+            node = self._leaves[key] = self._add(CONST, len(self.constants) - 1)
+        return node
+
+    def leaf(self, text: str) -> int:
+        """由词法单元的值建立叶子：数字为常量，其余为变量"""
+        if text[0].isdigit():
+            if not text.isdigit():
+                return self.constant(float(text))
+            try:
+                return self.constant(int(text))
+            except ValueError:
+                # 超过 sys.get_int_max_str_digits() 位的整数不能由字符串转换
+                raise ValueError(f'整数常量过长: {len(text)} 位') from None
+        return self.name(text)
+
+    def unary(self, operator: str, operand: int) -> int:
+        return self._add(UNARY, self._operator(operator), operand)
+
+    def binary(self, operator: str, left: int, right: int) -> int:
+        return self._add(BINARY, self._operator(operator), left, right)
+
+    def format(self, root: int) -> str:
+        """完全加括号的表达式文本"""
+        parts: Dict[int, str] = {}
+        for node in self.postorder(root):
+            kind = self.kinds[node]
+            if kind == NAME:
+                parts[node] = self.names[self.args[node]]
+            elif kind == CONST:
+                parts[node] = repr(self.constants[self.args[node]])
+            elif kind == UNARY:
+                parts[node] = f'({self.operators[self.args[node]]}{parts[self.left[node]]})'
+            else:
+                parts[node] = (f'({parts[self.left[node]]} {self.operators[self.args[node]]} '
+                               f'{parts[self.right[node]]})')
+        return parts[root]
+
+    def postorder(self, root: int) -> List[int]:
+        """root 之下各结点的后序（子结点在前，每个结点只出现一次），不递归"""
+        order = []
+        seen = set()
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                order.append(node)
+                continue
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.append((node, True))
+            kind = self.kinds[node]
+            if kind == BINARY:
+                stack.append((self.right[node], False))
+            if kind in (UNARY, BINARY):
+                stack.append((self.left[node], False))
+        return order
+
+
+def tree_actions(parser: LRParser, nodes: NodeTable) -> Dict[int, Callable[[List[Any]], Any]]:
+    """按产生式的形状推断建立语法树的归约回调（供 LRParser.recognize 的 actions 使用）
+
+    叶子值为词法单元的值：A -> 终结符 为叶子，A -> X 运算符 Y 为二元运算，
+    A -> 运算符 X 为一元运算，A -> ( X ) 取括号内的结点，A -> X 沿用子结点。
+    其他形状的产生式抛出 ValueError。
+    """
+    non_terminals = parser.non_terminals
+    actions = {}
+    for production in parser.productions:
+        shape = ''.join('N' if symbol in non_terminals else 't' for symbol in production.right)
+        if shape == 't':
+            actions[production.id] = lambda children: nodes.leaf(children[0])
+        elif shape == 'NtN':
+            actions[production.id] = lambda children: nodes.binary(children[1], children[0],
+                                                                    children[2])
+        elif shape == 'tN':
+            actions[production.id] = lambda children: nodes.unary(children[0], children[1])
+        elif shape == 'tNt':
+            actions[production.id] = lambda children: children[1]
+        elif shape != 'N':
+            raise ValueError(f'无法为产生式 {production} 建立语法树结点')
+    return actions
+
+
+def parse_expression(source: str, grammar: Optional[CompiledGrammar] = None,
+                     token_terminals: Mapping[str, str] = TOKEN_TO_TERMINAL
+                     ) -> Tuple[NodeTable, int]:
+    """分析表达式并建立数组形式的语法树，返回 (结点表, 根结点)，语法错误时抛出 ValueError"""
+    grammar = grammar or get_compiled_grammar()
+    buffer = TokenBuffer.from_source(source)
+    nodes = NodeTable()
+    values = [value for _, value in buffer.items()]
+    result = grammar.parser.recognize(buffer.terminals(token_terminals),
+                                      actions=tree_actions(grammar.parser, nodes), values=values)
+    if not result.accepted:
+        raise ValueError(f'表达式在第 {result.error_position + 1} 个词法单元处有语法错误')
+    return nodes, result.value
+
+
+class CompiledExpression:
+    """编译好的表达式：语法树只遍历一次，生成直线形式的Python函数
+
+    函数的参数为表达式中的变量，每个运算结点一条赋值语句，中间结果用完后其变量即被复用，
+    对 NumPy 数组求值时每个运算是一次整列的向量化运算，行数再多也不再逐行遍历语法树。
+    不依赖 NumPy，传入标量或其他支持算术运算的对象同样可以求值。
+    """
+
+    def __init__(self, nodes: NodeTable, root: int):
+        self.nodes = nodes
+        self.root = root
+        self.names: List[str] = []
+        # 常量（包括折叠的结果）通过命名空间以 c0, c1, ... 传给生成的函数，不写入源代码
+        self.constants: Dict[str, Any] = {}
+        self.source = self._generate()
+        namespace: Dict[str, Any] = dict(self.constants)
+        exec(compile(self.source, '<expression>', 'exec'), namespace)
+        self._function = namespace['evaluate']
+
+    @classmethod
+    def from_source(cls, source: str, grammar: Optional[CompiledGrammar] = None,
+                    token_terminals: Mapping[str, str] = TOKEN_TO_TERMINAL) -> 'CompiledExpression':
+        """分析并编译表达式"""
+        return cls(*parse_expression(source, grammar, token_terminals))
+
+    def _generate(self) -> str:
+        nodes = self.nodes
+        operands: Dict[int, str] = {}
+        # 常量折叠后的值，只有常量子树才有
+        folded: Dict[int, Any] = {}
+        free: List[str] = []
+        temporaries = 0
+        lines = []
+        for node in nodes.postorder(self.root):
+            kind = nodes.kinds[node]
+            if kind == NAME:
+                operands[node] = f'v{len(self.names)}'
+                self.names.append(nodes.names[nodes.args[node]])
+                continue
+            if kind == CONST:
+                folded[node] = nodes.constants[nodes.args[node]]
+                operands[node] = self._constant(folded[node])
+                continue
+            operator = nodes.operators[nodes.args[node]]
+            children = [nodes.left[node]] if kind == UNARY else [nodes.left[node], nodes.right[node]]
+            table = UNARY_OPERATORS if kind == UNARY else BINARY_OPERATORS
+            if operator not in table:
+                raise ValueError(f'不支持的运算符: {operator}')
+            if kind == UNARY:
+                expression = f'{table[operator]}{operands[children[0]]}'
+            else:
+                expression = f'{operands[children[0]]} {table[operator]} {operands[children[1]]}'
+            if all(child in folded for child in children):
+                try:
+                    folded[node] = eval(expression, {}, self.constants)
+                    operands[node] = self._constant(folded[node])
+                    continue
+                except ArithmeticError:
+                    pass
+            # 操作数的临时变量在右部求值后即可复用为本结点的结果
+            for child in children:
+                if operands[child].startswith('t'):
+                    free.append(operands[child])
+            if free:
+                target = free.pop()
+            else:
+                target = f't{temporaries}'
+                temporaries += 1
+            lines.append(f'    {target} = {expression}')
+            operands[node] = target
+        lines.append(f'    return {operands[self.root]}')
+        parameters = ', '.join(f'v{i}' for i in range(len(self.names)))
+        return f'def evaluate({parameters}):\n' + '\n'.join(lines) + '\n'
+
+    def _constant(self, value: Any) -> str:
+        name = f'c{len(self.constants)}'
+        self.constants[name] = value
+        return name
+
+    def __call__(self, columns: Optional[Mapping[str, Any]] = None, **kwargs) -> Any:
+        """按变量名绑定数据求值，例如 expression({'x': x_array, 'y': y_array})"""
+        bindings = dict(columns or {}, **kwargs)
+        missing = [name for name in self.names if name not in bindings]
+        if missing:
+            raise ValueError(f'缺少变量: {", ".join(missing)}')
+        return self._function(*[bindings[name] for name in self.names])
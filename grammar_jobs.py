@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Any
+from compiled_grammar import CompiledGrammar, GrammarRegistry
+from grammar_text import GrammarSpec
+from lr_parser import DEFAULT_MODE, grammar_hash
+from metrics import stats
+from parse_tables import TableFileError
+
+# 编译任务的状态
+PENDING = 'pending'
+BUILDING = 'building'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class CompileQueueFull(RuntimeError):
+    """等待编译的文法过多"""
+
+
+class CompileJob:
+    """一个用户文法的编译任务，句柄由文法、词法单元映射和构建模式决定"""
+
+    def __init__(self, handle: str, spec: GrammarSpec, mode: str):
+        self.handle = handle
+        self.spec = spec
+        self.mode = mode
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.grammar: Optional[CompiledGrammar] = None
+        self.build_seconds: Optional[float] = None
+        self.done = threading.Event()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.done.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态的可序列化形式"""
+        result = {'handle': self.handle, 'mode': self.mode, 'status': self.status}
+        if self.status == FAILED:
+            result['error'] = self.error
+        elif self.status == READY:
+            result['grammar'] = self.grammar.key
+            result['states'] = self.grammar.parser.tables.n_states
+            # 未能由优先级消解的冲突数，从文件加载的分析表同样保存了冲突记录
+            result['conflicts'] = len(self.grammar.parser.conflicts)
+            if self.build_seconds is not None:
+                result['build_seconds'] = round(self.build_seconds, 6)
+        return result
+
+
+def _build_tables(spec: GrammarSpec, mode: str, path: str, conn):
+    """在子进程中构建分析表并写入 path，通过 conn 返回 (是否成功, 错误信息)"""
+    try:
+        parser = spec.to_parser(mode)
+        parser.build()
+        # 先写临时文件再改名，超时被终止时不会留下不完整的分析表文件
+        temporary = f'{path}.{os.getpid()}.tmp'
+        parser.save_tables(temporary)
+        os.replace(temporary, path)
+        conn.send((True, None))
+    except Exception as e:
+        conn.send((False, str(e) or type(e).__name__))
+    finally:
+        conn.close()
+
+
+class GrammarCompiler:
+    """后台编译用户文法
+
+    任务在有界的线程池中排队，等待中的任务数有上限；每个文法在子进程中构建，超过
+    time_limit 秒即终止，构建不占用服务进程的GIL。分析表通过表文件交给服务进程 mmap
+    加载并登记到注册表，之后与默认文法一样按文法哈希共享。
+    """
+
+    def __init__(self, registry: GrammarRegistry, workers: int = 1, max_pending: int = 16,
+                 time_limit: float = 30.0, table_dir: Optional[str] = None, max_jobs: int = 256):
+        self.registry = registry
+        self.workers = workers
+        self.max_pending = max_pending
+        self.time_limit = time_limit
+        self.table_dir = table_dir or registry.cache_dir
+        self.max_jobs = max_jobs
+        self._jobs: 'OrderedDict[str, CompileJob]' = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, spec: GrammarSpec, mode: str = DEFAULT_MODE) -> CompileJob:
+        """提交编译任务，相同的文法只编译一次；队列已满时抛出 CompileQueueFull"""
+        handle = spec.handle(mode)
+        with self._lock:
+            job = self._jobs.get(handle)
+            if job is not None and job.status != FAILED:
+                self._jobs.move_to_end(handle)
+                return job
+            job = CompileJob(handle, spec, mode)
+            grammar = self.registry.lookup(grammar_hash(spec.productions, spec.precedence), mode)
+            if grammar is not None:
+                job.grammar = grammar
+                job.finish(READY)
+            else:
+                if self._pending >= self.max_pending:
+                    raise CompileQueueFull('等待编译的文法过多，请稍后再试')
+                self._pending += 1
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='grammar-compiler')
+                self._pool.submit(self._run, job)
+            self._jobs[handle] = job
+            self._evict()
+        return job
+
+    def get(self, handle: str) -> Optional[CompileJob]:
+        """按句柄查找编译任务"""
+        with self._lock:
+            job = self._jobs.get(handle)
+            if job is not None:
+                self._jobs.move_to_end(handle)
+            return job
+
+    def lookup(self, key: str, mode: str = DEFAULT_MODE) -> Optional[CompiledGrammar]:
+        """按文法哈希和模式查找已编译完成的文法；注册表淘汰后只要句柄还在仍可找到"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == READY and job.mode == mode and job.grammar.key == key:
+                    return job.grammar
+        return None
+
+    def _evict(self):
+        """任务数超过上限时淘汰最久未使用的已结束任务"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for handle in [handle for handle, job in self._jobs.items()
+                       if job.done.is_set()][:excess]:
+            del self._jobs[handle]
+
+    def _directory(self) -> str:
+        """分析表文件目录，未配置时使用进程级临时目录"""
+        if self.table_dir is None:
+            self.table_dir = tempfile.mkdtemp(prefix='lr-tables-')
+        return self.table_dir
+
+    def _run(self, job: CompileJob):
+        start = time.perf_counter()
+        try:
+            job.status = BUILDING
+            spec = job.spec
+            directory = self._directory()
+            key = grammar_hash(spec.productions, spec.precedence)
+            path = os.path.join(directory, f'{key}.{job.mode}.lrtb')
+            try:
+                # 已有的表文件经校验后直接 mmap 加载
+                grammar = CompiledGrammar(spec.productions, directory, job.mode, spec.precedence,
+                                          build=False)
+            except TableFileError:
+                # 文件不存在、损坏或已过期，同样在有时间限制的子进程中重新构建
+                ok, error = self._build_in_subprocess(spec, job.mode, path)
+                if not ok:
+                    job.finish(FAILED, error)
+                    return
+                grammar = CompiledGrammar(spec.productions, directory, job.mode, spec.precedence,
+                                          build=False)
+            job.grammar = self.registry.add(grammar)
+            job.build_seconds = time.perf_counter() - start
+            if stats.enabled:
+                stats.observe('grammar.compile', job.build_seconds)
+            job.finish(READY)
+        except Exception as e:
+            job.finish(FAILED, str(e) or type(e).__name__)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _build_in_subprocess(self, spec: GrammarSpec, mode: str, path: str):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_build_tables, args=(spec, mode, path, sender),
+                                          daemon=True)
+        process.start()
+        sender.close()
+        try:
+            if not receiver.poll(self.time_limit):
+                return False, f'构建超过时间限制（{self.time_limit:g} 秒）'
+            try:
+                return receiver.recv()
+            except EOFError:
+                process.join()
+                return False, f'构建进程异常退出（退出码 {process.exitcode}）'
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            temporary = f'{path}.{process.pid}.tmp'
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def shutdown(self):
+        """停止接受任务并等待正在进行的编译结束"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional
+from lexer import KEYWORDS, OPERATORS
+from lr_parser import LRParser, ASSOCIATIVITIES, DEFAULT_MODE, grammar_hash
+
+# 文法文本格式（类BNF，终结符必须显式声明）：
+#
+#   # 注释
+#   %token id = IDENTIFIER INTEGER FLOAT   # 终结符 id 对应这些词法单元类型
+#   %token + * ( )                         # 按词法单元的值匹配的终结符
+#   %left +                                # 优先级，后声明的更高
+#   %left *
+#   S -> E
+#   E -> E + T | T
+#        | E - T %prec +                   # 以 | 开头的行继续上一条规则
+#   F -> ( E ) | id | ε                    # ε 或空候选式表示空串
+#
+# 第一条规则的左部为开始符号。符号以空白分隔，含空白或保留字符的符号用单引号括起（如 '|'）。
+
+# 可以绑定到终结符的词法单元类型
+TOKEN_TYPES = frozenset(['IDENTIFIER', 'INTEGER', 'FLOAT', *KEYWORDS.values(),
+                         *(token_type for _, token_type in OPERATORS)])
+
+# 文法文本的词：注释、引号括起的符号或不含空白的符号
+_WORD_PATTERN = re.compile(r"\s*(?:(#.*)|'((?:[^'\\]|\\.)*)'|(\S+))")
+_ARROWS = ('->', '::=')
+
+
+class GrammarTextError(ValueError):
+    """文法文本格式错误"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f'第{line}行: {message}')
+        self.line = line
+
+
+@dataclass
+class GrammarSpec:
+    """由文法文本解析得到的文法：产生式、优先级声明和终结符"""
+    # (左部, 右部) 或带 %prec 终结符的 (左部, 右部, 终结符)，与 CompiledGrammar 的形式相同
+    productions: Tuple[Tuple, ...]
+    precedence: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    # 声明的终结符，按声明顺序
+    terminals: Tuple[str, ...]
+    # 词法单元类型 -> 终结符（EOF 对应 $），未绑定类型的词法单元按值匹配终结符
+    token_terminals: Dict[str, str] = field(default_factory=dict)
+
+    def handle(self, mode: str = DEFAULT_MODE) -> str:
+        """文法、词法单元映射和构建模式的规范哈希，作为编译结果的句柄"""
+        canonical = json.dumps([grammar_hash(self.productions, self.precedence),
+                                sorted(self.token_terminals.items()), mode],
+                               ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def to_parser(self, mode: str = DEFAULT_MODE) -> LRParser:
+        """建立未构建分析表的分析器"""
+        parser = LRParser()
+        parser.mode = mode
+        for left, right, *rest in self.productions:
+            parser.add_production(left, list(right), *rest)
+        for associativity, terminals in self.precedence:
+            parser.add_precedence(associativity, terminals)
+        return parser
+
+
+def _words(text: str, line: int) -> List[Tuple[str, bool]]:
+    """一行中的词 (文本, 是否带引号)，# 之后为注释"""
+    words = []
+    pos = 0
+    while pos < len(text):
+        match = _WORD_PATTERN.match(text, pos)
+        if match is None:
+            break
+        pos = match.end()
+        if match.group(1) is not None:
+            break
+        if match.group(2) is not None:
+            symbol = re.sub(r'\\(.)', r'\1', match.group(2))
+            if not symbol:
+                raise GrammarTextError(line, '符号不能为空')
+            words.append((symbol, True))
+        elif match.group(3) is not None:
+            words.append((match.group(3), False))
+    return words
+
+
+def parse_grammar(text: str) -> GrammarSpec:
+    """解析文法文本，格式错误、符号未声明或声明冲突时抛出 GrammarTextError"""
+    terminals: Dict[str, int] = {}  # 终结符 -> 声明所在行
+    token_terminals: Dict[str, str] = {}
+    precedence: List[Tuple[str, Tuple[str, ...]]] = []
+    precedence_lines: List[int] = []
+    # (左部, 右部, %prec终结符, 行号)
+    rules: List[Tuple[str, Tuple[str, ...], Optional[str], int]] = []
+    left: Optional[str] = None
+
+    for line, raw in enumerate(text.splitlines(), 1):
+        words = _words(raw, line)
+        if not words:
+            continue
+        first, quoted = words[0]
+
+        if first.startswith('%') and not quoted:
+            directive = first[1:]
+            names = [word for word, _ in words[1:]]
+            if directive == 'token':
+                if len(words) >= 2 and words[1] == ('=', False):
+                    raise GrammarTextError(line, '%token 缺少终结符名')
+                if len(words) >= 3 and words[2] == ('=', False):
+                    # %token 终结符 = 词法单元类型...
+                    names, types = names[:1], names[2:]
+                    if not types:
+                        raise GrammarTextError(line, f'终结符 {names[0]} 缺少词法单元类型')
+                    for token_type in types:
+                        if token_type not in TOKEN_TYPES:
+                            raise GrammarTextError(line, f'未知的词法单元类型: {token_type}')
+                        if token_type in token_terminals:
+                            raise GrammarTextError(
+                                line, f'词法单元类型 {token_type} 已对应终结符 {token_terminals[token_type]}')
+                        token_terminals[token_type] = names[0]
+                if not names:
+                    raise GrammarTextError(line, '%token 缺少终结符')
+                for name in names:
+                    if name == '$':
+                        raise GrammarTextError(line, '$ 是保留的输入结束符')
+                    if name in terminals:
+                        raise GrammarTextError(line, f'终结符 {name} 重复声明（第{terminals[name]}行）')
+                    terminals[name] = line
+            elif directive in ASSOCIATIVITIES:
+                if not names:
+                    raise GrammarTextError(line, f'%{directive} 缺少终结符')
+                precedence.append((directive, tuple(names)))
+                precedence_lines.append(line)
+            else:
+                raise GrammarTextError(line, f'未知的声明: {first}')
+            continue
+
+        if first == '|' and not quoted:
+            if left is None:
+                raise GrammarTextError(line, '以 | 开头的行之前没有规则')
+            body = words
+        else:
+            if len(words) < 2 or words[1][1] or words[1][0] not in _ARROWS:
+                raise GrammarTextError(line, '规则应为 左部 -> 候选式 | 候选式 ...')
+            left = first
+            body = [('|', False)] + words[2:]
+
+        # body 以 | 开头，按不带引号的 | 切分为候选式
+        alternatives: List[List[Tuple[str, bool]]] = []
+        for word in body:
+            if word == ('|', False):
+                alternatives.append([])
+            else:
+                alternatives[-1].append(word)
+        for alternative in alternatives:
+            prec = None
+            if len(alternative) >= 2 and alternative[-2] == ('%prec', False):
+                prec = alternative[-1][0]
+                alternative = alternative[:-2]
+            right = tuple(symbol for symbol, quoted in alternative
+                          if quoted or symbol != 'ε')
+            for symbol, quoted in alternative:
+                if not quoted and (symbol in _ARROWS or symbol.startswith('%')):
+                    raise GrammarTextError(line, f'候选式中不能出现 {symbol}，需要时用引号括起')
+            rules.append((left, right, prec, line))
+
+    if not rules:
+        raise GrammarTextError(1, '文法中没有规则')
+    non_terminals = {rule_left for rule_left, _, _, _ in rules}
+    productions = []
+    for rule_left, right, prec, line in rules:
+        if rule_left in terminals:
+            raise GrammarTextError(line, f'终结符 {rule_left} 不能作为规则左部')
+        for symbol in right:
+            if symbol not in terminals and symbol not in non_terminals:
+                raise GrammarTextError(line, f'未声明的符号: {symbol}')
+        if prec is not None:
+            if prec not in terminals:
+                raise GrammarTextError(line, f'%prec 的 {prec} 不是已声明的终结符')
+            productions.append((rule_left, right, prec))
+        else:
+            productions.append((rule_left, right))
+    for (_, names), line in zip(precedence, precedence_lines):
+        for name in names:
+            if name not in terminals:
+                raise GrammarTextError(line, f'优先级声明中的 {name} 不是已声明的终结符')
+
+    token_terminals['EOF'] = '$'
+    return GrammarSpec(tuple(productions), tuple(precedence), tuple(terminals), token_terminals)
@@ -1,5 +1,72 @@
-from typing import List, Optional, Dict
+import re
+import sys
+from bisect import bisect_right
+from typing import List, Optional, Dict, Iterator, Iterable, Tuple, TextIO, Union
 from dataclasses import dataclass
+from worker_pool import map_ordered
+from metrics import stats
+
+# 关键字
+KEYWORDS: Dict[str, str] = {
+    'if': 'IF',
+    'else': 'ELSE',
+    'while': 'WHILE',
+    'int': 'INT',
+    'float': 'FLOAT',
+    'return': 'RETURN'
+}
+
+# 运算符和分隔符（长的在前，保证最长匹配）
+OPERATORS: List[Tuple[str, str]] = [
+    ('==', 'EQUALS'),
+    ('+', 'PLUS'),
+    ('-', 'MINUS'),
+    ('*', 'MULTIPLY'),
+    ('/', 'DIVIDE'),
+    ('(', 'LPAREN'),
+    (')', 'RPAREN'),
+    ('{', 'LBRACE'),
+    ('}', 'RBRACE'),
+    ('=', 'ASSIGN'),
+    (';', 'SEMICOLON'),
+]
+
+
+def _char_ranges(chars: Iterable[str]) -> str:
+    """字符集合写成正则字符类中的区间形式"""
+    codes = sorted(map(ord, chars))
+    parts = []
+    i = 0
+    while i < len(codes):
+        j = i
+        while j + 1 < len(codes) and codes[j + 1] == codes[j] + 1:
+            j += 1
+        parts.append(re.escape(chr(codes[i])) + (f'-{re.escape(chr(codes[j]))}' if j > i else ''))
+        i = j + 1
+    return ''.join(parts)
+
+
+# \s 和 \w 与 str.isspace()、isalnum() 或 '_' 一致，但 \d 只匹配十进制数字，[^\W\d] 还会匹配 ½ 等
+# 其他数字字符。Lexer 按 isdigit()/isalpha() 分类，这里补上差异：上标等非十进制的数字属于数字，
+# 既非十进制数字也非字母的数字字符不能作为标识符的开头。这两类字符类逐个区间比较，较慢，
+# 只在遇到非ASCII字符时才尝试
+_NUMERIC = ''.join(filter(str.isnumeric, map(chr, range(sys.maxunicode + 1))))
+_OTHER_DIGITS = _char_ranges(c for c in _NUMERIC if c.isdigit() and not c.isdecimal())
+_NON_LETTERS = _char_ranges(c for c in _NUMERIC if not c.isdecimal() and not c.isalpha())
+_NON_ASCII = r'(?=[^\x00-\x7f])'
+
+# 声明式的词法规则，组合为一个主正则表达式。每次匹配得到
+# (前导空白, 数字, 标识符/关键字/运算符, 非法字符) 四个分组，输入中的每个字符都会被覆盖；
+# 末尾的空白以三个分组都为空的一次匹配结束（否则空白会在每个位置被重试，耗时与其长度的平方成正比）
+TOKEN_SPEC: List[Tuple[str, str]] = [
+    ('NUMBER', rf'(?:[0-9]|{_NON_ASCII}[\d{_OTHER_DIGITS}])[\d.]*'
+               rf'(?:{_NON_ASCII}[{_OTHER_DIGITS}][\d.{_OTHER_DIGITS}]*)?'),
+    ('WORD', r'[A-Za-z_]\w*|' + '|'.join(re.escape(lexeme) for lexeme, _ in OPERATORS) +
+             rf'|{_NON_ASCII}[^\W\d{_NON_LETTERS}]\w*'),
+    ('ILLEGAL', r'\S'),
+]
+MASTER_PATTERN = re.compile(
+    r'(\s*)(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPEC) + r'|\Z)')
 
 @dataclass
 class Token:
@@ -20,14 +87,7 @@ class Lexer:
         self.current_char = self.source_code[0] if source_code else None
         
         # 定义关键字
-        self.keywords = {
-            'if': 'IF',
-            'else': 'ELSE',
-            'while': 'WHILE',
-            'int': 'INT',
-            'float': 'FLOAT',
-            'return': 'RETURN'
-        }
+        self.keywords = dict(KEYWORDS)
         
     def error(self):
         raise Exception(f'非法字符 {self.current_char} 在位置 {self.line}:{self.column}')
@@ -54,6 +114,8 @@ class Lexer:
         """解析数字"""
         result = ''
         token_type = 'INTEGER'
+        start_line = self.line
+        start_column = self.column
         
         while self.current_char and (self.current_char.isdigit() or self.current_char == '.'):
             if self.current_char == '.':
@@ -66,13 +128,14 @@ class Lexer:
         return Token(
             type=token_type,
             value=result,
-            line=self.line,
-            column=self.column - len(result)
+            line=start_line,
+            column=start_column
         )
     
     def get_identifier(self) -> Token:
         """解析标识符或关键字"""
         result = ''
+        start_line = self.line
         start_column = self.column
         
         while self.current_char and (self.current_char.isalnum() or self.current_char == '_'):
@@ -84,7 +147,7 @@ class Lexer:
         return Token(
             type=token_type,
             value=result,
-            line=self.line,
+            line=start_line,
             column=start_column
         )
     
@@ -147,13 +210,14 @@ class Lexer:
                 return token
                 
             if self.current_char == '=':
+                current_line = self.line
                 current_column = self.column
                 self.advance()
                 if self.current_char == '=':
-                    token = Token('EQUALS', '==', self.line, current_column)
+                    token = Token('EQUALS', '==', current_line, current_column)
                     self.advance()
                 else:
-                    token = Token('ASSIGN', '=', self.line, current_column)
+                    token = Token('ASSIGN', '=', current_line, current_column)
                 return token
                 
             if self.current_char == ';':
@@ -168,9 +232,282 @@ class Lexer:
     def tokenize(self) -> List[Token]:
         """将源代码转换为词法单元列表"""
         tokens = []
-        while True:
-            token = self.get_next_token()
-            tokens.append(token)
-            if token.type == 'EOF':
-                break
-        return tokens 
\ No newline at end of file
+        with stats.phase('lex'):
+            while True:
+                token = self.get_next_token()
+                tokens.append(token)
+                if token.type == 'EOF':
+                    break
+        if stats.enabled:
+            stats.count('tokens', len(tokens) - 1)
+        return tokens
+
+    @classmethod
+    def tokenize_batch(cls, sources: Iterable[str], executor: str = 'thread',
+                       workers: Optional[int] = None, chunk_size: int = 64,
+                       pool=None) -> Iterator[List[Token]]:
+        """批量词法分析，按输入顺序产出每个源代码的词法单元列表"""
+        return map_ordered(_tokenize_chunk, sources, cls, executor=executor,
+                           workers=workers, chunk_size=chunk_size, pool=pool)
+
+
+def _tokenize_chunk(lexer_class, sources: List[str]) -> List[List[Token]]:
+    """用指定的词法分析器类处理一批源代码（可在工作进程中执行）"""
+    return [lexer_class(source).tokenize() for source in sources]
+
+
+class LineIndex:
+    """字符偏移到 (行, 列) 的转换，与 Lexer 的行列计数方式一致
+
+    Lexer.advance 在移动到换行符时才计行，第0个字符即使是换行也不计入行号。
+    position() 在首次查询时建立换行符偏移索引，之后二分查找；只查询一次时用 locate()。
+    """
+    # 计入行号的换行符的最小偏移
+    FIRST = 1
+
+    def __init__(self, text: str):
+        self.text = text
+        self._newlines: Optional[List[int]] = None
+
+    @classmethod
+    def newlines(cls, text: str, base: int, start: int, end: int) -> Tuple[int, int]:
+        """text[start:end] 中计入行号的换行数和最后一个的偏移，base 为 text 在整个输入中的偏移"""
+        start = max(start, cls.FIRST - base)
+        count = text.count('\n', start, end) if start < end else 0
+        return count, base + text.rfind('\n', start, end) if count else -1
+
+    @classmethod
+    def locate(cls, text: str, offset: int) -> Tuple[int, int]:
+        """不建立索引直接计算 offset 处的 (行, 列)"""
+        count, last = cls.newlines(text, 0, 0, offset + 1)
+        return (count + 1, offset - last + 1) if count else (1, offset + 1)
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """offset 处的 (行, 列)"""
+        if self._newlines is None:
+            self._newlines = [m.start() for m in re.finditer('\n', self.text)
+                              if m.start() >= self.FIRST]
+        k = bisect_right(self._newlines, offset)
+        if k == 0:
+            return 1, offset + 1
+        return k + 1, offset - self._newlines[k - 1] + 1
+
+
+class ScanState:
+    """跨输入片段保持的扫描位置：行号及行首换行符前一位置（列号 = 偏移 - line_start）"""
+    __slots__ = ('line', 'line_start')
+    
+    def __init__(self):
+        self.line = 1
+        self.line_start = -1
+    
+    def advance_lines(self, text: str, base: int, start: int, end: int):
+        """统计 text[start:end] 中的换行，base 为 text 在整个输入中的偏移"""
+        count, last = LineIndex.newlines(text, base, start, end)
+        if count:
+            self.line += count
+            self.line_start = last - 1
+
+
+def word_types(keywords: Dict[str, str], operators: Dict[str, str]) -> Dict[str, str]:
+    """运算符和关键字合并为一张表，分类时只需一次字典查找"""
+    types = dict(operators)
+    types.update(keywords)
+    return types
+
+
+def scan_segment(text: str, base: int, state: ScanState, types: Dict[str, str]
+                 ) -> Iterator[Tuple[str, str, int, int, int]]:
+    """扫描一段完整的输入（不会把词法单元截断在片段中间）
+
+    生成 (类型, 值, 起始偏移, 行, 列)，偏移相对整个输入，base 为本片段的起始偏移。
+    """
+    position = 0
+    for whitespace, number, word, illegal in MASTER_PATTERN.findall(text):
+        if whitespace:
+            # 换行只会出现在前导空白中
+            if '\n' in whitespace:
+                state.advance_lines(text, base, position, position + len(whitespace))
+            position += len(whitespace)
+        
+        offset = base + position
+        if word:
+            yield types.get(word, 'IDENTIFIER'), word, offset, state.line, offset - state.line_start
+            position += len(word)
+        elif number:
+            dot = number.find('.')
+            if dot == -1:
+                token_type = 'INTEGER'
+            else:
+                second_dot = number.find('.', dot + 1)
+                if second_dot != -1:
+                    raise Exception(f'非法字符 . 在位置 {state.line}:'
+                                    f'{offset + second_dot - state.line_start}')
+                token_type = 'FLOAT'
+            yield token_type, number, offset, state.line, offset - state.line_start
+            position += len(number)
+        elif illegal:
+            raise Exception(f'非法字符 {illegal} 在位置 {state.line}:{offset - state.line_start}')
+
+
+def scan_from(text: str, pos: int, types: Dict[str, str]) -> Iterator[Tuple[str, int, int]]:
+    """从词法单元边界 pos 起惰性扫描，生成 (类型, 起始偏移, 长度)
+
+    扫描结果只取决于 pos 之后的文本，增量重新分析时可以只扫描被编辑的区域，
+    出错时才计算行列号。
+    """
+    for match in MASTER_PATTERN.finditer(text, pos):
+        group = match.lastindex
+        if group is None or group == 1:
+            # 只有末尾的空白
+            return
+        start = match.start(group)
+        end = match.end()
+        if group == 3:
+            yield types.get(text[start:end], 'IDENTIFIER'), start, end - start
+        elif group == 2:
+            dot = text.find('.', start, end)
+            if dot != -1:
+                second_dot = text.find('.', dot + 1, end)
+                if second_dot != -1:
+                    line, column = LineIndex.locate(text, second_dot)
+                    raise Exception(f'非法字符 . 在位置 {line}:{column}')
+            yield 'INTEGER' if dot == -1 else 'FLOAT', start, end - start
+        else:
+            line, column = LineIndex.locate(text, start)
+            raise Exception(f'非法字符 {text[start]} 在位置 {line}:{column}')
+
+
+class RegexLexer:
+    """基于主正则表达式的词法分析器，输出与 Lexer 相同的 Token 序列
+
+    整个输入由一个主正则表达式在C层一次扫描完成，Python层只做分类；行号只在
+    前导空白中增量统计，出错位置和EOF的行列号通过惰性建立的换行符偏移索引二分查找得到。
+    """
+    
+    def __init__(self, source_code: str):
+        self.source_code = source_code
+        self.keywords = dict(KEYWORDS)
+        self.operators = dict((lexeme, token_type) for lexeme, token_type in OPERATORS)
+        self._lines = LineIndex(source_code)
+        self._tokens: Optional[Iterator[Token]] = None
+        self._eof: Optional[Token] = None
+    
+    def position(self, offset: int) -> Tuple[int, int]:
+        """将字符偏移转换为 (行, 列)，与 Lexer 的行列计数方式一致"""
+        return self._lines.position(offset)
+    
+    def error(self, offset: int):
+        line, column = self.position(offset)
+        raise Exception(f'非法字符 {self.source_code[offset]} 在位置 {line}:{column}')
+    
+    def scan(self) -> Iterator[Tuple[str, str, int, int, int]]:
+        """扫描输入，逐个生成 (类型, 值, 起始偏移, 行, 列)，不含EOF，不创建 Token"""
+        return scan_segment(self.source_code, 0, ScanState(), word_types(self.keywords, self.operators))
+    
+    def eof_token(self) -> Token:
+        """输入末尾的EOF词法单元"""
+        end = len(self.source_code)
+        line, column = self.position(end - 1) if end else (1, 1)
+        return Token('EOF', '', line, column)
+    
+    def iter_tokens(self) -> Iterator[Token]:
+        """逐个生成词法单元，最后一个为EOF"""
+        for token_type, value, _, line, column in self.scan():
+            yield Token(token_type, value, line, column)
+        yield self.eof_token()
+    
+    def get_next_token(self) -> Token:
+        """获取下一个词法单元"""
+        if self._tokens is None:
+            self._tokens = self.iter_tokens()
+        token = next(self._tokens, None)
+        if token is None:
+            # 与 Lexer 一致，到达末尾后重复返回EOF
+            return self._eof
+        if token.type == 'EOF':
+            self._eof = token
+        return token
+    
+    def tokenize(self) -> List[Token]:
+        """将源代码转换为词法单元列表"""
+        with stats.phase('lex'):
+            tokens = [Token(token_type, value, line, column)
+                      for token_type, value, _, line, column in self.scan()]
+            tokens.append(self.eof_token())
+        if stats.enabled:
+            stats.count('tokens', len(tokens) - 1)
+        return tokens
+
+    # 批量接口与 Lexer 相同
+    tokenize_batch = classmethod(Lexer.tokenize_batch.__func__)
+
+
+# 可以安全切分输入的字符：空白和不会成为更长运算符前缀的单字符运算符
+SAFE_BOUNDARY_CHARS = frozenset(
+    lexeme for lexeme, _ in OPERATORS
+    if len(lexeme) == 1 and not any(other != lexeme and other.startswith(lexeme)
+                                    for other, _ in OPERATORS)
+)
+
+
+class StreamLexer:
+    """流式词法分析器，从文本文件对象或字符串块迭代器读取输入
+
+    只在空白或单字符运算符之后切分缓冲区，跨块的数字、标识符和 '==' 会留到下一块
+    拼接完整后再扫描，内存占用与块大小相关而与输入大小无关。输出与 Lexer 相同。
+    """
+    
+    def __init__(self, source: Union[TextIO, Iterable[str]], chunk_size: int = 1 << 16):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.keywords = dict(KEYWORDS)
+        self.operators = dict((lexeme, token_type) for lexeme, token_type in OPERATORS)
+    
+    def chunks(self) -> Iterator[str]:
+        """按块读取输入"""
+        if hasattr(self.source, 'read'):
+            return iter(lambda: self.source.read(self.chunk_size), '')
+        if isinstance(self.source, str):
+            return iter([self.source])
+        return iter(self.source)
+    
+    @staticmethod
+    def safe_cut(buffer: str) -> int:
+        """缓冲区中最后一个可安全切分的位置，之前的词法单元都已完整"""
+        for i in range(len(buffer) - 1, -1, -1):
+            char = buffer[i]
+            if char in SAFE_BOUNDARY_CHARS or char.isspace():
+                return i + 1
+        return 0
+    
+    def scan(self) -> Iterator[Tuple[str, str, int, int, int]]:
+        """逐个生成 (类型, 值, 起始偏移, 行, 列)，不含EOF，不创建 Token"""
+        types = word_types(self.keywords, self.operators)
+        state = ScanState()
+        self._state = state
+        buffer = ''
+        base = 0
+        for chunk in self.chunks():
+            buffer = buffer + chunk if buffer else chunk
+            cut = self.safe_cut(buffer)
+            if cut:
+                yield from scan_segment(buffer[:cut], base, state, types)
+                base += cut
+                buffer = buffer[cut:]
+        if buffer:
+            yield from scan_segment(buffer, base, state, types)
+            base += len(buffer)
+        self._length = base
+    
+    def iter_tokens(self) -> Iterator[Token]:
+        """逐个生成词法单元，最后一个为EOF"""
+        for token_type, value, _, line, column in self.scan():
+            yield Token(token_type, value, line, column)
+        if self._length:
+            yield Token('EOF', '', self._state.line, self._length - 1 - self._state.line_start)
+        else:
+            yield Token('EOF', '', 1, 1)
+    
+    def __iter__(self) -> Iterator[Token]:
+        return self.iter_tokens()
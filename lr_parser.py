@@ -1,31 +1,175 @@
-from typing import List, Dict, Set, Tuple
+import hashlib
+import json
+from functools import partial
+from typing import (List, Dict, Set, Tuple, Iterable, Sequence, Mapping, Optional,
+                    Callable, Any, Iterator)
 from dataclasses import dataclass
 from lexer import Token
+from parse_tables import (ParseTables, ActionTableView, GotoTableView, TableFileError,
+                          write_table_file, read_table_file,
+                          ERROR, SHIFT, REDUCE, ACCEPT, NO_GOTO)
+from parse_trace import ParseTrace
+from worker_pool import map_ordered
+from metrics import stats
+
+
+def grammar_hash(productions: Iterable[Sequence], precedence: Sequence = ()) -> str:
+    """计算文法的规范哈希（顺序相关，产生式编号即其下标）
+    
+    产生式为 (左部, 右部) 或 (左部, 右部, %prec终结符)；precedence 为
+    (结合性, 终结符列表) 序列，为空时不影响哈希。
+    """
+    canonical = [[p[0], list(p[1])] + [prec for prec in p[2:] if prec is not None]
+                 for p in productions]
+    if precedence:
+        canonical = [canonical, [[assoc, list(terminals)] for assoc, terminals in precedence]]
+    canonical = json.dumps(canonical, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
-@dataclass
 class Production:
-    """产生式类"""
-    left: str  # 左部非终结符
-    right: List[str]  # 右部符号列表
+    """产生式类（不可变，符号编码为整数）"""
+    __slots__ = ('left', 'right', 'id', 'left_id', 'right_ids', 'items')
+    
+    def __init__(self, left: str, right: Sequence[str], id: int = -1,
+                 left_id: int = -1, right_ids: Sequence[int] = ()):
+        self.left = left  # 左部非终结符
+        self.right: Tuple[str, ...] = tuple(right)  # 右部符号
+        self.id = id  # 产生式编号，增广产生式为-1
+        self.left_id = left_id  # 左部符号的整数编码
+        self.right_ids: Tuple[int, ...] = tuple(right_ids)  # 右部符号的整数编码
+        # 该产生式的全部LR(0)项，按点的位置索引，保证同一项只有一个对象
+        self.items: Tuple['LRItem', ...] = tuple(
+            LRItem(self, dot) for dot in range(len(self.right) + 1))
+    
+    def __eq__(self, other):
+        return (isinstance(other, Production) and
+                self.left == other.left and self.right == other.right)
+    
+    def __hash__(self):
+        return hash((self.left, self.right))
+    
+    def __repr__(self):
+        return f"Production(left={self.left!r}, right={list(self.right)!r})"
+    
+    def __str__(self):
+        return f"{self.left} -> {' '.join(self.right)}"
 
-@dataclass
 class LRItem:
-    """LR(0)项类"""
-    production: Production
-    dot_position: int
+    """LR(0)项类，以 (产生式编号, 点的位置) 作为标识"""
+    __slots__ = ('production', 'dot_position', 'next_symbol', 'key', '_hash')
+    
+    def __init__(self, production: Production, dot_position: int):
+        self.production = production
+        self.dot_position = dot_position
+        # 点后的符号，点在末尾时为None
+        self.next_symbol = (production.right[dot_position]
+                            if dot_position < len(production.right) else None)
+        self.key = (production.id, dot_position)
+        self._hash = hash(self.key)
     
     def __str__(self):
-        right = self.production.right.copy()
+        right = list(self.production.right)
         right.insert(self.dot_position, '.')
         return f"{self.production.left} -> {' '.join(right)}"
     
+    def __repr__(self):
+        return f"LRItem({self})"
+    
     def __eq__(self, other):
-        return (self.production == other.production and 
-                self.dot_position == other.dot_position)
+        return self is other or (isinstance(other, LRItem) and self.key == other.key)
     
     def __hash__(self):
-        return hash((self.production.left, tuple(self.production.right), 
-                    self.dot_position))
+        return self._hash
+
+# 优先级声明的结合性
+ASSOCIATIVITIES = ('left', 'right', 'nonassoc')
+
+# 分析表构建模式
+TABLE_MODES = ('lr0', 'slr', 'lalr', 'lr1')
+DEFAULT_MODE = 'lalr'
+
+
+def digraph(relation: List[List[int]], initial: List[int]) -> List[int]:
+    """DeRemer–Pennello 的 digraph 算法：F(x) = initial(x) | ⋃{F(y) | x R y}
+    
+    结点为 0..n-1 的整数，集合以整数位集表示。按 Tarjan 强连通分量的方式遍历
+    （非递归），同一分量内的结点得到相同的结果，每条边只处理一次。
+    """
+    n = len(initial)
+    infinity = n + 1
+    depth = [0] * n  # 0 表示未访问
+    result = list(initial)
+    stack = []
+    for root in range(n):
+        if depth[root]:
+            continue
+        stack.append(root)
+        depth[root] = len(stack)
+        work = [(root, iter(relation[root]), len(stack))]
+        while work:
+            node, successors, node_depth = work[-1]
+            for successor in successors:
+                if not depth[successor]:
+                    stack.append(successor)
+                    depth[successor] = len(stack)
+                    work.append((successor, iter(relation[successor]), len(stack)))
+                    break
+                if depth[successor] < depth[node]:
+                    depth[node] = depth[successor]
+                result[node] |= result[successor]
+            else:
+                work.pop()
+                if depth[node] == node_depth:
+                    # node 是强连通分量的根
+                    while True:
+                        member = stack.pop()
+                        depth[member] = infinity
+                        result[member] = result[node]
+                        if member == node:
+                            break
+                if work:
+                    parent = work[-1][0]
+                    if depth[node] < depth[parent]:
+                        depth[parent] = depth[node]
+                    result[parent] |= result[node]
+    return result
+
+
+def bits_to_set(bits: int, symbols: Sequence[str]) -> Set[str]:
+    """将位集转换为符号集合，第i位对应 symbols[i]"""
+    result = set()
+    while bits:
+        low = bits & -bits
+        result.add(symbols[low.bit_length() - 1])
+        bits ^= low
+    return result
+
+
+@dataclass
+class Conflict:
+    """分析表构建中的一处冲突，chosen 为保留的动作"""
+    state: int
+    terminal: str
+    kind: str  # 'shift/reduce' 或 'reduce/reduce'
+    chosen: Tuple[str, int]
+    discarded: Tuple[str, int]
+
+
+@dataclass
+class ParseResult:
+    """快速分析的结果"""
+    accepted: bool
+    # 出错的输入位置（终结符下标），成功时为-1
+    error_position: int = -1
+    # 语法树或归约回调的结果
+    value: Any = None
+    
+    def __bool__(self):
+        return self.accepted
+
+def _first_child(children: List[Any]) -> Any:
+    """默认的归约结果：第一个子节点的值（yacc 的 $$ = $1）"""
+    return children[0] if children else None
 
 class LRParser:
     """LR语法分析器"""
@@ -33,6 +177,11 @@ class LRParser:
     def __init__(self):
         # 文法产生式
         self.productions: List[Production] = []
+        # 符号的整数编码
+        self.symbols: List[str] = []
+        self.symbol_ids: Dict[str, int] = {}
+        # 左部非终结符 -> 产生式列表
+        self.productions_by_left: Dict[str, List[Production]] = {}
         # 非终结符集合
         self.non_terminals: Set[str] = set()
         # 终结符集合
@@ -43,228 +192,712 @@ class LRParser:
         self.follow_sets: Dict[str, Set[str]] = {}
         # LR(0)项集族
         self.lr0_items: List[Set[LRItem]] = []
-        # 动作表
-        self.action_table: Dict[Tuple[int, str], Tuple[str, int]] = {}
-        # 转移表
-        self.goto_table: Dict[Tuple[int, str], int] = {}
-        
-    def add_production(self, left: str, right: List[str]):
-        """添加产生式"""
-        self.productions.append(Production(left, right))
+        # 各状态的核心项集
+        self.lr0_kernels: List[frozenset] = []
+        # 状态转移：(状态, 符号) -> 状态
+        self.transitions: Dict[Tuple[int, str], int] = {}
+        # 分析表构建模式：lr0、slr、lalr 或 lr1
+        self.mode = DEFAULT_MODE
+        # 可为空的非终结符
+        self.nullable: Set[str] = set()
+        # 非终结符的First集位集（按排序后的终结符编号）
+        self._first_bits: Dict[str, int] = {}
+        # 归约的向前看符号：(状态, 产生式编号) -> 终结符集合，增广产生式编号为-1
+        self.lookaheads: Dict[Tuple[int, int], Set[str]] = {}
+        # 优先级声明，按声明顺序优先级递增：[(结合性, 终结符元组)]
+        self.precedence_levels: List[Tuple[str, Tuple[str, ...]]] = []
+        # 终结符 -> (优先级, 结合性)
+        self.precedence: Dict[str, Tuple[int, str]] = {}
+        # 显式指定优先级的产生式：产生式编号 -> 终结符（yacc 的 %prec）
+        self.production_precs: Dict[int, str] = {}
+        # 构建分析表时遇到的未能由优先级消解的冲突
+        self.conflicts: List[Conflict] = []
+        # 由优先级消解的移进/归约冲突数
+        self.resolved_conflicts = 0
+        # 紧凑分析表
+        self.tables: Optional[ParseTables] = None
+        # 是否对分析表做行位移压缩
+        self.compress_tables = False
+        # 动作表（紧凑分析表的字典视图）
+        self.action_table: Mapping[Tuple[int, str], Tuple[str, int]] = {}
+        # 转移表（紧凑分析表的字典视图）
+        self.goto_table: Mapping[Tuple[int, str], int] = {}
+        # 冻结后不允许再修改文法，可在多线程间共享
+        self.frozen = False
+        # 是否按核心项集缓存闭包
+        self.memoize_closure = False
+        self._closure_cache: Dict[frozenset, frozenset] = {}
+        # 增量模式：保留上次构建的状态，修改文法后只重新计算受影响的状态
+        self.incremental = False
+        # 上次构建以来产生式有变化的非终结符
+        self._dirty: Set[str] = set()
+        # 核心项集 -> (闭包, 符号 -> GOTO核心项集)
+        self._state_cache: Dict[frozenset, Tuple[Set[LRItem], Dict[str, frozenset]]] = {}
+        self._state_cache_start: Optional[str] = None
+        
+    def add_production(self, left: str, right: List[str], prec: Optional[str] = None):
+        """添加产生式，prec 指定该产生式使用哪个终结符的优先级（默认取右部最后一个终结符）
+        
+        右部的 'ε' 表示空串，不作为符号，A -> ε 与右部为空等价。
+        """
+        if self.frozen:
+            raise RuntimeError('文法已冻结，不能再添加产生式')
+        right = [symbol for symbol in right if symbol != 'ε']
+        production = Production(left, right, len(self.productions),
+                                self.intern_symbol(left),
+                                [self.intern_symbol(symbol) for symbol in right])
+        if prec is not None:
+            self.production_precs[production.id] = prec
+        self.productions.append(production)
+        self.productions_by_left.setdefault(left, []).append(production)
+        self._closure_cache.clear()
+        self._dirty.add(left)
+        # 终结符即没有产生式的符号：先出现在右部、后来才有产生式的符号改为非终结符
         self.non_terminals.add(left)
+        self.terminals.discard(left)
         for symbol in right:
-            if not symbol.isupper() and symbol != 'id':  # 假设终结符都是小写或特殊符号
+            if symbol not in self.non_terminals:
                 self.terminals.add(symbol)
-        if 'id' in right:
-            self.terminals.add('id')
     
-    def compute_first_sets(self):
-        """计算First集"""
-        # 初始化First集
-        for terminal in self.terminals:
-            self.first_sets[terminal] = {terminal}
-        for non_terminal in self.non_terminals:
-            self.first_sets[non_terminal] = set()
-            
-        while True:
-            changed = False
-            for production in self.productions:
-                left = production.left
-                right = production.right
-                
-                # 如果右部第一个符号是终结符
-                if right[0] in self.terminals:
-                    if right[0] not in self.first_sets[left]:
-                        self.first_sets[left].add(right[0])
-                        changed = True
-                        
-                # 如果右部第一个符号是非终结符
-                elif right[0] in self.non_terminals:
-                    for symbol in right:
-                        if symbol in self.terminals:
-                            if symbol not in self.first_sets[left]:
-                                self.first_sets[left].add(symbol)
-                                changed = True
-                            break
-                        first_set = self.first_sets[symbol]
-                        for first_symbol in first_set:
-                            if first_symbol not in self.first_sets[left]:
-                                self.first_sets[left].add(first_symbol)
-                                changed = True
-                        if 'ε' not in first_set:
-                            break
-                            
-            if not changed:
+    def remove_production(self, left: str, right: List[str]):
+        """删除第一个匹配的产生式，其后的产生式编号依次减一"""
+        if self.frozen:
+            raise RuntimeError('文法已冻结，不能再删除产生式')
+        right = tuple(symbol for symbol in right if symbol != 'ε')
+        for removed in self.productions:
+            if removed.left == left and removed.right == right:
                 break
+        else:
+            raise ValueError(f'产生式不存在: {left} -> {" ".join(right)}')
+        
+        index = removed.id
+        productions = self.productions[:index]
+        for production in self.productions[index + 1:]:
+            productions.append(Production(production.left, production.right, production.id - 1,
+                                          production.left_id, production.right_ids))
+        self.productions = productions
+        self.production_precs = {(i if i < index else i - 1): terminal
+                                 for i, terminal in self.production_precs.items() if i != index}
+        self.productions_by_left = {}
+        for production in productions:
+            self.productions_by_left.setdefault(production.left, []).append(production)
+        self.non_terminals = set(self.productions_by_left)
+        self.terminals = {symbol for production in productions for symbol in production.right
+                          if symbol not in self.non_terminals}
+        self._closure_cache.clear()
+        self._dirty.add(left)
+        if self._state_cache:
+            self._state_cache = self._renumber_states(index)
+    
+    def _renumber_states(self, removed: int) -> Dict[frozenset, Tuple[Set[LRItem], Dict[str, frozenset]]]:
+        """删除第 removed 个产生式后，将缓存状态中的项换成重新编号后的产生式的项"""
+        productions = self.productions
+        
+        def renumber(item: LRItem) -> LRItem:
+            production_id = item.production.id
+            if production_id < removed:
+                return item
+            return productions[production_id - 1].items[item.dot_position]
+        
+        states = {}
+        for kernel, (items, successors) in self._state_cache.items():
+            if any(item.production.id == removed for item in items):
+                continue
+            states[frozenset(map(renumber, kernel))] = (
+                set(map(renumber, items)),
+                {symbol: frozenset(map(renumber, next_kernel))
+                 for symbol, next_kernel in successors.items()})
+        return states
+    
+    def add_precedence(self, associativity: str, terminals: Sequence[str]):
+        """声明一级运算符优先级（yacc 的 %left/%right/%nonassoc），后声明的级别更高"""
+        if self.frozen:
+            raise RuntimeError('文法已冻结，不能再声明优先级')
+        if associativity not in ASSOCIATIVITIES:
+            raise ValueError(f'未知的结合性: {associativity}')
+        level = len(self.precedence_levels) + 1
+        self.precedence_levels.append((associativity, tuple(terminals)))
+        for terminal in terminals:
+            self.precedence[terminal] = (level, associativity)
+    
+    def production_specs(self) -> List[Tuple]:
+        """产生式的可序列化形式：(左部, 右部) 或带 %prec 的 (左部, 右部, 终结符)"""
+        return [(p.left, p.right, self.production_precs[p.id]) if p.id in self.production_precs
+                else (p.left, p.right) for p in self.productions]
+    
+    def production_precedence(self, production: Production) -> Optional[Tuple[int, str]]:
+        """产生式的 (优先级, 结合性)：显式指定的终结符或右部最后一个终结符的优先级"""
+        terminal = self.production_precs.get(production.id)
+        if terminal is None:
+            for symbol in reversed(production.right):
+                if symbol in self.terminals:
+                    terminal = symbol
+                    break
+        return self.precedence.get(terminal)
+    
+    def intern_symbol(self, symbol: str) -> int:
+        """获取符号的整数编码，不存在时分配新编码"""
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+    
+    def freeze(self):
+        """冻结文法，此后分析器只读，可安全地在线程间共享"""
+        self.frozen = True
+    
+    def grammar_hash(self) -> str:
+        """当前文法（含优先级声明）的规范哈希"""
+        return grammar_hash(self.production_specs(), self.precedence_levels)
+    
+    def compute_nullable(self) -> Set[str]:
+        """计算可推导出空串的非终结符
+        
+        工作表算法：记录每条产生式右部中尚未确定可空的符号数，某个非终结符变为可空时
+        只更新包含它的产生式，计数归零则左部可空。
+        """
+        nullable = set()
+        remaining = [len(production.right) for production in self.productions]
+        occurrences: Dict[str, List[int]] = {}
+        worklist = []
+        for production in self.productions:
+            for symbol in production.right:
+                occurrences.setdefault(symbol, []).append(production.id)
+            if not production.right and production.left not in nullable:
+                nullable.add(production.left)
+                worklist.append(production.left)
+        while worklist:
+            for production_id in occurrences.get(worklist.pop(), ()):
+                remaining[production_id] -= 1
+                left = self.productions[production_id].left
+                if remaining[production_id] == 0 and left not in nullable:
+                    nullable.add(left)
+                    worklist.append(left)
+        self.nullable = nullable
+        return nullable
+    
+    def compute_first_sets(self):
+        """计算First集
+        
+        A -> α X β 且 α 可空时：X 为终结符则直接计入 First(A)，X 为非终结符则
+        First(A) ⊇ First(X)。依赖关系只建立一次，再用 digraph 沿强连通分量传播，
+        集合以整数位集表示。可空的非终结符的First集包含 'ε'。
+        """
+        nullable = self.compute_nullable()
+        terminals = sorted(self.terminals)
+        bits = {terminal: 1 << i for i, terminal in enumerate(terminals)}
+        non_terminals = sorted(self.non_terminals)
+        index = {non_terminal: i for i, non_terminal in enumerate(non_terminals)}
+        direct = [0] * len(non_terminals)
+        relation: List[List[int]] = [[] for _ in non_terminals]
+        for production in self.productions:
+            left = index[production.left]
+            for symbol in production.right:
+                if symbol in index:
+                    relation[left].append(index[symbol])
+                    if symbol not in nullable:
+                        break
+                else:
+                    direct[left] |= bits.get(symbol, 0)
+                    break
+        first_bits = digraph(relation, direct)
+        self._first_bits = dict(zip(non_terminals, first_bits))
+        
+        self.first_sets = {terminal: {terminal} for terminal in terminals}
+        for non_terminal in non_terminals:
+            first_set = bits_to_set(self._first_bits[non_terminal], terminals)
+            if non_terminal in nullable:
+                first_set.add('ε')
+            self.first_sets[non_terminal] = first_set
     
     def compute_follow_sets(self):
-        """计算Follow集"""
-        # 初始化Follow集
-        for non_terminal in self.non_terminals:
-            self.follow_sets[non_terminal] = set()
-        self.follow_sets[self.productions[0].left].add('$')  # 开始符号的Follow集包含$
+        """计算Follow集（需先计算First集）
         
-        while True:
-            changed = False
-            for production in self.productions:
-                left = production.left
-                right = production.right
-                
-                for i, symbol in enumerate(right):
-                    if symbol in self.non_terminals:
-                        # 如果是最后一个符号
-                        if i == len(right) - 1:
-                            for follow_symbol in self.follow_sets[left]:
-                                if follow_symbol not in self.follow_sets[symbol]:
-                                    self.follow_sets[symbol].add(follow_symbol)
-                                    changed = True
-                        else:
-                            next_symbol = right[i + 1]
-                            if next_symbol in self.terminals:
-                                if next_symbol not in self.follow_sets[symbol]:
-                                    self.follow_sets[symbol].add(next_symbol)
-                                    changed = True
-                            else:
-                                for first_symbol in self.first_sets[next_symbol]:
-                                    if first_symbol != 'ε' and first_symbol not in self.follow_sets[symbol]:
-                                        self.follow_sets[symbol].add(first_symbol)
-                                        changed = True
-                                if 'ε' in self.first_sets[next_symbol]:
-                                    for follow_symbol in self.follow_sets[left]:
-                                        if follow_symbol not in self.follow_sets[symbol]:
-                                            self.follow_sets[symbol].add(follow_symbol)
-                                            changed = True
-                                            
-            if not changed:
-                break
+        A -> α B β 时 First(β) 直接计入 Follow(B)，β 可空时 Follow(B) ⊇ Follow(A)；
+        每条产生式从右向左扫描一次，同样用 digraph 传播。
+        """
+        symbols = sorted(self.terminals) + ['$']
+        # 与 compute_first_sets 的位编号一致，'$' 为最高位
+        bits = {symbol: 1 << i for i, symbol in enumerate(symbols)}
+        first_bits = self._first_bits
+        nullable = self.nullable
+        non_terminals = sorted(self.non_terminals)
+        index = {non_terminal: i for i, non_terminal in enumerate(non_terminals)}
+        direct = [0] * len(non_terminals)
+        relation: List[List[int]] = [[] for _ in non_terminals]
+        direct[index[self.productions[0].left]] |= bits['$']  # 开始符号的Follow集包含$
+        for production in self.productions:
+            suffix_first = 0
+            suffix_nullable = True
+            for symbol in reversed(production.right):
+                if symbol in index:
+                    direct[index[symbol]] |= suffix_first
+                    if suffix_nullable:
+                        relation[index[symbol]].append(index[production.left])
+                    if symbol in nullable:
+                        suffix_first |= first_bits[symbol]
+                    else:
+                        suffix_first = first_bits[symbol]
+                        suffix_nullable = False
+                else:
+                    suffix_first = bits.get(symbol, 0)
+                    suffix_nullable = False
+        follow_bits = digraph(relation, direct)
+        self.follow_sets = {non_terminal: bits_to_set(follow_bits[i], symbols)
+                            for i, non_terminal in enumerate(non_terminals)}
     
     def closure(self, items: Set[LRItem]) -> Set[LRItem]:
-        """计算LR(0)项集的闭包"""
-        result = items.copy()
-        while True:
-            new_items = set()
-            for item in result:
-                if item.dot_position < len(item.production.right):
-                    symbol_after_dot = item.production.right[item.dot_position]
-                    if symbol_after_dot in self.non_terminals:
-                        for production in self.productions:
-                            if production.left == symbol_after_dot:
-                                new_item = LRItem(production, 0)
-                                if new_item not in result:
-                                    new_items.add(new_item)
-            
-            if not new_items:
-                break
-            result.update(new_items)
+        """计算LR(0)项集的闭包（每个非终结符只展开一次）"""
+        if stats.enabled:
+            stats.count('closure_calls')
+        if self.memoize_closure:
+            kernel = frozenset(items)
+            cached = self._closure_cache.get(kernel)
+            if cached is not None:
+                return set(cached)
+        
+        result = set(items)
+        expanded = set()
+        worklist = list(result)
+        while worklist:
+            symbol_after_dot = worklist.pop().next_symbol
+            if symbol_after_dot in self.non_terminals and symbol_after_dot not in expanded:
+                expanded.add(symbol_after_dot)
+                for production in self.productions_by_left[symbol_after_dot]:
+                    new_item = production.items[0]
+                    if new_item not in result:
+                        result.add(new_item)
+                        worklist.append(new_item)
         
+        if self.memoize_closure:
+            self._closure_cache[kernel] = frozenset(result)
         return result
     
     def goto(self, items: Set[LRItem], symbol: str) -> Set[LRItem]:
         """计算GOTO(I,X)"""
+        if stats.enabled:
+            stats.count('goto_calls')
         next_items = set()
         for item in items:
-            if (item.dot_position < len(item.production.right) and 
-                item.production.right[item.dot_position] == symbol):
-                next_items.add(LRItem(item.production, item.dot_position + 1))
+            if item.next_symbol == symbol:
+                next_items.add(item.production.items[item.dot_position + 1])
         return self.closure(next_items)
     
     def build_lr0_items(self):
-        """构建LR(0)项集族"""
+        """构建LR(0)项集族（工作表算法，每个状态只处理一次）
+        
+        增量模式下复用上次构建中闭包未受文法修改影响的状态（闭包和各GOTO的核心项），
+        只为新出现或受影响的核心项计算闭包。状态按相同顺序编号，结果与重新构建一致。
+        """
         # 添加增广文法的起始产生式
-        start_production = Production("S'", [self.productions[0].left])
-        initial_item = LRItem(start_production, 0)
-        initial_set = self.closure({initial_item})
+        start_symbol = self.productions[0].left
+        start_production = Production("S'", [start_symbol], -1, self.intern_symbol("S'"),
+                                      [self.intern_symbol(start_symbol)])
+        initial_kernel = frozenset({start_production.items[0]})
+        cache = self._reusable_states(start_symbol)
         
-        self.lr0_items = [initial_set]
-        processed_sets = set()
+        self.lr0_items = []
+        self.lr0_kernels = [initial_kernel]
+        self.transitions = {}
+        # 核心项集 -> 状态编号
+        kernel_ids = {initial_kernel: 0}
+        states: Dict[frozenset, Tuple[Set[LRItem], Dict[str, frozenset]]] = {}
         
-        while True:
-            new_item_sets = []
-            for items in self.lr0_items:
-                items_tuple = tuple(sorted(str(item) for item in items))
-                if items_tuple in processed_sets:
-                    continue
-                    
-                processed_sets.add(items_tuple)
-                symbols = set()
+        state = 0
+        while state < len(self.lr0_kernels):
+            kernel = self.lr0_kernels[state]
+            entry = cache.get(kernel)
+            if entry is None:
+                items = self.closure(set(kernel))
+                # 一次遍历按点后符号分组，得到各个GOTO的核心项
+                kernels: Dict[str, Set[LRItem]] = {}
                 for item in items:
-                    if item.dot_position < len(item.production.right):
-                        symbols.add(item.production.right[item.dot_position])
-                        
-                for symbol in symbols:
-                    next_items = self.goto(items, symbol)
-                    if next_items and next_items not in self.lr0_items:
-                        new_item_sets.append(next_items)
-                        
-            if not new_item_sets:
+                    symbol = item.next_symbol
+                    if symbol is not None:
+                        kernels.setdefault(symbol, set()).add(
+                            item.production.items[item.dot_position + 1])
+                entry = (items, {symbol: frozenset(kernels[symbol]) for symbol in sorted(kernels)})
+            states[kernel] = entry
+            self.lr0_items.append(entry[0])
+            
+            for symbol, next_kernel in entry[1].items():
+                next_state = kernel_ids.get(next_kernel)
+                if next_state is None:
+                    next_state = len(self.lr0_kernels)
+                    kernel_ids[next_kernel] = next_state
+                    self.lr0_kernels.append(next_kernel)
+                self.transitions[(state, symbol)] = next_state
+            state += 1
+        
+        if self.incremental:
+            self._state_cache = states
+            self._state_cache_start = start_symbol
+        self._dirty.clear()
+        if stats.enabled:
+            # 每个状态的各个GOTO在一次遍历中按点后符号分组得到，每条转移计一次
+            stats.count('goto_calls', len(self.transitions))
+    
+    def _reusable_states(self, start_symbol: str) -> Dict[frozenset, Tuple[Set[LRItem], Dict[str, frozenset]]]:
+        """上次构建中仍然有效的状态：闭包里没有以被修改的非终结符为点后符号的项"""
+        if not self.incremental or self._state_cache_start != start_symbol:
+            return {}
+        dirty = self._dirty
+        if not dirty:
+            return self._state_cache
+        return {kernel: entry for kernel, entry in self._state_cache.items()
+                if not any(item.next_symbol in dirty for item in entry[0])}
+    
+    def first_of_sequence(self, symbols: Sequence[str], follow: Set[str]) -> Set[str]:
+        """符号串 symbols 后接 follow 中任一终结符时可能的首个终结符"""
+        result = set()
+        for symbol in symbols:
+            if symbol not in self.non_terminals:
+                result.add(symbol)
                 break
-            self.lr0_items.extend(new_item_sets)
+            result |= self.first_sets[symbol]
+            if symbol not in self.nullable:
+                break
+        else:
+            result |= follow
+        result.discard('ε')
+        return result
+    
+    def _accept_state(self) -> int:
+        """包含 S' -> S . 的状态"""
+        return self.transitions[(0, self.productions[0].left)]
+    
+    def compute_lookaheads(self):
+        """按 self.mode 计算LR(0)项集族上各归约的向前看符号"""
+        self.compute_nullable()
+        terminals = self.terminals | {'$'}
+        lookaheads: Dict[Tuple[int, int], Set[str]] = {(self._accept_state(), -1): {'$'}}
+        if self.mode == 'lalr':
+            lookaheads.update(self._lalr_lookaheads())
+        else:
+            for i, items in enumerate(self.lr0_items):
+                for item in items:
+                    if item.next_symbol is None and item.production.id >= 0:
+                        if self.mode == 'slr':
+                            lookaheads[(i, item.production.id)] = self.follow_sets[item.production.left]
+                        else:
+                            lookaheads[(i, item.production.id)] = terminals
+        self.lookaheads = lookaheads
+    
+    def _lalr_lookaheads(self) -> Dict[Tuple[int, int], Set[str]]:
+        """DeRemer–Pennello 算法：在LR(0)自动机的非终结符转移上传播向前看符号
+        
+        非终结符转移 (p, A) 按出现顺序编号，reads/includes 关系和集合都用整数下标
+        和位集表示。
+        """
+        non_terminals = self.non_terminals
+        nullable = self.nullable
+        start_symbol = self.productions[0].left
+        symbols = sorted(self.terminals) + ['$']
+        bits = {symbol: 1 << i for i, symbol in enumerate(symbols)}
+        n_states = len(self.lr0_items)
+        # 每个状态的出边：符号 -> 目标状态 / 符号 -> 非终结符转移编号
+        successors: List[Dict[str, int]] = [{} for _ in range(n_states)]
+        nt_ids: List[Dict[str, int]] = [{} for _ in range(n_states)]
+        nt_transitions: List[Tuple[int, str]] = []
+        for (state, symbol), target in self.transitions.items():
+            successors[state][symbol] = target
+            if symbol in non_terminals:
+                nt_ids[state][symbol] = len(nt_transitions)
+                nt_transitions.append((state, symbol))
+        
+        direct_reads = []
+        reads: List[List[int]] = []
+        for p, symbol in nt_transitions:
+            r = successors[p][symbol]
+            dr = 0
+            read = []
+            for next_symbol in successors[r]:
+                if next_symbol not in non_terminals:
+                    dr |= bits[next_symbol]
+                elif next_symbol in nullable:
+                    read.append(nt_ids[r][next_symbol])
+            if p == 0 and symbol == start_symbol:
+                dr |= bits['$']
+            direct_reads.append(dr)
+            reads.append(read)
+        read_sets = digraph(reads, direct_reads)
+        
+        # includes 和 lookback：从每个 (p, B) 沿产生式 B -> ω 走一遍
+        # include_flags[产生式][i]：右部第i个符号是非终结符且其后的后缀可空
+        include_flags = []
+        for production in self.productions:
+            flags = [False] * len(production.right)
+            suffix_nullable = True
+            for i in range(len(production.right) - 1, -1, -1):
+                symbol = production.right[i]
+                flags[i] = suffix_nullable and symbol in non_terminals
+                suffix_nullable = suffix_nullable and symbol in nullable
+            include_flags.append(flags)
+        includes: List[List[int]] = [[] for _ in nt_transitions]
+        lookback: Dict[Tuple[int, int], List[int]] = {}
+        for x, (p, left) in enumerate(nt_transitions):
+            for production in self.productions_by_left[left]:
+                flags = include_flags[production.id]
+                state = p
+                for i, symbol in enumerate(production.right):
+                    if flags[i]:
+                        includes[nt_ids[state][symbol]].append(x)
+                    state = successors[state][symbol]
+                lookback.setdefault((state, production.id), []).append(x)
+        follow = digraph(includes, read_sets)
+        
+        lookaheads = {}
+        for key, sources in lookback.items():
+            lookahead_bits = 0
+            for source in sources:
+                lookahead_bits |= follow[source]
+            lookaheads[key] = bits_to_set(lookahead_bits, symbols)
+        return lookaheads
+    
+    def closure_lr1(self, kernel: Dict[LRItem, Set[str]]) -> Dict[LRItem, Set[str]]:
+        """计算LR(1)项集的闭包，每个LR(0)项对应一个向前看符号集合"""
+        if stats.enabled:
+            stats.count('closure_calls')
+        result = {item: set(lookaheads) for item, lookaheads in kernel.items()}
+        worklist = list(result)
+        while worklist:
+            item = worklist.pop()
+            symbol = item.next_symbol
+            if symbol not in self.non_terminals:
+                continue
+            lookaheads = self.first_of_sequence(item.production.right[item.dot_position + 1:],
+                                                result[item])
+            for production in self.productions_by_left[symbol]:
+                new_item = production.items[0]
+                current = result.get(new_item)
+                if current is None:
+                    result[new_item] = set(lookaheads)
+                    worklist.append(new_item)
+                elif not lookaheads <= current:
+                    current |= lookaheads
+                    worklist.append(new_item)
+        return result
+    
+    def build_lr1_items(self):
+        """构建规范LR(1)项集族
+        
+        lr0_items/lr0_kernels 保存各状态的LR(0)部分，向前看符号保存在 lookaheads 中。
+        """
+        self.compute_nullable()
+        start_symbol = self.productions[0].left
+        start_production = Production("S'", [start_symbol], -1, self.intern_symbol("S'"),
+                                      [self.intern_symbol(start_symbol)])
+        initial = self.closure_lr1({start_production.items[0]: {'$'}})
+        states = [initial]
+        self.lr0_items = [set(initial)]
+        self.lr0_kernels = [frozenset({start_production.items[0]})]
+        self.transitions = {}
+        self.lookaheads = {}
+        kernel_ids = {frozenset((item, '$') for item in self.lr0_kernels[0]): 0}
+        
+        state = 0
+        while state < len(states):
+            kernels: Dict[str, Dict[LRItem, Set[str]]] = {}
+            for item, lookaheads in states[state].items():
+                symbol = item.next_symbol
+                if symbol is None:
+                    self.lookaheads[(state, item.production.id)] = lookaheads
+                    continue
+                kernel = kernels.setdefault(symbol, {})
+                kernel[item.production.items[item.dot_position + 1]] = lookaheads
+            
+            for symbol in sorted(kernels):
+                kernel = kernels[symbol]
+                key = frozenset((item, la) for item, lookaheads in kernel.items()
+                                for la in lookaheads)
+                next_state = kernel_ids.get(key)
+                if next_state is None:
+                    next_state = len(states)
+                    kernel_ids[key] = next_state
+                    items = self.closure_lr1(kernel)
+                    states.append(items)
+                    self.lr0_items.append(set(items))
+                    self.lr0_kernels.append(frozenset(kernel))
+                self.transitions[(state, symbol)] = next_state
+            state += 1
+        if stats.enabled:
+            stats.count('goto_calls', len(self.transitions))
     
     def build_parsing_table(self):
-        """构建LR分析表"""
-        self.action_table.clear()
-        self.goto_table.clear()
-        
-        # 定义运算符优先级
-        precedence = {
-            '*': 2,  # 乘法优先级高
-            '+': 1,  # 加法优先级低
-            '(': 0,  # 括号优先级最低
-            ')': 0
+        """按 self.mode 构建LR分析表，并编译为紧凑的数组格式
+        
+        归约只写入其向前看符号所在的列。移进/归约冲突先按优先级声明消解：产生式
+        优先级高则归约、低则移进，同级时按结合性（left 归约、right 移进、nonassoc
+        报错）；无法消解时保留移进。归约/归约冲突保留编号较小的产生式。未消解的
+        冲突记录在 self.conflicts 中。
+        """
+        if self.mode not in TABLE_MODES:
+            raise ValueError(f'未知的分析表构建模式: {self.mode}')
+        if self.mode != 'lr1':
+            self.compute_lookaheads()
+        action_table: Dict[Tuple[int, str], Tuple[str, int]] = {}
+        goto_table: Dict[Tuple[int, str], int] = {}
+        self.conflicts = []
+        self.resolved_conflicts = 0
+        # nonassoc 同级冲突的位置，构建结束后置为错误
+        errors: Set[Tuple[int, str]] = set()
+        production_precedences = [self.production_precedence(p) for p in self.productions]
+        
+        # 移进和转移直接来自项集族构建时记录的状态转移
+        for (i, symbol), j in self.transitions.items():
+            if symbol in self.terminals:
+                action_table[(i, symbol)] = ('shift', j)
+            else:
+                goto_table[(i, symbol)] = j
+        
+        for (i, production_index), lookaheads in sorted(self.lookaheads.items()):
+            if production_index < 0:
+                action_table[(i, '$')] = ('accept', 0)
+                continue
+            reduce = ('reduce', production_index)
+            production_precedence = production_precedences[production_index]
+            for terminal in lookaheads:
+                existing = action_table.get((i, terminal))
+                if existing is None:
+                    if (i, terminal) not in errors:
+                        action_table[(i, terminal)] = reduce
+                elif existing[0] == 'shift':
+                    terminal_precedence = self.precedence.get(terminal)
+                    if production_precedence is None or terminal_precedence is None:
+                        self.conflicts.append(
+                            Conflict(i, terminal, 'shift/reduce', existing, reduce))
+                        continue
+                    self.resolved_conflicts += 1
+                    if production_precedence[0] > terminal_precedence[0] or (
+                            production_precedence[0] == terminal_precedence[0] and
+                            terminal_precedence[1] == 'left'):
+                        action_table[(i, terminal)] = reduce
+                    elif (production_precedence[0] == terminal_precedence[0] and
+                          terminal_precedence[1] == 'nonassoc'):
+                        del action_table[(i, terminal)]
+                        errors.add((i, terminal))
+                elif existing[0] == 'reduce':
+                    self.conflicts.append(Conflict(i, terminal, 'reduce/reduce', existing, reduce))
+        
+        self.tables = ParseTables.from_dicts(
+            action_table, goto_table, sorted(self.terminals) + ['$'],
+            sorted(self.non_terminals), len(self.lr0_items), self.productions,
+            compress=self.compress_tables)
+        self.action_table = ActionTableView(self.tables)
+        self.goto_table = GotoTableView(self.tables)
+    
+    def conflict_stats(self) -> Dict[str, int]:
+        """冲突统计"""
+        return {
+            'shift_reduce': sum(1 for c in self.conflicts if c.kind == 'shift/reduce'),
+            'reduce_reduce': sum(1 for c in self.conflicts if c.kind == 'reduce/reduce'),
+            'states': len({c.state for c in self.conflicts}),
+            'resolved_by_precedence': self.resolved_conflicts
         }
+    
+    def build(self):
+        """依次计算First/Follow集、项集族和分析表"""
+        with stats.phase('build.first_sets'):
+            self.compute_first_sets()
+        with stats.phase('build.follow_sets'):
+            self.compute_follow_sets()
+        with stats.phase('build.items'):
+            if self.mode == 'lr1':
+                self.build_lr1_items()
+            else:
+                self.build_lr0_items()
+        with stats.phase('build.table'):
+            self.build_parsing_table()
+        if stats.enabled:
+            stats.count('states', len(self.lr0_items))
+    
+    def save_tables(self, path: str):
+        """将编译好的分析表、符号表和产生式保存为二进制文件"""
+        metadata = {
+            'productions': [[left, list(right), *rest]
+                            for left, right, *rest in self.production_specs()],
+            'precedence': [[assoc, list(terminals)] for assoc, terminals in self.precedence_levels],
+            'mode': self.mode,
+            'first_sets': self.get_first_sets(),
+            'follow_sets': self.get_follow_sets(),
+            'conflicts': [[c.state, c.terminal, c.kind, list(c.chosen), list(c.discarded)]
+                          for c in self.conflicts],
+            'resolved_conflicts': self.resolved_conflicts
+        }
+        write_table_file(path, self.tables, self.grammar_hash(), metadata)
+    
+    def load_tables(self, path: str):
+        """通过 mmap 加载分析表文件，不重新构建
         
-        for i, items in enumerate(self.lr0_items):
-            for item in items:
-                if item.dot_position < len(item.production.right):
-                    # 移进动作
-                    symbol = item.production.right[item.dot_position]
-                    next_items = self.goto(items, symbol)
-                    if next_items in self.lr0_items:
-                        j = self.lr0_items.index(next_items)
-                        if symbol in self.terminals:
-                            self.action_table[(i, symbol)] = ('shift', j)
-                        else:
-                            self.goto_table[(i, symbol)] = j
-                else:
-                    # 归约动作
-                    if item.production.left == "S'":
-                        self.action_table[(i, '$')] = ('accept', 0)
-                    else:
-                        # 检查是否需要归约
-                        need_reduce = True
-                        if item.production.right:
-                            last_symbol = item.production.right[-1]
-                            if last_symbol in precedence:
-                                for terminal in self.terminals | {'$'}:
-                                    if terminal in precedence:
-                                        if precedence[terminal] > precedence[last_symbol]:
-                                            need_reduce = False
-                                            break
-                        
-                        if need_reduce:
-                            for terminal in self.terminals | {'$'}:
-                                if (i, terminal) not in self.action_table:
-                                    self.action_table[(i, terminal)] = ('reduce', 
-                                        self.productions.index(item.production))
+        已添加产生式时文件必须与当前文法匹配，否则抛出 TableFileError；
+        未添加产生式时使用文件中的文法。
+        """
+        file_hash, metadata, tables = read_table_file(path)
+        precedence = metadata.get('precedence', [])
+        if grammar_hash(metadata['productions'], precedence) != file_hash:
+            raise TableFileError('分析表文件已损坏')
+        if metadata.get('mode', 'lr0') != self.mode:
+            raise TableFileError('分析表文件的构建模式与当前设置不一致')
+        if self.productions:
+            if file_hash != self.grammar_hash():
+                raise TableFileError('分析表文件与当前文法不匹配')
+        else:
+            for left, right, *rest in metadata['productions']:
+                self.add_production(left, right, *rest)
+            for associativity, terminals in precedence:
+                self.add_precedence(associativity, terminals)
+        
+        self.terminals = set(tables.terminals) - {'$'}
+        self.non_terminals = set(tables.non_terminals)
+        self.first_sets = {k: set(v) for k, v in metadata['first_sets'].items()}
+        self.follow_sets = {k: set(v) for k, v in metadata['follow_sets'].items()}
+        self.conflicts = [Conflict(state, terminal, kind, tuple(chosen), tuple(discarded))
+                          for state, terminal, kind, chosen, discarded in metadata.get('conflicts', [])]
+        self.resolved_conflicts = metadata.get('resolved_conflicts', 0)
+        self.tables = tables
+        self.action_table = ActionTableView(tables)
+        self.goto_table = GotoTableView(tables)
+    
+    def try_load_tables(self, path: str) -> bool:
+        """加载分析表文件，文件不存在、损坏、过期或与文法不匹配时返回False"""
+        try:
+            self.load_tables(path)
+            return True
+        except (OSError, ValueError, KeyError, TableFileError):
+            return False
+    
+    def load_or_build(self, path: str) -> bool:
+        """优先从分析表文件加载；文件不存在、过期或与文法不匹配时重新构建并保存
+        
+        返回是否从文件加载。
+        """
+        if self.try_load_tables(path):
+            return True
+        self.build()
+        self.save_tables(path)
+        return False
     
     def get_parsing_table(self) -> Dict[str, Dict[str, str]]:
         """获取格式化的分析表"""
         table = {}
         all_symbols = self.terminals | {'$'} | self.non_terminals
         
-        for i in range(len(self.lr0_items)):
-            table[str(i)] = {}
-            for symbol in all_symbols:
-                if (i, symbol) in self.action_table:
-                    action, value = self.action_table[(i, symbol)]
-                    if action == 'shift':
-                        table[str(i)][symbol] = f's{value}'
-                    elif action == 'reduce':
-                        table[str(i)][symbol] = f'r{value}'
-                    elif action == 'accept':
-                        table[str(i)][symbol] = 'acc'
-                elif (i, symbol) in self.goto_table:
-                    table[str(i)][symbol] = str(self.goto_table[(i, symbol)])
+        with stats.phase('format_table'):
+            for i in range(self.tables.n_states):
+                table[str(i)] = {}
+                for symbol in all_symbols:
+                    if (i, symbol) in self.action_table:
+                        action, value = self.action_table[(i, symbol)]
+                        if action == 'shift':
+                            table[str(i)][symbol] = f's{value}'
+                        elif action == 'reduce':
+                            table[str(i)][symbol] = f'r{value}'
+                        elif action == 'accept':
+                            table[str(i)][symbol] = 'acc'
+                    elif (i, symbol) in self.goto_table:
+                        table[str(i)][symbol] = str(self.goto_table[(i, symbol)])
         
         return table
     
@@ -276,58 +909,317 @@ class LRParser:
         """获取格式化的Follow集"""
         return {k: sorted(list(v)) for k, v in self.follow_sets.items()}
     
+    def trace(self, tokens: Sequence[str]) -> ParseTrace:
+        """语法分析并以增量形式记录每一步，快照由 ParseTrace.steps() 按需生成"""
+        if not stats.enabled:
+            return self._trace(tokens)
+        with stats.phase('parse'):
+            trace = self._trace(tokens)
+        stats.count('parses')
+        stats.count('shifts', trace.kinds.count(SHIFT))
+        stats.count('reduces', trace.kinds.count(REDUCE))
+        return trace
+    
+    def _trace(self, tokens: Sequence[str]) -> ParseTrace:
+        tables = self.tables
+        action_at = tables.action_at
+        goto_at = tables.goto_at
+        production_lhs = tables.production_lhs
+        production_len = tables.production_len
+        terminal_ids = tables.terminal_ids
+        trace = ParseTrace(tokens, self.productions)
+        stack = [0]  # 状态栈
+        position = 0  # 输入串位置
+        
+        while True:
+            token = tokens[position] if position < len(tokens) else '$'
+            column = terminal_ids.get(token)
+            code = action_at(stack[-1], column) if column is not None else ERROR
+            kind = code & 3
+            
+            if kind == SHIFT:
+                trace.record(SHIFT, code >> 2, 0, position)
+                stack.append(code >> 2)
+                position += 1
+                
+            elif kind == REDUCE:
+                production = code >> 2
+                length = production_len[production]
+                if length:
+                    del stack[-length:]
+                target = goto_at(stack[-1], production_lhs[production])
+                if target == NO_GOTO:
+                    trace.record(ERROR, 0, 0, position)
+                    return trace
+                trace.record(REDUCE, production, target, position)
+                stack.append(target)
+                
+            elif kind == ACCEPT:
+                trace.record(ACCEPT, 0, 0, position)
+                trace.accepted = True
+                return trace
+                
+            else:
+                trace.record(ERROR, 0, 0, position)
+                return trace
+    
     def parse_with_steps(self, tokens: List[str]) -> Tuple[bool, List[Dict]]:
         """带步骤的语法分析"""
-        steps = []
+        trace = self.trace(tokens)
+        return trace.accepted, trace.page()
+
+    def iter_steps(self, tokens: Iterable[str], with_input: bool = True) -> Iterator[Dict]:
+        """parse_with_steps 的生成器形式：边分析边生成每一步的快照，不保留已生成的步骤
+
+        with_input 为 False 时快照中用输入位置 position 代替剩余输入串，tokens 可以是
+        惰性的终结符迭代器，内存只与栈深度有关。最后一步的动作为接受或错误。
+        """
+        tables = self.tables
+        action_at = tables.action_at
+        goto_at = tables.goto_at
+        production_lhs = tables.production_lhs
+        terminal_ids = tables.terminal_ids
+        productions = self.productions
+        if with_input and not isinstance(tokens, Sequence):
+            tokens = list(tokens)
+        iterator = iter(tokens)
         state_stack = [0]  # 状态栈
         symbol_stack = ['$']  # 符号栈
-        input_pos = 0  # 输入串位置
+        position = 0  # 输入串位置
+        shifts = reduces = 0
+        token = next(iterator, '$')
+
+        while True:
+            column = terminal_ids.get(token)
+            code = action_at(state_stack[-1], column) if column is not None else ERROR
+            kind = code & 3
+            step = {'stateStack': state_stack.copy(), 'symbolStack': symbol_stack.copy()}
+            if with_input:
+                step['input'] = list(tokens[position:])
+            else:
+                step['position'] = position
+
+            if kind == SHIFT:
+                step['action'] = f'移进 {token}'
+                yield step
+                state_stack.append(code >> 2)
+                symbol_stack.append(token)
+                position += 1
+                shifts += 1
+                token = next(iterator, '$')
+
+            elif kind == REDUCE:
+                production = productions[code >> 2]
+                length = len(production.right)
+                target = goto_at(state_stack[-length - 1], production_lhs[code >> 2])
+                if target == NO_GOTO:
+                    step['action'] = '错误'
+                    yield step
+                    break
+                step['action'] = f'归约 {production.left} -> {" ".join(production.right)}'
+                yield step
+                if length:
+                    del state_stack[-length:]
+                    del symbol_stack[-length:]
+                state_stack.append(target)
+                symbol_stack.append(production.left)
+                reduces += 1
+
+            else:
+                step['action'] = '接受' if kind == ACCEPT else '错误'
+                yield step
+                break
+
+        if stats.enabled:
+            stats.count('parses')
+            stats.count('shifts', shifts)
+            stats.count('reduces', reduces)
+
+    def recognize(self, tokens: Iterable[str],
+                  on_reduce: Optional[Callable[[Production, List[Any]], Any]] = None,
+                  build_tree: bool = False,
+                  values: Optional[Iterable[Any]] = None,
+                  actions: Optional[Mapping[int, Callable[[List[Any]], Any]]] = None
+                  ) -> 'ParseResult':
+        """快速语法分析，不记录步骤
+        
+        tokens 可以是任意终结符迭代器，以 '$' 结束（迭代器耗尽也视为 '$'）。
+        指定 on_reduce 时每次归约以 (产生式, 子节点值列表) 调用，返回值作为归约结果；
+        build_tree 为True时构建 (产生式编号, 子节点元组) 形式的语法树。
+        actions 为按产生式编号的归约回调，以子节点值列表调用，未指定的产生式取第一个
+        子节点的值（与 yacc 的 $$ = $1 相同，右部为空时为None）。
+        移进时的叶子值取自 values（与 tokens 一一对应），默认为终结符本身。
+        """
+        if stats.enabled:
+            return self._recognize_counted(tokens, on_reduce, build_tree, values, actions)
+        return self._recognize(tokens, on_reduce, build_tree, values, actions)
+    
+    def _recognize_counted(self, tokens: Iterable[str], on_reduce, build_tree: bool,
+                           values: Optional[Iterable[Any]], actions=None) -> 'ParseResult':
+        """启用统计时的分析：计时并由读入的终结符数得到移进步数（不统计归约）"""
+        consumed = 0
+        last = None
+        
+        def counting(tokens):
+            nonlocal consumed, last
+            for last in tokens:
+                consumed += 1
+                yield last
+        
+        with stats.phase('parse'):
+            result = self._recognize(counting(tokens), on_reduce, build_tree, values, actions)
+        stats.count('parses')
+        if result.accepted:
+            # 接受时最后读入的 $ 没有移进
+            stats.count('shifts', consumed - (last == '$'))
+        else:
+            stats.count('shifts', result.error_position)
+        return result
+    
+    def _recognize(self, tokens: Iterable[str], on_reduce, build_tree: bool,
+                   values: Optional[Iterable[Any]], actions=None) -> 'ParseResult':
+        if on_reduce is not None or build_tree or actions is not None or self.tables.compressed:
+            return self._recognize_semantic(tokens, self.reducers(on_reduce, build_tree, actions),
+                                            values)
+        
+        tables = self.tables
+        action = tables.action
+        goto = tables.goto
+        n_terminals = len(tables.terminals)
+        n_non_terminals = len(tables.non_terminals)
+        production_lhs = tables.production_lhs
+        production_len = tables.production_len
+        terminal_ids = tables.terminal_ids
         
+        tokens = iter(tokens)
+        stack = [0]  # 状态栈
+        state = 0
+        position = 0
+        column = terminal_ids.get(next(tokens, '$'))
         while True:
-            current_state = state_stack[-1]
-            current_token = tokens[input_pos]
-            
-            # 记录当前步骤
-            step = {
-                'stateStack': state_stack.copy(),
-                'symbolStack': symbol_stack.copy(),
-                'input': tokens[input_pos:],
-                'action': ''
-            }
-            
-            if (current_state, current_token) in self.action_table:
-                action, value = self.action_table[(current_state, current_token)]
-                
-                if action == 'shift':
-                    state_stack.append(value)
-                    symbol_stack.append(current_token)
-                    input_pos += 1
-                    step['action'] = f'移进 {current_token}'
-                    
-                elif action == 'reduce':
-                    production = self.productions[value]
-                    for _ in range(len(production.right)):
-                        state_stack.pop()
-                        symbol_stack.pop()
-                    
-                    symbol_stack.append(production.left)
-                    current_state = state_stack[-1]
-                    state_stack.append(self.goto_table[(current_state, production.left)])
-                    step['action'] = f'归约 {production.left} -> {" ".join(production.right)}'
-                    
-                elif action == 'accept':
-                    step['action'] = '接受'
-                    steps.append(step)
-                    return True, steps
-                    
+            code = action[state * n_terminals + column] if column is not None else ERROR
+            kind = code & 3
+            if kind == SHIFT:
+                state = code >> 2
+                stack.append(state)
+                position += 1
+                column = terminal_ids.get(next(tokens, '$'))
+            elif kind == REDUCE:
+                production = code >> 2
+                length = production_len[production]
+                if length:
+                    del stack[-length:]
+                state = goto[stack[-1] * n_non_terminals + production_lhs[production]]
+                if state == NO_GOTO:
+                    return ParseResult(False, position)
+                stack.append(state)
+            elif kind == ACCEPT:
+                return ParseResult(True)
             else:
-                step['action'] = '错误'
-                steps.append(step)
-                return False, steps
-            
-            steps.append(step)
+                return ParseResult(False, position)
+    
+    def reducers(self, on_reduce=None, build_tree: bool = False,
+                 actions: Optional[Mapping[int, Callable[[List[Any]], Any]]] = None
+                 ) -> List[Callable[[List[Any]], Any]]:
+        """各产生式归约时由子节点值列表计算归约结果的函数，按产生式编号索引"""
+        if actions is not None:
+            unknown = [p for p in actions if not 0 <= p < len(self.productions)]
+            if unknown:
+                raise ValueError(f'不存在的产生式编号: {unknown[0]}')
+            return [actions.get(p.id, _first_child) for p in self.productions]
+        if on_reduce is not None:
+            return [partial(on_reduce, p) for p in self.productions]
+        # 未指定回调时（包括只因压缩分析表而走这里）值为 (产生式编号, 子节点元组)
+        return [lambda children, p=p.id: (p, tuple(children)) for p in self.productions]
+    
+    def _recognize_semantic(self, tokens: Iterable[str], reducers: List[Callable[[List[Any]], Any]],
+                            values: Optional[Iterable[Any]]) -> 'ParseResult':
+        """带值栈的快速分析，支持归约回调、语法树和压缩分析表"""
+        tables = self.tables
+        action_at = tables.action_at
+        goto_at = tables.goto_at
+        production_lhs = tables.production_lhs
+        production_len = tables.production_len
+        terminal_ids = tables.terminal_ids
+        
+        tokens = iter(tokens)
+        values = iter(values) if values is not None else None
+        stack = [0]  # 状态栈
+        value_stack = [None]  # 值栈
+        state = 0
+        position = 0
+        token = next(tokens, '$')
+        column = terminal_ids.get(token)
+        while True:
+            code = action_at(state, column) if column is not None else ERROR
+            kind = code & 3
+            if kind == SHIFT:
+                state = code >> 2
+                stack.append(state)
+                value_stack.append(next(values, token) if values is not None else token)
+                position += 1
+                token = next(tokens, '$')
+                column = terminal_ids.get(token)
+            elif kind == REDUCE:
+                production = code >> 2
+                length = production_len[production]
+                if length:
+                    children = value_stack[-length:]
+                    del stack[-length:]
+                    del value_stack[-length:]
+                else:
+                    children = []
+                value = reducers[production](children)
+                state = goto_at(stack[-1], production_lhs[production])
+                if state == NO_GOTO:
+                    return ParseResult(False, position)
+                stack.append(state)
+                value_stack.append(value)
+            elif kind == ACCEPT:
+                return ParseResult(True, value=value_stack[-1])
+            else:
+                return ParseResult(False, position)
     
     def parse(self, tokens: List[str]) -> bool:
-        """语法分析（向后兼容）"""
-        success, _ = self.parse_with_steps(tokens)
-        return success 
\ No newline at end of file
+        """语法分析（向后兼容），不记录步骤"""
+        return self.recognize(tokens).accepted
+    
+    def _recognize_chunk(self, token_lists: List[Sequence[str]]) -> List['ParseResult']:
+        return [self.recognize(tokens) for tokens in token_lists]
+    
+    def parse_batch(self, token_lists: Iterable[Sequence[str]], executor: str = 'thread',
+                    workers: Optional[int] = None, chunk_size: int = 64,
+                    pool=None) -> Iterator['ParseResult']:
+        """批量分析多个终结符序列，按输入顺序产出 ParseResult
+        
+        线程池直接共享本分析器；进程池中每个工作进程按产生式重建一次分析表。
+        """
+        if executor == 'process':
+            return map_ordered(_recognize_chunk, token_lists, self.production_specs(),
+                               self.precedence_levels, self.mode,
+                               executor=executor, workers=workers,
+                               chunk_size=chunk_size, pool=pool)
+        return map_ordered(self._recognize_chunk, token_lists, executor=executor,
+                           workers=workers, chunk_size=chunk_size, pool=pool)
+
+
+# 进程池工作进程内按文法哈希和构建模式缓存的分析器
+_worker_parsers: Dict[str, LRParser] = {}
+
+
+def _recognize_chunk(productions: List[Tuple], precedence: Sequence, mode: str,
+                     token_lists: List[Sequence[str]]) -> List[ParseResult]:
+    """在工作进程中分析一批终结符序列"""
+    key = f'{grammar_hash(productions, precedence)}.{mode}'
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        parser = LRParser()
+        parser.mode = mode
+        for left, right, *rest in productions:
+            parser.add_production(left, list(right), *rest)
+        for associativity, terminals in precedence:
+            parser.add_precedence(associativity, terminals)
+        parser.build()
+        parser.freeze()
+        _worker_parsers[key] = parser
+    return parser._recognize_chunk(token_lists)
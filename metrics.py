@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from typing import Dict, Any
+
+# 计数器的说明，用于 Prometheus 文本格式的 HELP 行
+COUNTER_HELP: Dict[str, str] = {
+    'tokens': '词法分析产生的词法单元数（不含EOF）',
+    'closure_calls': '构建项集族时的闭包计算次数',
+    'goto_calls': 'GOTO(I,X) 计算次数',
+    'states': '构建的LR状态数',
+    'parses': '语法分析次数',
+    'shifts': '语法分析的移进步数',
+    'reduces': '语法分析的归约步数（只有记录分析过程的 trace 统计）',
+    'requests': '/analyze 请求数',
+}
+
+
+class _NullPhase:
+    """未启用时的空计时器"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """记录一个阶段耗时的计时器"""
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats: 'Stats', name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Stats:
+    """进程级的分阶段耗时和计数
+
+    未启用时 phase() 返回共享的空计时器，调用方在热路径上先检查 enabled，
+    只在启用时计数，开销只有一次属性读取。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._counters: Dict[str, int] = {}
+        # 阶段名 -> [次数, 累计秒数]
+        self._phases: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def count(self, name: str, n: int = 1):
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float):
+        """记录一个阶段的一次耗时"""
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                self._phases[name] = [1, seconds]
+            else:
+                phase[0] += 1
+                phase[1] += seconds
+
+    def phase(self, name: str):
+        """用于 with 语句的阶段计时器，未启用时不计时"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def reset(self):
+        """清空所有计数和耗时"""
+        with self._lock:
+            self._counters.clear()
+            self._phases.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前的计数和各阶段 {次数, 累计秒数}"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'counters': dict(self._counters),
+                'phases': {name: {'count': count, 'seconds': seconds}
+                           for name, (count, seconds) in self._phases.items()}
+            }
+
+    def prometheus(self, prefix: str = 'lr') -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        snapshot = self.snapshot()
+        lines = [f'# HELP {prefix}_metrics_enabled 是否启用指标收集',
+                 f'# TYPE {prefix}_metrics_enabled gauge',
+                 f"{prefix}_metrics_enabled {int(snapshot['enabled'])}"]
+        for name in sorted(snapshot['counters']):
+            metric = f'{prefix}_{name}_total'
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f"{metric} {snapshot['counters'][name]}")
+        if snapshot['phases']:
+            metric = f'{prefix}_phase_seconds'
+            lines.append(f'# HELP {metric} 各阶段的累计耗时（秒）')
+            lines.append(f'# TYPE {metric} summary')
+            for name in sorted(snapshot['phases']):
+                phase = snapshot['phases'][name]
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{metric}_sum{{phase="{label}"}} {phase["seconds"]:.9f}')
+                lines.append(f'{metric}_count{{phase="{label}"}} {phase["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# 进程级统计，环境变量 LR_METRICS=1 时启用
+stats = Stats(enabled=os.environ.get('LR_METRICS', '') not in ('', '0'))
@@ -0,0 +1,312 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import List, Dict, Tuple, Optional, Iterator, Sequence
+
+# 动作编码：低2位为动作类型，其余位为参数（目标状态或产生式编号）
+ERROR = 0
+SHIFT = 1
+REDUCE = 2
+ACCEPT = 3
+
+ACTION_NAMES = {SHIFT: 'shift', REDUCE: 'reduce', ACCEPT: 'accept'}
+ACTION_KINDS = {name: kind for kind, name in ACTION_NAMES.items()}
+
+# 转移表中的空位
+NO_GOTO = -1
+
+
+def encode_action(action: str, value: int) -> int:
+    """将 (动作, 参数) 编码为整数"""
+    return (value << 2) | ACTION_KINDS[action]
+
+
+def decode_action(code: int) -> Optional[Tuple[str, int]]:
+    """将整数解码为 (动作, 参数)，错误动作返回None"""
+    kind = code & 3
+    if kind == ERROR:
+        return None
+    return ACTION_NAMES[kind], code >> 2
+
+
+def comb_compress(rows: Sequence[Sequence[Tuple[int, int]]], empty: int
+                  ) -> Tuple[array, array, array]:
+    """行位移（梳状）压缩稀疏表
+
+    rows[r] 为第r行的非空项 (列号, 值)。返回 (base, check, value)：
+    查找 (r, c) 时取 i = base[r] + c，若 check[i] == r 则值为 value[i]，否则为空。
+    """
+    base = array('i', [0] * len(rows))
+    check = array('i')
+    value = array('i')
+    width = max((col for row in rows for col, _ in row), default=-1) + 1
+    # 先放置较稠密的行，空隙留给稀疏行
+    order = sorted(range(len(rows)), key=lambda r: -len(rows[r]))
+    first_free = 0
+    for r in order:
+        row = rows[r]
+        if not row:
+            continue
+        cols = [col for col, _ in row]
+        displacement = first_free - min(cols)
+        while True:
+            if displacement >= 0 and all(
+                    displacement + col >= len(check) or check[displacement + col] == -1
+                    for col in cols):
+                break
+            displacement += 1
+        needed = displacement + width
+        if needed > len(check):
+            check.extend([-1] * (needed - len(check)))
+            value.extend([empty] * (needed - len(value)))
+        base[r] = displacement
+        for col, cell in row:
+            check[displacement + col] = r
+            value[displacement + col] = cell
+        while first_free < len(check) and check[first_free] != -1:
+            first_free += 1
+    # 保证任意 base[r] + c 都不越界
+    needed = max(base, default=0) + width
+    if needed > len(check):
+        check.extend([-1] * (needed - len(check)))
+        value.extend([empty] * (needed - len(value)))
+    return base, check, value
+
+
+class ParseTables:
+    """紧凑分析表：符号映射为列号，动作和转移打包在整数数组中"""
+
+    def __init__(self, terminals: List[str], non_terminals: List[str], n_states: int,
+                 action: Optional[array], goto: Optional[array], production_lhs: array,
+                 production_len: array):
+        # 终结符列（含$）与非终结符列
+        self.terminals = terminals
+        self.non_terminals = non_terminals
+        self.terminal_ids: Dict[str, int] = {symbol: i for i, symbol in enumerate(terminals)}
+        self.non_terminal_ids: Dict[str, int] = {symbol: i for i, symbol in enumerate(non_terminals)}
+        self.n_states = n_states
+        # 稠密表，按行存放：action[state * 终结符数 + 列]；压缩后为None
+        self.action = action
+        self.goto = goto
+        # 各产生式左部的非终结符列号和右部长度，归约时使用
+        self.production_lhs = production_lhs
+        self.production_len = production_len
+        # 行位移压缩后的表，compress() 之后才有
+        self.compressed = False
+        self.action_base = self.action_check = self.action_value = None
+        self.goto_base = self.goto_check = self.goto_value = None
+
+    @classmethod
+    def from_dicts(cls, action_table: Dict[Tuple[int, str], Tuple[str, int]],
+                   goto_table: Dict[Tuple[int, str], int], terminals: List[str],
+                   non_terminals: List[str], n_states: int,
+                   productions: Sequence, compress: bool = False) -> 'ParseTables':
+        """由 (状态, 符号) 字典形式的分析表构建"""
+        terminal_ids = {symbol: i for i, symbol in enumerate(terminals)}
+        non_terminal_ids = {symbol: i for i, symbol in enumerate(non_terminals)}
+        n_terminals = len(terminals)
+        n_non_terminals = len(non_terminals)
+
+        action = array('i', [ERROR]) * (n_states * n_terminals)
+        for (state, symbol), (kind, value) in action_table.items():
+            action[state * n_terminals + terminal_ids[symbol]] = encode_action(kind, value)
+        goto = array('i', [NO_GOTO]) * (n_states * n_non_terminals)
+        for (state, symbol), target in goto_table.items():
+            goto[state * n_non_terminals + non_terminal_ids[symbol]] = target
+
+        production_lhs = array('i', (non_terminal_ids[p.left] for p in productions))
+        production_len = array('i', (len(p.right) for p in productions))
+        tables = cls(terminals, non_terminals, n_states, action, goto,
+                     production_lhs, production_len)
+        if compress:
+            tables.compress()
+        return tables
+
+    def compress(self):
+        """对动作表和转移表做行位移压缩，之后查表走压缩格式，稠密表随即释放"""
+        if self.compressed:
+            return
+        n_terminals = len(self.terminals)
+        n_non_terminals = len(self.non_terminals)
+        action_rows = [[(col, self.action[state * n_terminals + col])
+                        for col in range(n_terminals)
+                        if self.action[state * n_terminals + col] != ERROR]
+                       for state in range(self.n_states)]
+        goto_rows = [[(col, self.goto[state * n_non_terminals + col])
+                      for col in range(n_non_terminals)
+                      if self.goto[state * n_non_terminals + col] != NO_GOTO]
+                     for state in range(self.n_states)]
+        self.action_base, self.action_check, self.action_value = comb_compress(action_rows, ERROR)
+        self.goto_base, self.goto_check, self.goto_value = comb_compress(goto_rows, NO_GOTO)
+        self.action = self.goto = None
+        self.compressed = True
+
+    def action_at(self, state: int, column: int) -> int:
+        """查动作表，返回动作编码"""
+        if self.compressed:
+            i = self.action_base[state] + column
+            return self.action_value[i] if self.action_check[i] == state else ERROR
+        return self.action[state * len(self.terminals) + column]
+
+    def goto_at(self, state: int, column: int) -> int:
+        """查转移表，返回目标状态，无转移时为 NO_GOTO"""
+        if self.compressed:
+            i = self.goto_base[state] + column
+            return self.goto_value[i] if self.goto_check[i] == state else NO_GOTO
+        return self.goto[state * len(self.non_terminals) + column]
+
+    def nbytes(self) -> int:
+        """分析表持有的全部数组（含产生式信息）的字节数"""
+        arrays = [getattr(self, name) for name in _ARRAY_NAMES]
+        return sum(len(a) * a.itemsize for a in arrays if a is not None)
+
+
+class ActionTableView(Mapping):
+    """以 (状态, 终结符) -> (动作, 参数) 字典的形式只读访问动作表"""
+
+    def __init__(self, tables: ParseTables):
+        self.tables = tables
+
+    def __getitem__(self, key: Tuple[int, str]) -> Tuple[str, int]:
+        state, symbol = key
+        column = self.tables.terminal_ids.get(symbol)
+        if column is None or not 0 <= state < self.tables.n_states:
+            raise KeyError(key)
+        action = decode_action(self.tables.action_at(state, column))
+        if action is None:
+            raise KeyError(key)
+        return action
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        tables = self.tables
+        for state in range(tables.n_states):
+            for column, symbol in enumerate(tables.terminals):
+                if tables.action_at(state, column) != ERROR:
+                    yield state, symbol
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class GotoTableView(Mapping):
+    """以 (状态, 非终结符) -> 状态 字典的形式只读访问转移表"""
+
+    def __init__(self, tables: ParseTables):
+        self.tables = tables
+
+    def __getitem__(self, key: Tuple[int, str]) -> int:
+        state, symbol = key
+        column = self.tables.non_terminal_ids.get(symbol)
+        if column is None or not 0 <= state < self.tables.n_states:
+            raise KeyError(key)
+        target = self.tables.goto_at(state, column)
+        if target == NO_GOTO:
+            raise KeyError(key)
+        return target
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        tables = self.tables
+        for state in range(tables.n_states):
+            for column, symbol in enumerate(tables.non_terminals):
+                if tables.goto_at(state, column) != NO_GOTO:
+                    yield state, symbol
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+# 分析表文件格式：
+#   头部   魔数(4) 版本(u32) 文法哈希(32) 元数据长度(u32)
+#   元数据 UTF-8 JSON，记录符号表、产生式、First/Follow集以及各数组的偏移和长度
+#   数据   按8字节对齐依次存放的 int32 数组，可直接 mmap 使用
+TABLE_FILE_MAGIC = b'LRTB'
+TABLE_FILE_VERSION = 1
+_HEADER = struct.Struct('<4sI32sI')
+_ARRAY_NAMES = ('action', 'goto', 'production_lhs', 'production_len',
+                'action_base', 'action_check', 'action_value',
+                'goto_base', 'goto_check', 'goto_value')
+
+
+class TableFileError(Exception):
+    """分析表文件无效、版本不符或与文法不匹配"""
+
+
+def write_table_file(path: str, tables: ParseTables, grammar_hash: str, metadata: Dict):
+    """将分析表写入文件（先写临时文件再原子替换）"""
+    arrays = {name: getattr(tables, name) for name in _ARRAY_NAMES
+              if getattr(tables, name) is not None}
+    offset = 0
+    layout = {}
+    for name, values in arrays.items():
+        layout[name] = [offset, len(values)]
+        offset += _align(len(values) * 4)
+    metadata = dict(metadata, terminals=tables.terminals, non_terminals=tables.non_terminals,
+                    n_states=tables.n_states, compressed=tables.compressed,
+                    byteorder=sys.byteorder, arrays=layout)
+    meta_bytes = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    meta_bytes += b' ' * (_align(_HEADER.size + len(meta_bytes)) - _HEADER.size - len(meta_bytes))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(TABLE_FILE_MAGIC, TABLE_FILE_VERSION,
+                             bytes.fromhex(grammar_hash), len(meta_bytes)))
+        f.write(meta_bytes)
+        for values in arrays.values():
+            data = array('i', values).tobytes()
+            f.write(data + b'\0' * (_align(len(data)) - len(data)))
+    os.replace(tmp_path, path)
+
+
+def read_table_file(path: str) -> Tuple[str, Dict, ParseTables]:
+    """通过 mmap 读取分析表文件，返回 (文法哈希, 元数据, 分析表)
+
+    返回的分析表数组直接引用映射的页面，不做拷贝。
+    """
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise TableFileError('分析表文件为空')
+    if len(buffer) < _HEADER.size:
+        raise TableFileError('分析表文件已损坏')
+    magic, version, digest, meta_length = _HEADER.unpack_from(buffer)
+    if magic != TABLE_FILE_MAGIC:
+        raise TableFileError('不是分析表文件')
+    if version != TABLE_FILE_VERSION:
+        raise TableFileError(f'分析表文件版本 {version} 不受支持')
+    try:
+        metadata = json.loads(bytes(buffer[_HEADER.size:_HEADER.size + meta_length]))
+    except ValueError:
+        raise TableFileError('分析表文件元数据已损坏')
+    if metadata.get('byteorder') != sys.byteorder:
+        raise TableFileError('分析表文件的字节序与本机不同')
+
+    data_start = _HEADER.size + meta_length
+    view = memoryview(buffer)
+    arrays = {}
+    for name, (offset, length) in metadata['arrays'].items():
+        start = data_start + offset
+        if start + length * 4 > len(buffer):
+            raise TableFileError('分析表文件已损坏')
+        arrays[name] = view[start:start + length * 4].cast('i')
+
+    # 压缩的分析表只使用梳状数组，不引用稠密表
+    compressed = metadata['compressed']
+    tables = ParseTables(metadata['terminals'], metadata['non_terminals'], metadata['n_states'],
+                         None if compressed else arrays['action'],
+                         None if compressed else arrays['goto'],
+                         arrays['production_lhs'], arrays['production_len'])
+    if compressed:
+        for name in _ARRAY_NAMES[4:]:
+            setattr(tables, name, arrays[name])
+        tables.compressed = True
+    return digest.hex(), metadata, tables
+
+
+def _align(n: int) -> int:
+    """向上对齐到8字节"""
+    return (n + 7) & ~7
@@ -0,0 +1,72 @@
+from array import array
+from typing import List, Dict, Iterator, Optional, Sequence
+from parse_tables import SHIFT, REDUCE, ACCEPT
+
+
+class ParseTrace:
+    """增量编码的分析过程
+
+    每一步只记录动作类型、动作参数（移进的目标状态或归约的产生式编号）、
+    归约后转移到的状态以及当时的输入位置，内存随步数线性增长。
+    完整的状态栈/符号栈快照在遍历 steps() 时按需重放生成。
+    """
+
+    def __init__(self, tokens: Sequence[str], productions: Sequence):
+        self.tokens = tokens
+        self.productions = productions
+        self.kinds = array('b')  # 动作类型
+        self.args = array('i')  # 移进的目标状态 / 归约的产生式编号
+        self.targets = array('i')  # 归约后GOTO到的状态
+        self.positions = array('i')  # 执行该步时的输入位置
+        self.accepted = False
+
+    def record(self, kind: int, arg: int, target: int, position: int):
+        """记录一步"""
+        self.kinds.append(kind)
+        self.args.append(arg)
+        self.targets.append(target)
+        self.positions.append(position)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def action_text(self, i: int) -> str:
+        """第i步的动作描述"""
+        kind = self.kinds[i]
+        if kind == SHIFT:
+            return f'移进 {self.tokens[self.positions[i]]}'
+        if kind == REDUCE:
+            production = self.productions[self.args[i]]
+            return f'归约 {production.left} -> {" ".join(production.right)}'
+        if kind == ACCEPT:
+            return '接受'
+        return '错误'
+
+    def steps(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """按需重放，生成第 offset 步起最多 limit 步的完整快照"""
+        end = len(self) if limit is None else min(len(self), offset + limit)
+        state_stack = [0]  # 状态栈
+        symbol_stack = ['$']  # 符号栈
+        for i in range(end):
+            if i >= offset:
+                yield {
+                    'stateStack': state_stack.copy(),
+                    'symbolStack': symbol_stack.copy(),
+                    'input': list(self.tokens[self.positions[i]:]),
+                    'action': self.action_text(i)
+                }
+            kind = self.kinds[i]
+            if kind == SHIFT:
+                state_stack.append(self.args[i])
+                symbol_stack.append(self.tokens[self.positions[i]])
+            elif kind == REDUCE:
+                production = self.productions[self.args[i]]
+                if production.right:
+                    del state_stack[-len(production.right):]
+                    del symbol_stack[-len(production.right):]
+                state_stack.append(self.targets[i])
+                symbol_stack.append(production.left)
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """分页获取步骤快照"""
+        return list(self.steps(offset, limit))
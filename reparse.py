@@ -0,0 +1,371 @@
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Any
+from lexer import KEYWORDS, OPERATORS, scan_from, word_types
+from parse_tables import ERROR, SHIFT, REDUCE, ACCEPT, NO_GOTO
+from compiled_grammar import CompiledGrammar, TOKEN_TO_TERMINAL
+
+# 每块的词法单元数量
+BLOCK_SIZE = 256
+
+
+class TokenBlock:
+    """一块连续的词法单元
+
+    起始偏移相对块基址保存，编辑后其后的块只需平移基址和首个下标；
+    checkpoint 为分析到本块第一个词法单元之前（尚未用它做向前看）时的状态栈。
+    当前的分析在本块之前出错时，checkpoint 可能是更早一次分析留下的（之后的词法单元
+    未变），outcome 记录从它继续分析的结论：出错位置到输入末尾的词法单元数，-1 表示接受。
+    """
+    __slots__ = ('base', 'first', 'starts', 'lengths', 'columns', 'checkpoint', 'outcome')
+
+    def __init__(self, base: int, first: int):
+        self.base = base
+        self.first = first
+        self.starts = array('I')  # 相对 base 的起始偏移
+        self.lengths = array('I')
+        self.columns = array('i')  # 终结符在分析表中的列号，-1 表示分析表中没有的终结符
+        self.checkpoint: Optional[Tuple[int, ...]] = None
+        self.outcome = -1
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+
+class ReparseSession:
+    """编辑器的增量分析会话
+
+    保存上一次的词法单元和分块的分析栈检查点。每次编辑只重新扫描受影响的词法单元，
+    直到新扫描的词法单元与编辑区之后的旧词法单元对齐；语法分析从受影响块的检查点恢复，
+    到达后续某块时状态栈与旧检查点相同即停止，之后的分析结果沿用上一次的结论。
+    每次编辑的Python层工作量与文档长度基本无关（只有按块平移基址是 O(n/BLOCK_SIZE)）。
+    """
+
+    def __init__(self, grammar: CompiledGrammar, source: str = '',
+                 session_id: Optional[str] = None,
+                 token_terminals: Dict[str, str] = TOKEN_TO_TERMINAL):
+        self.id = session_id or uuid.uuid4().hex
+        self.grammar = grammar
+        # 词法单元类型 -> 终结符，未映射的类型按值匹配终结符
+        self.token_terminals = token_terminals
+        self.source = source
+        self.version = 0
+        self.lock = threading.Lock()
+        self._types = word_types(KEYWORDS, dict(OPERATORS))
+        self._terminal_ids = grammar.parser.tables.terminal_ids
+        self._end_column = self._terminal_ids.get('$', -1)
+        self.blocks: Optional[List[TokenBlock]] = None
+        self.token_count = 0
+        self.accepted = False
+        self.error_position = -1
+        self.error: Optional[str] = None
+        # 最近一次编辑重新扫描和重新分析的词法单元数
+        self.relexed = 0
+        self.reparsed = 0
+        self._rebuild()
+
+    def _column(self, token_type: str, start: int, length: int) -> int:
+        terminal = self.token_terminals.get(token_type)
+        if terminal is None:
+            terminal = self.source[start:start + length]
+        return self._terminal_ids.get(terminal, -1)
+
+    def _scan(self, pos: int, tokens: List[Tuple[int, int, int]], stop=None) -> Optional[int]:
+        """从 pos 起扫描，把 (起始偏移, 长度, 列号) 追加到 tokens
+
+        stop(start) 返回旧词法单元下标时表示已与旧词法单元对齐，停止扫描并返回该下标。
+        """
+        for token_type, start, length in scan_from(self.source, pos, self._types):
+            if stop is not None:
+                index = stop(start)
+                if index is not None:
+                    return index
+            tokens.append((start, length, self._column(token_type, start, length)))
+        return None
+
+    def _make_blocks(self, tokens: List[Tuple[int, int, int]], first: int) -> List[TokenBlock]:
+        """将词法单元按 BLOCK_SIZE 分块，尽量均分以免产生过小的块"""
+        if not tokens:
+            return []
+        count = -(-len(tokens) // BLOCK_SIZE)
+        size = -(-len(tokens) // count)
+        blocks = []
+        for i in range(0, len(tokens), size):
+            chunk = tokens[i:i + size]
+            block = TokenBlock(chunk[0][0], first + i)
+            base = block.base
+            for start, length, column in chunk:
+                block.starts.append(start - base)
+                block.lengths.append(length)
+                block.columns.append(column)
+            blocks.append(block)
+        return blocks
+
+    def _rebuild(self):
+        """完整地重新扫描和分析（新建会话或上次编辑出现词法错误之后）"""
+        tokens = []
+        try:
+            self._scan(0, tokens)
+        except Exception as e:
+            self._lex_error(e)
+            return
+        self.blocks = self._make_blocks(tokens, 0)
+        self.token_count = len(tokens)
+        self.error = None
+        self.relexed = len(tokens)
+        self.reparsed = 0
+        self._parse_from(0, [0], len(self.blocks))
+
+    def _lex_error(self, error: Exception):
+        """词法错误：丢弃词法单元，下一次编辑时完整重建"""
+        self.blocks = None
+        self.token_count = 0
+        self.accepted = False
+        self.error_position = -1
+        self.error = str(error)
+
+    def start(self, index: int) -> int:
+        """第 index 个词法单元的起始偏移，index 等于词法单元数时为文本末尾"""
+        if index >= self.token_count:
+            return len(self.source)
+        block = self.blocks[bisect_right(self._firsts, index) - 1]
+        return block.base + block.starts[index - block.first]
+
+    @property
+    def _firsts(self) -> List[int]:
+        return [block.first for block in self.blocks]
+
+    def _token_before(self, offset: int) -> int:
+        """起始偏移小于 offset 的最后一个词法单元下标，没有时为-1"""
+        blocks = self.blocks
+        b = bisect_left([block.base for block in blocks], offset) - 1
+        if b < 0:
+            return -1
+        block = blocks[b]
+        return block.first + bisect_left(block.starts, offset - block.base) - 1
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> Dict[str, Any]:
+        """应用一次编辑：删除 [offset, offset + deleted) 并在 offset 处插入 inserted"""
+        old_length = len(self.source)
+        if offset < 0 or deleted < 0 or offset + deleted > old_length:
+            raise ValueError(f'编辑范围超出文本: offset={offset}, deleted={deleted}, 文本长度={old_length}')
+        self.source = self.source[:offset] + inserted + self.source[offset + deleted:]
+        self.version += 1
+        if self.blocks is None:
+            self._rebuild()
+            return self.result()
+
+        blocks = self.blocks
+        delta = len(inserted) - deleted
+        edit_end = offset + deleted
+
+        # 起始于编辑位置之前的最后一个词法单元可能与插入的文本连成一个，从它开始重新扫描；
+        # 没有这样的词法单元时编辑位置之前只有空白
+        before = self._token_before(offset)
+        j = max(before, 0)
+        pos = self.start(before) if before >= 0 else offset
+        bj = bisect_right(self._firsts, j) - 1 if blocks else 0
+
+        # 旧词法单元游标：找到起始于编辑区之后、平移后与新词法单元起始偏移相同的旧词法单元
+        cursor_block = bj
+        cursor = j - blocks[bj].first if blocks else 0
+
+        def stop(start: int) -> Optional[int]:
+            nonlocal cursor_block, cursor
+            while cursor_block < len(blocks):
+                block = blocks[cursor_block]
+                if cursor >= len(block):
+                    cursor_block, cursor = cursor_block + 1, 0
+                    continue
+                old_start = block.base + block.starts[cursor]
+                if old_start < edit_end or old_start + delta < start:
+                    cursor += 1
+                    continue
+                return block.first + cursor if old_start + delta == start else None
+            return None
+
+        new_tokens = []
+        try:
+            m = self._scan(pos, new_tokens, stop)
+        except Exception as e:
+            self._lex_error(e)
+            return self.result()
+        if m is None:
+            m = self.token_count
+        self.relexed = len(new_tokens)
+
+        # 受影响的块：bj 到 m 所在的块（m 恰好是块首时该块原样保留）
+        if blocks:
+            head = blocks[bj]
+            tokens = [(head.base + head.starts[i], head.lengths[i], head.columns[i])
+                      for i in range(j - head.first)]
+        else:
+            tokens = []
+        tokens.extend(new_tokens)
+        end = bisect_right(self._firsts, m) - 1 if m < self.token_count else len(blocks)
+        if m < self.token_count and blocks[end].first != m:
+            tail = blocks[end]
+            tokens.extend((tail.base + tail.starts[i] + delta, tail.lengths[i], tail.columns[i])
+                          for i in range(m - tail.first, len(tail)))
+            end += 1
+        first = blocks[bj].first if blocks else 0
+        resume = blocks[bj].checkpoint if blocks else (0,)
+        old_end = blocks[end].first if end < len(blocks) else self.token_count
+        count_delta = first + len(tokens) - old_end
+        reached = self.accepted or self.error_position >= first
+        if not reached:
+            # 上次分析在本块之前已经出错，结论不变；出错块之后、编辑处之前的过期检查点
+            # 对应的后缀已经改变，不能再用于提前结束
+            for block in blocks[bisect_right(self._firsts, self.error_position):bj]:
+                block.checkpoint = None
+
+        rebuilt = self._make_blocks(tokens, first)
+        for block in blocks[end:]:
+            block.base += delta
+            block.first += count_delta
+        blocks[bj:end] = rebuilt
+        self.token_count += count_delta
+        if not reached:
+            self.reparsed = 0
+            return self.result()
+
+        # 上一次的结论换算到编辑后的下标：old_limit 之前的块上一次分析到达过
+        if self.accepted:
+            old_limit, old_distance = self.token_count, -1
+        elif self.error_position >= old_end:
+            old_limit = self.error_position + count_delta
+            old_distance = self.token_count - old_limit
+        else:
+            old_limit, old_distance = first - 1, -1
+        if rebuilt:
+            rebuilt[0].checkpoint = resume
+        self._parse_from(bj, list(resume), bj + len(rebuilt), old_limit, old_distance)
+        return self.result()
+
+    def _parse_from(self, b: int, stack: List[int], intact: int,
+                    old_limit: int = -1, old_distance: int = -1):
+        """从第 b 块开始以给定状态栈继续分析
+
+        下标不小于 intact 的块未被编辑，到达这样的块时状态栈与其旧检查点相同，
+        说明之后的分析过程不变，直接沿用旧结论：上一次分析到达过的块（首个下标不超过
+        old_limit）沿用上一次的结论，否则沿用该块记录的 outcome。
+        """
+        tables = self.grammar.parser.tables
+        action_at = tables.action_at
+        goto_at = tables.goto_at
+        production_lhs = tables.production_lhs
+        production_len = tables.production_len
+        blocks = self.blocks
+        state = stack[-1]
+        reparsed = 0
+        for b in range(b, len(blocks)):
+            block = blocks[b]
+            checkpoint = tuple(stack)
+            if b >= intact and block.checkpoint == checkpoint:
+                distance = old_distance if block.first <= old_limit else block.outcome
+                self._finish(distance, reparsed)
+                return
+            block.checkpoint = checkpoint
+            position = block.first
+            for column in block.columns:
+                while True:
+                    code = action_at(state, column) if column >= 0 else ERROR
+                    kind = code & 3
+                    if kind == SHIFT:
+                        state = code >> 2
+                        stack.append(state)
+                        break
+                    if kind == REDUCE:
+                        production = code >> 2
+                        length = production_len[production]
+                        if length:
+                            del stack[-length:]
+                        state = goto_at(stack[-1], production_lhs[production])
+                        if state != NO_GOTO:
+                            stack.append(state)
+                            continue
+                    # 出错：之后的块不会被分析到。未编辑的块保留检查点并记下上一次的结论，
+                    # 错误修正后分析到这些块时仍可提前结束
+                    for i in range(b + 1, len(blocks)):
+                        later = blocks[i]
+                        if i < intact:
+                            later.checkpoint = None
+                        elif later.checkpoint is not None and later.first <= old_limit:
+                            later.outcome = old_distance
+                    self._finish(self.token_count - position, reparsed)
+                    return
+                position += 1
+                reparsed += 1
+
+        # 输入末尾
+        column = self._end_column
+        while True:
+            code = action_at(state, column) if column >= 0 else ERROR
+            kind = code & 3
+            if kind == REDUCE:
+                production = code >> 2
+                length = production_len[production]
+                if length:
+                    del stack[-length:]
+                state = goto_at(stack[-1], production_lhs[production])
+                if state != NO_GOTO:
+                    stack.append(state)
+                    continue
+            self._finish(-1 if kind == ACCEPT else 0, reparsed)
+            return
+
+    def _finish(self, distance: int, reparsed: int):
+        """记录结论，distance 为出错位置到输入末尾的词法单元数，-1 表示接受"""
+        self.accepted = distance < 0
+        self.error_position = -1 if distance < 0 else self.token_count - distance
+        self.reparsed = reparsed
+
+    def result(self) -> Dict[str, Any]:
+        """当前文本的分析结论，字段与 CompiledGrammar.analyze 一致"""
+        if self.error is not None:
+            return {'success': False, 'error': self.error, 'session': self.id,
+                    'version': self.version}
+        return {
+            'success': True,
+            'session': self.id,
+            'version': self.version,
+            'accepted': self.accepted,
+            'error_position': self.error_position,
+            'error_offset': self.start(self.error_position) if self.error_position >= 0 else -1,
+            'token_count': self.token_count,
+            'relexed': self.relexed,
+            'reparsed': self.reparsed
+        }
+
+
+class SessionStore:
+    """有上限的会话表，按最近使用淘汰"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._sessions: 'OrderedDict[str, ReparseSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, grammar: CompiledGrammar, source: str,
+               token_terminals: Dict[str, str] = TOKEN_TO_TERMINAL) -> ReparseSession:
+        """新建会话（完整分析一次）并登记"""
+        session = ReparseSession(grammar, source, token_terminals=token_terminals)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[ReparseSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
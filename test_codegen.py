@@ -0,0 +1,63 @@
+import random
+import pytest
+from codegen import write_parser_module, load_parser_module
+from compiled_grammar import DEFAULT_PRODUCTIONS
+from lr_parser import LRParser, TABLE_MODES
+
+# (名称, 产生式, 优先级声明)
+GRAMMARS = [
+    ('default', DEFAULT_PRODUCTIONS, ()),
+    # 只有一个非终结符时转移表每行只有一列
+    ('single', (('E', ('E', '+', 'id')), ('E', ('id',))), ()),
+    ('precedence', (('E', ('E', '+', 'E')), ('E', ('E', '*', 'E')), ('E', ('id',))),
+     (('left', ('+',)), ('left', ('*',)))),
+]
+
+ACCEPTED = [
+    ['id', '$'],
+    ['id', '+', 'id', '$'],
+    ['id', '+', 'id', '+', 'id', '$'],
+]
+
+REJECTED = [
+    ['$'],
+    ['+', '$'],
+    ['id', '+', '$'],
+    ['id', 'id', '$'],
+    ['id', '+', '+', 'id', '$'],
+    ['id', '?', '$'],
+]
+
+
+def build(productions, precedence, mode: str) -> LRParser:
+    parser = LRParser()
+    parser.mode = mode
+    for left, right in productions:
+        parser.add_production(left, list(right))
+    for associativity, terminals in precedence:
+        parser.add_precedence(associativity, terminals)
+    parser.build()
+    return parser
+
+
+def random_inputs(terminals, count: int = 300, seed: int = 0):
+    rng = random.Random(seed)
+    symbols = sorted(set(terminals) - {'$'})
+    return [[rng.choice(symbols) for _ in range(rng.randrange(8))] + ['$'] for _ in range(count)]
+
+
+@pytest.mark.parametrize('mode', TABLE_MODES)
+@pytest.mark.parametrize('name,productions,precedence', GRAMMARS, ids=[g[0] for g in GRAMMARS])
+def test_generated_module_agrees(tmp_path, name, productions, precedence, mode):
+    parser = build(productions, precedence, mode)
+    path = tmp_path / f'{name}_{mode}_parser.py'
+    write_parser_module(parser, str(path))
+    module = load_parser_module(str(path))
+
+    for tokens in ACCEPTED:
+        assert module.recognize(tokens) == (True, -1)
+    for tokens in REJECTED:
+        assert module.recognize(tokens)[0] is False
+    for tokens in ACCEPTED + REJECTED + random_inputs(parser.terminals):
+        expected = parser.recognize(tokens)
+        assert module.recognize(tokens) == (expected.accepted, expected.error_position)
@@ -0,0 +1,26 @@
+import math
+import pytest
+from evaluator import CompiledExpression
+
+
+def test_evaluates_with_folded_constants():
+    expression = CompiledExpression.from_source('a * (b + 2) + a * 3 + 1 * 2')
+    assert expression(a=2, b=5) == 22
+    assert expression({'a': 1.5}, b=0) == 9.5
+
+
+def test_folding_overflow_is_not_written_into_source():
+    huge = '1' + '0' * 300 + '.0'
+    expression = CompiledExpression.from_source(f'{huge} * {huge} + x')
+    assert expression(x=1) == math.inf
+    product = CompiledExpression.from_source('9' * 4000 + ' * ' + '9' * 4000 + ' + x')
+    assert product(x=0) == int('9' * 4000) ** 2
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        CompiledExpression.from_source('a + * b')
+    with pytest.raises(ValueError):
+        CompiledExpression.from_source('a + b')(a=1)
+    with pytest.raises(ValueError):
+        CompiledExpression.from_source('9' * 5000 + ' + x')
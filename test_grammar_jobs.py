@@ -0,0 +1,66 @@
+import os
+import pytest
+from compiled_grammar import GrammarRegistry
+from grammar_jobs import GrammarCompiler, READY
+from grammar_text import parse_grammar
+from lr_parser import grammar_hash
+
+# 没有优先级声明的二义文法，E + E 之后遇到 + 有一处移进/归约冲突
+AMBIGUOUS = """
+%token id = IDENTIFIER INTEGER
+%token +
+E -> E + E | id
+"""
+
+
+def compile_once(table_dir: str):
+    compiler = GrammarCompiler(GrammarRegistry(), table_dir=table_dir)
+    job = compiler.submit(parse_grammar(AMBIGUOUS))
+    assert job.done.wait(60)
+    compiler.shutdown()
+    return job
+
+
+def table_path(table_dir: str) -> str:
+    spec = parse_grammar(AMBIGUOUS)
+    return os.path.join(table_dir, f'{grammar_hash(spec.productions, spec.precedence)}.lalr.lrtb')
+
+
+def test_conflicts_survive_loading_from_table_file(tmp_path):
+    first = compile_once(str(tmp_path))
+    assert first.status == READY
+    assert first.to_dict()['conflicts'] > 0
+    # 新的编译器直接加载已有的表文件，冲突数不变
+    second = compile_once(str(tmp_path))
+    assert second.status == READY
+    assert second.to_dict()['conflicts'] == first.to_dict()['conflicts']
+    # 注册表命中时同样如此
+    registry = GrammarRegistry()
+    registry.add(second.grammar)
+    compiler = GrammarCompiler(registry, table_dir=str(tmp_path))
+    third = compiler.submit(parse_grammar(AMBIGUOUS))
+    assert third.status == READY
+    assert third.to_dict()['conflicts'] == first.to_dict()['conflicts']
+
+
+@pytest.mark.parametrize('content', [b'', b'not a table file', b'LRTB' + b'\0' * 200],
+                         ids=['empty', 'garbage', 'bad-header'])
+def test_corrupt_table_file_is_rebuilt_in_subprocess(tmp_path, monkeypatch, content):
+    with open(table_path(str(tmp_path)), 'wb') as f:
+        f.write(content)
+    # 损坏的表文件应交给有时间限制的子进程重新构建，而不是在服务进程中静默构建
+    builds = []
+    original = GrammarCompiler._build_in_subprocess
+
+    def build_in_subprocess(self, *args):
+        builds.append(args)
+        return original(self, *args)
+
+    monkeypatch.setattr(GrammarCompiler, '_build_in_subprocess', build_in_subprocess)
+    job = compile_once(str(tmp_path))
+    assert job.status == READY
+    assert len(builds) == 1
+    assert job.to_dict()['conflicts'] > 0
+    # 重新构建的文件之后可直接加载
+    assert compile_once(str(tmp_path)).status == READY
+    assert len(builds) == 1
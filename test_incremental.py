@@ -0,0 +1,78 @@
+import random
+import pytest
+from benchmark import generate_chain_grammar, generate_statement_grammar
+from lr_parser import LRParser
+
+MODES = ('lr0', 'slr', 'lalr')
+
+
+def fresh(productions, mode: str) -> LRParser:
+    parser = LRParser()
+    parser.mode = mode
+    for left, right in productions:
+        parser.add_production(left, list(right))
+    parser.build()
+    return parser
+
+
+def assert_same_tables(parser: LRParser, expected: LRParser):
+    tables, expected_tables = parser.tables, expected.tables
+    assert tables.terminals == expected_tables.terminals
+    assert tables.non_terminals == expected_tables.non_terminals
+    assert tables.n_states == expected_tables.n_states
+    assert list(tables.action) == list(expected_tables.action)
+    assert list(tables.goto) == list(expected_tables.goto)
+    assert list(tables.production_lhs) == list(expected_tables.production_lhs)
+    assert list(tables.production_len) == list(expected_tables.production_len)
+    assert parser.get_first_sets() == expected.get_first_sets()
+    assert parser.get_follow_sets() == expected.get_follow_sets()
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_add_and_remove_production(mode):
+    productions = [(left, tuple(right)) for left, right in generate_chain_grammar(4)]
+    parser = LRParser()
+    parser.mode = mode
+    parser.incremental = True
+    for left, right in productions:
+        parser.add_production(left, list(right))
+    parser.build()
+
+    edit = ('E2', ('E2', 'x', 'P'))
+    parser.add_production(edit[0], list(edit[1]))
+    parser.build()
+    assert_same_tables(parser, fresh(productions + [edit], mode))
+
+    parser.remove_production(edit[0], list(edit[1]))
+    parser.build()
+    assert_same_tables(parser, fresh(productions, mode))
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_random_edits_match_fresh_build(seed):
+    rng = random.Random(seed)
+    mode = MODES[seed % len(MODES)]
+    base = generate_chain_grammar(rng.randint(1, 4)) if seed % 2 else generate_statement_grammar()
+    productions = [(left, tuple(right)) for left, right in base]
+    parser = LRParser()
+    parser.mode = mode
+    parser.incremental = True
+    for left, right in productions:
+        parser.add_production(left, list(right))
+    parser.build()
+
+    lefts = sorted({left for left, _ in productions}) + ['Q']
+    symbols = sorted({symbol for _, right in productions for symbol in right}) + ['Q', 'zz']
+    for _ in range(8):
+        if rng.random() < 0.5 and len(productions) > 2:
+            # 不删除开始符号的产生式；remove_production 删除第一个相同的产生式
+            left, right = productions[rng.randrange(1, len(productions))]
+            productions.remove((left, right))
+            parser.remove_production(left, list(right))
+        else:
+            left = rng.choice(lefts)
+            right = tuple(rng.choice(symbols) for _ in range(rng.randint(0, 3)))
+            productions.append((left, right))
+            parser.add_production(left, list(right))
+        parser.build()
+        assert_same_tables(parser, fresh(productions, mode))
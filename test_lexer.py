@@ -0,0 +1,78 @@
+import random
+import time
+import pytest
+from lexer import Lexer, RegexLexer, StreamLexer, scan_from, word_types, KEYWORDS, OPERATORS
+from token_buffer import TokenBuffer
+
+TYPES = word_types(KEYWORDS, dict(OPERATORS))
+ALPHABET = ['a', 'b', 'x1', 'if', 'int', '_', '0', '12', '3.5', '.', '+', '-', '*', '/', '=', '==',
+            '(', ')', ';', ' ', '  ', '\n', '\t']
+
+
+def lex(source: str):
+    """Lexer 的结果：词法单元列表，或出错时的异常信息"""
+    try:
+        return Lexer(source).tokenize()
+    except Exception as e:
+        return str(e)
+
+
+def regex_lex(source: str):
+    try:
+        return RegexLexer(source).tokenize()
+    except Exception as e:
+        return str(e)
+
+
+def buffer_lex(source: str):
+    try:
+        return list(TokenBuffer.from_source(source))
+    except Exception as e:
+        return str(e)
+
+
+def stream_lex(source: str, chunk_size: int = 3):
+    chunks = [source[i:i + chunk_size] for i in range(0, len(source), chunk_size)]
+    try:
+        return list(StreamLexer(chunks))
+    except Exception as e:
+        return str(e)
+
+
+def random_sources(count: int = 500, seed: int = 0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randrange(12))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('engine', [regex_lex, buffer_lex, stream_lex])
+def test_same_tokens_as_lexer(engine):
+    for source in random_sources() + ['', ' ', '\n', '\na\n', 'a\n\n', '1..2', 'a # b']:
+        assert engine(source) == lex(source), repr(source)
+
+
+def test_scan_from_matches_tokens():
+    for source in random_sources():
+        expected = lex(source)
+        if isinstance(expected, str):
+            continue
+        scanned = [(token_type, source[start:start + length])
+                   for token_type, start, length in scan_from(source, 0, TYPES)]
+        assert scanned == [(token.type, token.value) for token in expected[:-1]]
+
+
+@pytest.mark.parametrize('engine', [regex_lex, buffer_lex, stream_lex])
+@pytest.mark.parametrize('source', ['²', '1²', 'x²', '½', 'a½', '一二', 'Ⅻ', '٣.5', 'é_1', '²½'])
+def test_unicode_digits_and_letters_match_lexer(engine, source):
+    # 数字和字母按 str.isdigit()/isalpha() 分类，与 Lexer 相同
+    assert engine(source) == lex(source)
+
+
+@pytest.mark.parametrize('source', ['a' + ' ' * 200000, 'a+b' + '\n' * 200000,
+                                    'a ' + ' \t\n' * 100000 + 'b'])
+def test_long_whitespace_is_linear(source):
+    start = time.perf_counter()
+    tokens = TokenBuffer.from_source(source)
+    list(scan_from(source, 0, TYPES))
+    RegexLexer(source).tokenize()
+    assert time.perf_counter() - start < 1.0
+    assert list(tokens) == Lexer(source).tokenize()
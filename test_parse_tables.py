@@ -0,0 +1,45 @@
+from compiled_grammar import DEFAULT_PRODUCTIONS
+from lr_parser import LRParser
+from parse_tables import read_table_file
+
+
+def build(compress: bool) -> LRParser:
+    parser = LRParser()
+    parser.compress_tables = compress
+    for left, right in DEFAULT_PRODUCTIONS:
+        parser.add_production(left, list(right))
+    parser.build()
+    return parser
+
+
+def lookups(tables):
+    return ([tables.action_at(state, column) for state in range(tables.n_states)
+             for column in range(len(tables.terminals))],
+            [tables.goto_at(state, column) for state in range(tables.n_states)
+             for column in range(len(tables.non_terminals))])
+
+
+def held_bytes(tables) -> int:
+    arrays = [tables.action, tables.goto, tables.production_lhs, tables.production_len,
+              tables.action_base, tables.action_check, tables.action_value,
+              tables.goto_base, tables.goto_check, tables.goto_value]
+    return sum(len(a) * a.itemsize for a in arrays if a is not None)
+
+
+def test_compress_releases_dense_tables():
+    dense = build(False).tables
+    compressed = build(True).tables
+    assert compressed.action is None and compressed.goto is None
+    assert lookups(compressed) == lookups(dense)
+    assert compressed.nbytes() == held_bytes(compressed)
+    assert dense.nbytes() == held_bytes(dense)
+
+
+def test_compressed_table_file_has_only_comb_arrays(tmp_path):
+    parser = build(True)
+    path = str(tmp_path / 'tables.lrtb')
+    parser.save_tables(path)
+    _, metadata, tables = read_table_file(path)
+    assert 'action' not in metadata['arrays'] and 'goto' not in metadata['arrays']
+    assert tables.compressed and tables.action is None
+    assert lookups(tables) == lookups(parser.tables)
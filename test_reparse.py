@@ -0,0 +1,95 @@
+import random
+import pytest
+import reparse
+from benchmark import generate_expressions
+from compiled_grammar import CompiledGrammar, DEFAULT_PRODUCTIONS
+from reparse import ReparseSession, SessionStore
+from token_buffer import TokenBuffer
+
+GRAMMAR = CompiledGrammar(DEFAULT_PRODUCTIONS)
+SNIPPETS = [' + y', 'y', ' * 2', '(', ')', '+', '12', ' ', '\n', 'ab', '1.5', '#', '1.2.3']
+
+
+def assert_matches_full_analysis(session: ReparseSession):
+    expected = GRAMMAR.analyze(session.source)
+    result = session.result()
+    assert result['success'] == expected['success'], session.source
+    if not expected['success']:
+        assert result['error'] == expected['error']
+        return
+    assert (result['accepted'], result['error_position'], result['token_count']) == \
+        (expected['accepted'], expected['error_position'], expected['token_count']), session.source
+    buffer = TokenBuffer.from_source(session.source)
+    assert [session.start(i) for i in range(session.token_count)] == list(buffer.starts[:-1])
+
+
+def edit_offset(rng: random.Random, session: ReparseSession) -> int:
+    """随机位置，偏向块边界附近和文本末尾"""
+    length = len(session.source)
+    choice = rng.random()
+    if choice < 0.2 or not session.token_count:
+        return length
+    if choice < 0.6 and session.blocks:
+        block = rng.choice(session.blocks)
+        index = min(max(block.first + rng.choice((-1, 0, 1)), 0), session.token_count - 1)
+        return min(max(session.start(index) + rng.choice((-1, 0, 1)), 0), length)
+    return rng.randrange(length + 1)
+
+
+def random_edits(session: ReparseSession, count: int, seed: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        offset = edit_offset(rng, session)
+        if rng.random() < 0.5:
+            session.edit(offset, 0, rng.choice(SNIPPETS))
+        else:
+            deleted = min(rng.randrange(1, 6), len(session.source) - offset)
+            session.edit(offset, deleted, '')
+        assert_matches_full_analysis(session)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_edits_match_full_analysis(seed):
+    source = generate_expressions(1, 600, seed)[0]
+    session = ReparseSession(GRAMMAR, source)
+    assert_matches_full_analysis(session)
+    random_edits(session, 150, seed)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_edits_with_small_blocks(monkeypatch, seed):
+    # 块很小时几乎每次编辑都跨越块边界
+    monkeypatch.setattr(reparse, 'BLOCK_SIZE', 4)
+    source = generate_expressions(1, 60, seed)[0]
+    session = ReparseSession(GRAMMAR, source)
+    assert len(session.blocks) > 1
+    random_edits(session, 300, seed)
+
+
+def test_typing_at_end_and_emptying_document():
+    session = ReparseSession(GRAMMAR, '')
+    for char in 'a + (b * 2':
+        session.edit(len(session.source), 0, char)
+        assert_matches_full_analysis(session)
+    session.edit(len(session.source), 0, ')')
+    assert session.accepted
+    while session.source:
+        session.edit(len(session.source) - 1, 1, '')
+        assert_matches_full_analysis(session)
+
+
+def test_edit_out_of_range():
+    session = ReparseSession(GRAMMAR, 'a + b')
+    with pytest.raises(ValueError):
+        session.edit(4, 3, '')
+
+
+def test_session_store_evicts_least_recently_used():
+    store = SessionStore(maxsize=2)
+    first = store.create(GRAMMAR, 'a')
+    second = store.create(GRAMMAR, 'b')
+    assert store.get(first.id) is first
+    store.create(GRAMMAR, 'c')
+    assert len(store) == 2
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first
@@ -0,0 +1,132 @@
+from array import array
+from typing import List, Dict, Iterator, Optional, Tuple
+from lexer import Token, RegexLexer, LineIndex, KEYWORDS, OPERATORS
+from metrics import stats
+
+# 词法单元类型编号
+TOKEN_TYPES: List[str] = (['EOF', 'IDENTIFIER', 'INTEGER', 'FLOAT'] +
+                          sorted(set(KEYWORDS.values())) +
+                          [token_type for _, token_type in OPERATORS])
+
+
+class TokenBuffer:
+    """紧凑的词法单元序列
+
+    以平行数组保存每个词法单元的类型编号、起始偏移、长度和行号，值在访问时才从
+    源代码切片得到，列号通过惰性建立的换行符索引计算。迭代或下标访问时生成
+    Token 对象，兼容原有调用方。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.type_names: List[str] = list(TOKEN_TYPES)
+        self.type_ids: Dict[str, int] = {name: i for i, name in enumerate(self.type_names)}
+        self.types = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        self._lines: Optional[LineIndex] = None
+
+    @classmethod
+    def from_source(cls, source: str, keywords: Optional[Dict[str, str]] = None) -> 'TokenBuffer':
+        """对源代码做词法分析，结果以 EOF 结尾"""
+        buffer = cls(source)
+        lexer = RegexLexer(source)
+        if keywords is not None:
+            lexer.keywords = dict(keywords)
+        type_ids = buffer.type_ids
+        types = buffer.types
+        starts = buffer.starts
+        lengths = buffer.lengths
+        lines = buffer.lines
+        with stats.phase('lex'):
+            for token_type, value, start, line, _ in lexer.scan():
+                type_id = type_ids.get(token_type)
+                if type_id is None:
+                    type_id = buffer.add_type(token_type)
+                types.append(type_id)
+                starts.append(start)
+                lengths.append(len(value))
+                lines.append(line)
+            eof = lexer.eof_token()
+            buffer.append('EOF', len(source), 0, eof.line)
+        if stats.enabled:
+            stats.count('tokens', len(buffer) - 1)
+        return buffer
+
+    def add_type(self, token_type: str) -> int:
+        """登记新的词法单元类型"""
+        self.type_ids[token_type] = len(self.type_names)
+        self.type_names.append(token_type)
+        return self.type_ids[token_type]
+
+    def append(self, token_type: str, start: int, length: int, line: int):
+        """追加一个词法单元"""
+        type_id = self.type_ids.get(token_type)
+        if type_id is None:
+            type_id = self.add_type(token_type)
+        self.types.append(type_id)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def type_name(self, i: int) -> str:
+        return self.type_names[self.types[i]]
+
+    def value(self, i: int) -> str:
+        """第i个词法单元的值（按需从源代码切片）"""
+        start = self.starts[i]
+        return self.source[start:start + self.lengths[i]]
+
+    def column(self, i: int) -> int:
+        """第i个词法单元的列号，与 Lexer 的计数方式一致"""
+        if self._lines is None:
+            self._lines = LineIndex(self.source)
+        if self.types[i] == 0:
+            # EOF 位于最后一个字符处
+            if not self.source:
+                return 1
+            offset = len(self.source) - 1
+        else:
+            offset = self.starts[i]
+        return self._lines.position(offset)[1]
+
+    def token(self, i: int) -> Token:
+        """生成第i个词法单元的 Token 对象"""
+        return Token(self.type_name(i), self.value(i), self.lines[i], self.column(i))
+
+    def __getitem__(self, i: int) -> Token:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('词法单元下标越界')
+        return self.token(i)
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self)):
+            yield self.token(i)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """逐个生成 (类型, 值)，不创建 Token 对象"""
+        source = self.source
+        type_names = self.type_names
+        for type_id, start, length in zip(self.types, self.starts, self.lengths):
+            yield type_names[type_id], source[start:start + length]
+
+    def terminals(self, token_to_terminal: Dict[str, str]) -> List[str]:
+        """按映射转换为终结符序列，EOF 对应映射中的终结符；未映射的类型使用值本身"""
+        by_type = [token_to_terminal.get(name) for name in self.type_names]
+        unmapped = {type_id for type_id, terminal in enumerate(by_type) if terminal is None}
+        if unmapped.isdisjoint(self.types):
+            # 所有类型都有映射时只需按类型编号查表
+            return list(map(by_type.__getitem__, self.types))
+        source = self.source
+        return [by_type[type_id] if by_type[type_id] is not None else source[start:start + length]
+                for type_id, start, length in zip(self.types, self.starts, self.lengths)]
+
+    def nbytes(self) -> int:
+        """平行数组占用的字节数"""
+        return sum(len(a) * a.itemsize for a in (self.types, self.starts, self.lengths, self.lines))
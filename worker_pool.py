@@ -0,0 +1,61 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Any
+
+# 执行器类型
+EXECUTORS = ('thread', 'process')
+
+
+def default_workers() -> int:
+    """默认工作者数量：CPU核数"""
+    return os.cpu_count() or 1
+
+
+def create_executor(executor: str = 'thread', workers: Optional[int] = None) -> Executor:
+    """创建线程池或进程池"""
+    workers = workers or default_workers()
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    if executor == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    raise ValueError(f'未知的执行器类型: {executor}')
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """按固定大小分块"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_ordered(func: Callable[..., List[Any]], items: Iterable[Any], *args,
+                executor: str = 'thread', workers: Optional[int] = None,
+                chunk_size: int = 64, pool: Optional[Executor] = None) -> Iterator[Any]:
+    """分块并行执行 func(*args, chunk)，按输入顺序逐个产出结果
+
+    每块返回与输入等长的结果列表。同时在途的块数量有上限，输入可以是惰性迭代器，
+    结果先到的块也要等前面的块产出后才输出。传入 pool 时复用该执行器，否则临时创建。
+    func 在进程池中执行时必须是模块级函数。
+    """
+    workers = workers or default_workers()
+    own_pool = pool is None
+    if own_pool:
+        pool = create_executor(executor, workers)
+    pending = deque()
+    try:
+        for chunk in chunked(items, chunk_size):
+            pending.append(pool.submit(func, *args, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_pool:
+            pool.shutdown(wait=True)